@@ -129,6 +129,7 @@ model = dict(
     test_cfg=dict(
         mode='whole',
         output_scale=5.0,
+        output_dtype='float16',
     ),
 )
 
@@ -1,4 +1,6 @@
-from .inference import inference_segmentor, init_segmentor, show_result_pyplot
+from .inference import (SegmentationInferencer, inference_segmentor, init_inferencer, init_segmentor,
+                        show_result_pyplot)
+from .server import SegmentationServer
 from .test import multi_gpu_test, single_gpu_test
 from .train import get_root_logger, set_random_seed, train_segmentor
 from .export import export_model
@@ -9,6 +11,9 @@ __all__ = [
     'train_segmentor',
     'init_segmentor',
     'inference_segmentor',
+    'init_inferencer',
+    'SegmentationInferencer',
+    'SegmentationServer',
     'multi_gpu_test',
     'single_gpu_test',
     'show_result_pyplot',
@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import matplotlib.pyplot as plt
 import mmcv
 import torch
-from mmcv.parallel import collate, scatter
+from mmcv.parallel import MMDataParallel, scatter
 from mmcv.runner import load_checkpoint
 
+from mmseg.datasets.builder import pad_collate
 from mmseg.datasets.pipelines import Compose
 from mmseg.models import build_segmentor
 
@@ -66,36 +69,177 @@ class LoadImage:
         return results
 
 
+class SegmentationInferencer:
+    """Batched inference of a segmentor on many images.
+
+    The test pipeline is built once from ``model.cfg``. The images are
+    preprocessed on a thread pool and run through the model in micro-batches
+    of ``batch_size`` images, while the next micro-batch is preprocessed.
+    Images of different sizes are padded to a common shape by
+    :func:`pad_collate`.
+
+    Args:
+        model (nn.Module): The loaded segmentor, it may be wrapped by
+            :obj:`MMDataParallel` or :obj:`MMDataCPU`.
+        batch_size (int): Number of images in a forward pass. Default: 1.
+        workers (int): Number of threads preprocessing the images. If 0, the
+            images are preprocessed in the calling thread. Default: 0.
+    """
+
+    def __init__(self, model, batch_size=1, workers=0):
+        assert batch_size >= 1
+        self.model = model
+        self.batch_size = batch_size
+        self.workers = workers
+        cfg = model.module.cfg if hasattr(model, 'module') else model.cfg
+        # build the data pipeline
+        self.pipeline = Compose([LoadImage()] + cfg.data.test.pipeline[1:])
+
+    def preprocess(self, img):
+        """Run the test pipeline on an image file or a loaded image."""
+        return self.pipeline(dict(img=img))
+
+    def forward(self, samples, **kwargs):
+        """Run the model on a micro-batch of preprocessed samples.
+
+        Args:
+            samples (list[dict]): The outputs of :meth:`preprocess`.
+            kwargs: Extra arguments of the test functions of the model.
+
+        Returns:
+            list: The segmentation result of every sample.
+        """
+
+        data = pad_collate(samples, samples_per_gpu=len(samples))
+        device = next(self.model.parameters()).device  # model device
+        if isinstance(self.model, MMDataParallel):
+            # the wrapper scatters the batch itself
+            pass
+        elif device.type == 'cuda':
+            # scatter to specified GPU
+            data = scatter(data, [device])[0]
+        else:
+            data['img_metas'] = [i.data[0] for i in data['img_metas']]
+
+        # forward the model
+        with torch.no_grad():
+            return self.model(return_loss=False, rescale=True, **data, **kwargs)
+
+    def _iter_batches(self, imgs, batch_size):
+        batch = []
+        for img in imgs:
+            batch.append(img)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+    def _iter_samples(self, imgs, batch_size):
+        """Preprocess micro-batches of images, the next one while the
+        current one is run through the model."""
+
+        if self.workers == 0:
+            for batch in self._iter_batches(imgs, batch_size):
+                yield [self.preprocess(img) for img in batch]
+            return
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = None
+            for batch in self._iter_batches(imgs, batch_size):
+                futures = [pool.submit(self.preprocess, img) for img in batch]
+                if pending is not None:
+                    yield [future.result() for future in pending]
+                pending = futures
+            if pending is not None:
+                yield [future.result() for future in pending]
+
+    def stream(self, imgs):
+        """Lazily segment images, e.g. the files of a large folder.
+
+        Args:
+            imgs (Iterable[str/ndarray]): Image files or loaded images.
+
+        Yields:
+            The segmentation result of every image, in the input order.
+        """
+
+        for samples in self._iter_samples(imgs, self.batch_size):
+            yield from self.forward(samples)
+
+    def stream_video(self, frames):
+        """Lazily segment the frames of a video stream.
+
+        The frames are run one by one through
+        :meth:`EncoderDecoder.video_test`, which reuses the features of the
+        keyframes selected by ``test_cfg.video``.
+
+        Args:
+            frames (Iterable[str/ndarray]): The frames, e.g. a
+                :obj:`mmcv.VideoReader`.
+
+        Yields:
+            The segmentation result of every frame.
+        """
+
+        model = self.model.module if hasattr(self.model, 'module') else self.model
+        model.reset_video()
+        for samples in self._iter_samples(frames, 1):
+            yield from self.forward(samples, video=True)
+
+    def __call__(self, imgs):
+        """Segment images.
+
+        Args:
+            imgs (str/ndarray or Iterable[str/ndarray]): An image file or a
+                loaded image, or several of them.
+
+        Returns:
+            list: The segmentation result of every image.
+        """
+
+        if isinstance(imgs, str) or hasattr(imgs, 'shape'):
+            imgs = [imgs]
+        return list(self.stream(imgs))
+
+
+def init_inferencer(config, checkpoint=None, device='cuda:0', batch_size=1, workers=0):
+    """Initialize a batched inferencer from config file.
+
+    Args:
+        config (str or :obj:`mmcv.Config`): Config file path or the config
+            object.
+        checkpoint (str, optional): Checkpoint path. If left as None, the model
+            will not load any weights.
+        device (str, optional) CPU/CUDA device option. Default 'cuda:0'.
+            Use 'cpu' for loading model on CPU.
+        batch_size (int): Number of images in a forward pass. Default: 1.
+        workers (int): Number of threads preprocessing the images.
+            Default: 0.
+    Returns:
+        :obj:`SegmentationInferencer`: The inferencer of the constructed
+            segmentor.
+    """
+    model = init_segmentor(config, checkpoint, device=device)
+    return SegmentationInferencer(model, batch_size=batch_size, workers=workers)
+
+
 def inference_segmentor(model, img):
-    """Inference image(s) with the segmentor.
+    """Inference image with the segmentor.
+
+    The test pipeline is built from ``model.cfg`` on every call, use a
+    :obj:`SegmentationInferencer` to reuse it across images.
 
     Args:
         model (nn.Module): The loaded segmentor.
-        imgs (str/ndarray or list[str/ndarray]): Either image files or loaded
-            images.
+        img (str/ndarray): Either an image file or a loaded image.
 
     Returns:
         (list[Tensor]): The segmentation result.
     """
-    cfg = model.cfg
-    device = next(model.parameters()).device  # model device
-    # build the data pipeline
-    test_pipeline = [LoadImage()] + cfg.data.test.pipeline[1:]
-    test_pipeline = Compose(test_pipeline)
-    # prepare data
-    data = dict(img=img)
-    data = test_pipeline(data)
-    data = collate([data], samples_per_gpu=1)
-    if next(model.parameters()).is_cuda:
-        # scatter to specified GPU
-        data = scatter(data, [device])[0]
-    else:
-        data['img_metas'] = [i.data[0] for i in data['img_metas']]
-
-    # forward the model
-    with torch.no_grad():
-        result = model(return_loss=False, rescale=True, **data)
-    return result
+    inferencer = SegmentationInferencer(model)
+
+    return inferencer.forward([inferencer.preprocess(img)])
 
 
 def show_result_pyplot(model,
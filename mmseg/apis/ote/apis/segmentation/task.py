@@ -195,7 +195,8 @@ class OTESegmentationTask(ITrainingTask, IInferenceTask, IExportTask, IEvaluatio
 
         # Loop over dataset again to assign predictions. Convert from MMSegmentation format to OTE format
         for dataset_item, soft_prediction in zip(dataset, prediction_results):
-            soft_prediction = np.transpose(soft_prediction, axes=(1, 2, 0))
+            # the predictions may be transferred from the device as float16
+            soft_prediction = np.transpose(soft_prediction, axes=(1, 2, 0)).astype(np.float32)
 
             hard_prediction = create_hard_prediction_from_soft_prediction(
                 soft_prediction=soft_prediction,
@@ -246,9 +247,9 @@ class OTESegmentationTask(ITrainingTask, IInferenceTask, IExportTask, IEvaluatio
         model.eval()
 
         test_config = prepare_for_testing(config, dataset)
+        batch_size = test_config.data.test.pop('samples_per_gpu', 1)
         mm_val_dataset = build_dataset(test_config.data.test)
 
-        batch_size = 1
         mm_val_dataloader = build_dataloader(mm_val_dataset,
                                              samples_per_gpu=batch_size,
                                              workers_per_gpu=test_config.data.workers_per_gpu,
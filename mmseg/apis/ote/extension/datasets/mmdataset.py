@@ -105,6 +105,8 @@ class OTEDataset(CustomDataset):
         self.ignore_index = 255
         self.reduce_zero_label = False
         self.label_map = None
+        self.label_map_lut = None
+        self.label_lut = None
 
         dataset_labels = self.ote_dataset.get_labels(include_empty=False)
         self.project_labels = self.filter_labels(dataset_labels, classes)
@@ -194,13 +196,19 @@ class OTEDataset(CustomDataset):
 
         return ann_info
 
+    def get_gt_seg_map_by_idx(self, index, efficient_test=False):
+        """Get one ground truth segmentation map for evaluation."""
+
+        ann_info = self.get_ann_info(index)
+
+        return ann_info['gt_semantic_seg']
+
     def get_gt_seg_maps(self, efficient_test=False):
         """Get ground truth segmentation maps for evaluation."""
 
         gt_seg_maps = []
         for item_id in range(len(self)):
-            ann_info = self.get_ann_info(item_id)
-            gt_seg_maps.append(ann_info['gt_semantic_seg'])
+            gt_seg_maps.append(self.get_gt_seg_map_by_idx(item_id))
 
         return gt_seg_maps
 
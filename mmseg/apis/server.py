@@ -0,0 +1,213 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from .inference import SegmentationInferencer
+
+
+class SegmentationServer:
+    """In-process segmentation server with dynamic batching.
+
+    Requests are submitted from any number of client threads or from an
+    asyncio event loop and queued. A worker thread takes the oldest request
+    and waits at most ``max_latency`` seconds for more requests to arrive,
+    then runs up to ``max_batch_size`` of them through the model in one
+    forward pass. Every request gets a :class:`concurrent.futures.Future` of
+    its segmentation result.
+
+    Example:
+        >>> model = init_segmentor(config, checkpoint, device='cpu')
+        >>> with SegmentationServer(MMDataCPU(model), max_batch_size=8) as server:
+        >>>     future = server.submit('demo.png')
+        >>>     result = future.result()
+
+    Args:
+        model (nn.Module): The loaded segmentor, it may be wrapped by
+            :obj:`MMDataParallel` or :obj:`MMDataCPU`.
+        max_batch_size (int): Maximum number of requests in a forward pass.
+            Default: 8.
+        max_latency (float): Maximum time in seconds the oldest request of a
+            batch waits for the batch to fill. Default: 0.01.
+        workers (int): Number of threads preprocessing the images of a batch.
+            If 0, they are preprocessed by the worker thread. Default: 0.
+        metrics_window (int): Number of latest requests and batches the
+            latency and batch size statistics are computed on. Default: 1000.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_latency=0.01, workers=0, metrics_window=1000):
+        assert max_batch_size >= 1
+        assert max_latency >= 0
+        self.inferencer = SegmentationInferencer(model, batch_size=max_batch_size)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.workers = workers
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pool = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._num_requests = 0
+        self._num_batches = 0
+        self._num_errors = 0
+        self._batch_sizes = deque(maxlen=metrics_window)
+        self._latencies = deque(maxlen=metrics_window)
+
+    def start(self):
+        """Start the worker thread."""
+        assert self._thread is None, 'the server is already started'
+        self._stopped = False
+        if self.workers > 0:
+            self._pool = ThreadPoolExecutor(self.workers)
+        self._thread = threading.Thread(target=self._run, name='SegmentationServer', daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """Serve the queued requests and stop the worker thread."""
+        if self._thread is None:
+            return
+
+        with self._lock:
+            self._stopped = True
+            self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, img):
+        """Queue a request.
+
+        Args:
+            img (str/ndarray): Either an image file or a loaded image.
+
+        Returns:
+            :obj:`Future`: The future of the segmentation result.
+        """
+
+        future = Future()
+        with self._lock:
+            if self._thread is None or self._stopped:
+                raise RuntimeError('the server is not running')
+            self._queue.put((img, future, time.monotonic()))
+
+        return future
+
+    def infer(self, img, timeout=None):
+        """Segment an image, blocking until the result is ready."""
+        return self.submit(img).result(timeout)
+
+    async def infer_async(self, img):
+        """Segment an image from an asyncio event loop."""
+        return await asyncio.wrap_future(self.submit(img))
+
+    @property
+    def metrics(self):
+        """dict: Queue depth, batch size and latency statistics.
+
+        The latencies in seconds are measured from the submission of a request
+        to its result, the mean batch size and the latencies are computed on
+        the latest ``metrics_window`` batches and requests.
+        """
+
+        with self._lock:
+            batch_sizes = np.array(self._batch_sizes, dtype=np.float64)
+            latencies = np.array(self._latencies, dtype=np.float64)
+            metrics = dict(
+                queue_depth=self._queue.qsize(),
+                num_requests=self._num_requests,
+                num_batches=self._num_batches,
+                num_errors=self._num_errors)
+
+        metrics['mean_batch_size'] = float(batch_sizes.mean()) if len(batch_sizes) > 0 else 0.
+        metrics['max_batch_size'] = int(batch_sizes.max()) if len(batch_sizes) > 0 else 0
+        for name, value in [('mean', np.mean), ('p50', np.median), ('p95', lambda x: np.percentile(x, 95)),
+                            ('max', np.max)]:
+            metrics[f'latency_{name}'] = float(value(latencies)) if len(latencies) > 0 else 0.
+
+        return metrics
+
+    def _set_exception(self, batch, exception):
+        with self._lock:
+            self._num_errors += len(batch)
+        for item in batch:
+            item[1].set_exception(exception)
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None, True
+
+        batch = [item]
+        deadline = item[2] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch is None:
+                break
+
+            # skip the requests cancelled while they were queued
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if len(batch) == 0:
+                continue
+
+            # a request failing in the pipeline does not fail its batch
+            if self._pool is not None:
+                preprocessed = [self._pool.submit(self.inferencer.preprocess, item[0]) for item in batch]
+            ready, samples = [], []
+            for i, item in enumerate(batch):
+                try:
+                    if self._pool is not None:
+                        sample = preprocessed[i].result()
+                    else:
+                        sample = self.inferencer.preprocess(item[0])
+                except Exception as e:
+                    self._set_exception([item], e)
+                    continue
+                ready.append(item)
+                samples.append(sample)
+            if len(ready) == 0:
+                continue
+
+            batch = ready
+            try:
+                results = self.inferencer.forward(samples)
+            except Exception as e:
+                self._set_exception(batch, e)
+                continue
+
+            now = time.monotonic()
+            with self._lock:
+                self._num_requests += len(batch)
+                self._num_batches += 1
+                self._batch_sizes.append(len(batch))
+                self._latencies.extend(now - item[2] for item in batch)
+            for item, result in zip(batch, results):
+                item[1].set_result(result)
@@ -4,31 +4,12 @@ import shutil
 import tempfile
 
 import mmcv
-import numpy as np
 import torch
 import torch.distributed as dist
 from mmcv.image import tensor2imgs
 from mmcv.runner import get_dist_info
 
-
-def np2tmp(array, temp_file_name=None):
-    """Save ndarray to local numpy file.
-
-    Args:
-        array (ndarray): Ndarray to save.
-        temp_file_name (str): Numpy file name. If 'temp_file_name=None', this
-            function will generate a file name with tempfile.NamedTemporaryFile
-            to save ndarray. Default: None.
-
-    Returns:
-        str: The numpy file name.
-    """
-
-    if temp_file_name is None:
-        temp_file_name = tempfile.NamedTemporaryFile(
-            suffix='.npy', delete=False).name
-    np.save(temp_file_name, array)
-    return temp_file_name
+from mmseg.core.evaluation import PredictionStore
 
 
 def single_gpu_test(model,
@@ -38,7 +19,8 @@ def single_gpu_test(model,
                     efficient_test=False,
                     opacity=0.5,
                     add_gt_borders=True,
-                    output_logits=False):
+                    output_logits=False,
+                    pre_eval=False):
     """Test with single GPU.
 
     Args:
@@ -47,21 +29,34 @@ def single_gpu_test(model,
         show (bool): Whether show results during inference. Default: False.
         out_dir (str, optional): If specified, the results will be dumped into
             the directory to save output results.
-        efficient_test (bool): Whether save the results as local numpy files to
-            save CPU memory during evaluation. Default: False.
+        efficient_test (bool): Whether save the results to a memory-mapped
+            :obj:`PredictionStore` to save CPU memory during evaluation.
+            Default: False.
         opacity(float): Opacity of painted segmentation map.
             Default 0.5.
             Must be in (0, 1] range.
         add_gt_borders (bool): Whether show GT borders. Default: True.
+        pre_eval (bool): Whether to accumulate the confusion matrix of each
+            batch right after the forward pass and drop the predictions, so
+            memory does not grow with the dataset size. Default: False.
     Returns:
-        list: The prediction results.
+        list | PredictionStore: The prediction results or, if ``pre_eval`` is
+            set, a list with the accumulated confusion matrix.
     """
 
+    assert not (pre_eval and (efficient_test or output_logits)), \
+        'pre_eval cannot be used together with efficient_test or output_logits'
+
     model.eval()
 
-    results = []
+    results = PredictionStore() if efficient_test else []
     dataset = data_loader.dataset
+    if pre_eval:
+        total_conf_mat = _init_conf_mat(dataset)
     progress_bar = mmcv.ProgressBar(len(dataset))
+    # the test data loader is not shuffled, so the dataset indices of each
+    # batch follow a running counter
+    num_samples = 0
     for i, data in enumerate(data_loader):
         with torch.no_grad():
             result = model(return_loss=False,
@@ -102,19 +97,29 @@ def single_gpu_test(model,
                     gt_seg_map=gt_seg_map
                 )
 
-        if isinstance(result, list):
+        batch_size = len(result)
+        if pre_eval:
+            batch_indices = range(num_samples, num_samples + batch_size)
+            for conf_mat in dataset.pre_eval(result, indices=batch_indices):
+                total_conf_mat += conf_mat
+        elif isinstance(result, list):
             if efficient_test:
-                result = [np2tmp(_) for _ in result]
-            results.extend(result)
+                for pred in result:
+                    results.append(pred)
+            else:
+                results.extend(result)
         else:
-            if efficient_test:
-                result = np2tmp(result)
             results.append(result)
 
-        batch_size = len(result)
+        num_samples += batch_size
         for _ in range(batch_size):
             progress_bar.update()
 
+    if pre_eval:
+        results = [total_conf_mat]
+    elif efficient_test:
+        results.close()
+
     return results
 
 
@@ -122,14 +127,17 @@ def multi_gpu_test(model,
                    data_loader,
                    tmpdir=None,
                    gpu_collect=False,
-                   efficient_test=False):
+                   efficient_test=False,
+                   pre_eval=False):
     """Test model with multiple gpus.
 
     This method tests model with multiple gpus and collects the results
     under two different modes: gpu and cpu modes. By setting 'gpu_collect=True'
     it encodes results to gpu tensors and use gpu communication for results
     collection. On cpu mode it saves the results on different gpus to 'tmpdir'
-    and collects them by the rank 0 worker.
+    and collects them by the rank 0 worker. With 'pre_eval=True' each rank
+    accumulates its own confusion matrix and a single all_reduce merges them,
+    so neither 'tmpdir' nor 'gpu_collect' is used.
 
     Args:
         model (nn.Module): Model to be tested.
@@ -137,32 +145,59 @@ def multi_gpu_test(model,
         tmpdir (str): Path of directory to save the temporary results from
             different gpus under cpu mode.
         gpu_collect (bool): Option to use either gpu or cpu to collect results.
-        efficient_test (bool): Whether save the results as local numpy files to
-            save CPU memory during evaluation. Default: False.
+        efficient_test (bool): Whether save the results to a memory-mapped
+            :obj:`PredictionStore` to save CPU memory during evaluation.
+            Default: False.
+        pre_eval (bool): Whether to accumulate the confusion matrix of each
+            batch right after the forward pass and drop the predictions.
+            Default: False.
 
     Returns:
-        list: The prediction results.
+        list | PredictionStore: The prediction results or, if ``pre_eval``
+            is set, a list with the confusion matrix accumulated over all
+            ranks.
     """
 
+    assert not (pre_eval and efficient_test), \
+        'pre_eval cannot be used together with efficient_test'
+
     model.eval()
 
-    results = []
+    results = PredictionStore() if efficient_test else []
+    num_samples = 0
     dataset = data_loader.dataset
+    if pre_eval:
+        total_conf_mat = _init_conf_mat(dataset)
     rank, world_size = get_dist_info()
     if rank == 0:
         progress_bar = mmcv.ProgressBar(len(dataset))
 
-    for i, data in enumerate(data_loader):
+    for data in data_loader:
         with torch.no_grad():
             result = model(return_loss=False, rescale=True, **data)
 
-        if isinstance(result, list):
+        if pre_eval:
+            # the test data loader is not shuffled, so the distributed sampler
+            # gives the sample_id-th sample of the rank the dataset index
+            # sample_id * world_size + rank. It pads the dataset by repeating
+            # samples at the end, so they must not be counted twice.
+            batch_result = result if isinstance(result, list) else [result]
+            sample_ids = range(num_samples, num_samples + len(batch_result))
+            num_samples += len(batch_result)
+            valid_ids = [
+                pos for pos, sample_id in enumerate(sample_ids)
+                if sample_id * world_size + rank < len(dataset)
+            ]
+            for conf_mat in dataset.pre_eval([batch_result[pos] for pos in valid_ids],
+                                             indices=[sample_ids[pos] * world_size + rank for pos in valid_ids]):
+                total_conf_mat += conf_mat
+        elif isinstance(result, list):
             if efficient_test:
-                result = [np2tmp(_) for _ in result]
-            results.extend(result)
+                for pred in result:
+                    results.append(pred)
+            else:
+                results.extend(result)
         else:
-            if efficient_test:
-                result = np2tmp(result)
             results.append(result)
 
         if rank == 0:
@@ -171,7 +206,17 @@ def multi_gpu_test(model,
                 progress_bar.update()
 
     # collect results from all ranks
-    if gpu_collect:
+    if pre_eval:
+        results = [reduce_conf_mat(total_conf_mat)]
+    elif efficient_test:
+        # only the paths and the offset index of the stores are collected
+        results.close()
+        if gpu_collect:
+            stores = collect_results_gpu([results], world_size)
+        else:
+            stores = collect_results_cpu([results], world_size, tmpdir)
+        results = PredictionStore.merge(stores, len(dataset)) if rank == 0 else None
+    elif gpu_collect:
         results = collect_results_gpu(results, len(dataset))
     else:
         results = collect_results_cpu(results, len(dataset), tmpdir)
@@ -179,21 +224,45 @@ def multi_gpu_test(model,
     return results
 
 
+def _init_conf_mat(dataset):
+    """Create an empty confusion matrix for the classes of the dataset."""
+    assert dataset.CLASSES is not None, \
+        'CLASSES must be specified to evaluate the predictions on the fly'
+    num_classes = len(dataset.CLASSES)
+
+    return torch.zeros((num_classes, num_classes + 1), dtype=torch.int64)
+
+
+def reduce_conf_mat(conf_mat):
+    """Sum the confusion matrices of all ranks.
+
+    The matrices are merged with a single all_reduce, so it works both with
+    the nccl backend and with gloo on CPU-only nodes.
+    """
+    device = 'cuda' if dist.get_backend() == 'nccl' else 'cpu'
+    conf_mat_tensor = conf_mat.to(device)
+    dist.all_reduce(conf_mat_tensor, op=dist.ReduceOp.SUM)
+
+    return conf_mat_tensor.cpu()
+
+
 def collect_results_cpu(result_part, size, tmpdir=None):
     """Collect results with CPU."""
     rank, world_size = get_dist_info()
     # create a tmp dir if it is not specified
     if tmpdir is None:
         MAX_LEN = 512
+        # the path is broadcast over gloo on CPU-only nodes
+        device = 'cuda' if dist.get_backend() == 'nccl' else 'cpu'
         # 32 is whitespace
         dir_tensor = torch.full((MAX_LEN, ),
                                 32,
                                 dtype=torch.uint8,
-                                device='cuda')
+                                device=device)
         if rank == 0:
             tmpdir = tempfile.mkdtemp()
             tmpdir = torch.tensor(
-                bytearray(tmpdir.encode()), dtype=torch.uint8, device='cuda')
+                bytearray(tmpdir.encode()), dtype=torch.uint8, device=device)
             dir_tensor[:len(tmpdir)] = tmpdir
         dist.broadcast(dir_tensor, 0)
         tmpdir = dir_tensor.cpu().numpy().tobytes().decode().rstrip()
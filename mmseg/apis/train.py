@@ -132,10 +132,11 @@ def train_segmentor(model,
 
     # register eval hooks
     if validate:
+        val_samples_per_gpu = cfg.data.val.pop('samples_per_gpu', 1)
         val_dataset = build_dataset(cfg.data.val, dict(test_mode=True))
         val_dataloader = build_dataloader(
             val_dataset,
-            samples_per_gpu=1,
+            samples_per_gpu=val_samples_per_gpu,
             workers_per_gpu=cfg.data.workers_per_gpu,
             dist=distributed,
             shuffle=False
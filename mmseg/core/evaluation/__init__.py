@@ -1,8 +1,13 @@
 from .class_names import get_classes, get_palette
 from .eval_hooks import DistEvalHook, EvalHook
-from .metrics import eval_metrics, mean_dice, mean_fscore, mean_iou
+from .metrics import (apply_label_lut, build_label_lut, confusion_matrix,
+                      confusion_matrix_to_metrics, eval_metrics, mean_dice,
+                      mean_fscore, mean_iou, total_confusion_matrix)
+from .prediction_store import PredictionStore
 
 __all__ = [
     'EvalHook', 'DistEvalHook', 'mean_dice', 'mean_iou', 'mean_fscore',
-    'eval_metrics', 'get_classes', 'get_palette'
+    'eval_metrics', 'get_classes', 'get_palette', 'confusion_matrix',
+    'total_confusion_matrix', 'confusion_matrix_to_metrics',
+    'build_label_lut', 'apply_label_lut', 'PredictionStore'
 ]
@@ -15,15 +15,18 @@ class EvalHook(_EvalHook):
             Default: False.
         efficient_test (bool): Whether save the results as local numpy files to
             save CPU memory during evaluation. Default: False.
+        pre_eval (bool): Whether to accumulate the confusion matrix during
+            the test loop instead of keeping the predictions. Default: False.
     Returns:
         list: The prediction results.
     """
 
     greater_keys = ['mIoU', 'mAcc', 'aAcc', 'mDice']
 
-    def __init__(self, *args, by_epoch=False, efficient_test=False, **kwargs):
+    def __init__(self, *args, by_epoch=False, efficient_test=False, pre_eval=False, **kwargs):
         super().__init__(*args, by_epoch=by_epoch, **kwargs)
         self.efficient_test = efficient_test
+        self.pre_eval = pre_eval
 
     def _do_evaluate(self, runner):
         """perform evaluation and save ckpt."""
@@ -31,7 +34,7 @@ class EvalHook(_EvalHook):
             return
 
         from mmseg.apis import single_gpu_test
-        results = single_gpu_test(runner.model, self.dataloader, show=False)
+        results = single_gpu_test(runner.model, self.dataloader, show=False, pre_eval=self.pre_eval)
         runner.log_buffer.output['eval_iter_num'] = len(self.dataloader)
         key_score = self.evaluate(runner, results)
         if self.save_best:
@@ -47,15 +50,18 @@ class DistEvalHook(_DistEvalHook):
             Default: False.
         efficient_test (bool): Whether save the results as local numpy files to
             save CPU memory during evaluation. Default: False.
+        pre_eval (bool): Whether to accumulate the confusion matrix during
+            the test loop instead of keeping the predictions. Default: False.
     Returns:
         list: The prediction results.
     """
 
     greater_keys = ['mIoU', 'mAcc', 'aAcc', 'mDice']
 
-    def __init__(self, *args, by_epoch=False, efficient_test=False, **kwargs):
+    def __init__(self, *args, by_epoch=False, efficient_test=False, pre_eval=False, **kwargs):
         super().__init__(*args, by_epoch=by_epoch, **kwargs)
         self.efficient_test = efficient_test
+        self.pre_eval = pre_eval
 
     def _do_evaluate(self, runner):
         """perform evaluation and save ckpt."""
@@ -83,7 +89,8 @@ class DistEvalHook(_DistEvalHook):
             runner.model,
             self.dataloader,
             tmpdir=tmpdir,
-            gpu_collect=self.gpu_collect
+            gpu_collect=self.gpu_collect,
+            pre_eval=self.pre_eval
         )
 
         if runner.rank == 0:
@@ -22,6 +22,185 @@ def f_score(precision, recall, beta=1):
     return score
 
 
+def build_label_lut(label_map=None, reduce_zero_label=False):
+    """Build the lookup table that remaps the labels of a uint8 label map.
+
+    The table combines ``label_map`` and ``reduce_zero_label`` so both are
+    applied with a single indexing pass over the label map.
+
+    Args:
+        label_map (dict, optional): Mapping old labels to new labels, new
+            labels below zero mark the pixels as ignored. Default: None.
+        reduce_zero_label (bool): Wether ignore zero label. Default: False.
+
+    Returns:
+        ndarray: The lookup table of shape (256, ) and dtype uint8.
+    """
+    lut = np.arange(256, dtype=np.uint8)
+    if label_map is not None:
+        for old_id, new_id in label_map.items():
+            if 0 <= old_id < 256:
+                lut[old_id] = 255 if new_id < 0 else new_id
+    if reduce_zero_label:
+        # 0 becomes 255 and 255 stays 255, other labels are shifted by one
+        reduce_lut = np.arange(-1, 255, dtype=np.int16)
+        reduce_lut[0] = 255
+        reduce_lut[255] = 255
+        lut = reduce_lut.astype(np.uint8)[lut]
+
+    return lut
+
+
+def apply_label_lut(label, lut):
+    """Remap the labels of a label map with a lookup table.
+
+    Args:
+        label (ndarray): The label map.
+        lut (ndarray): The lookup table built by :func:`build_label_lut`.
+
+    Returns:
+        ndarray: The remapped label map.
+    """
+    if label.dtype == np.uint8:
+        return lut[label]
+
+    # labels out of the table range are kept as is
+    in_range = (label >= 0) & (label < len(lut))
+    return np.where(in_range, lut[np.clip(label, 0, len(lut) - 1)], label)
+
+
+def confusion_matrix(pred_label,
+                     label,
+                     num_classes,
+                     ignore_index,
+                     label_map=dict(),
+                     reduce_zero_label=False,
+                     label_lut=None):
+    """Calculate the confusion matrix of a single prediction.
+
+    The matrix is computed with a single ``bincount`` over
+    ``(num_classes + 1) * label + pred_label``, so all the per-class areas
+    used by the metrics can be derived from it afterwards. The predictions
+    out of ``[0, num_classes)`` are counted in an extra last column, so the
+    ground truth pixels they cover are still counted as misses.
+
+    Args:
+        pred_label (ndarray | str): Prediction segmentation map
+            or predict result filename.
+        label (ndarray | str): Ground truth segmentation map
+            or label filename.
+        num_classes (int): Number of categories.
+        ignore_index (int): Index that will be ignored in evaluation.
+        label_map (dict): Mapping old labels to new labels. Default: dict().
+        reduce_zero_label (bool): Wether ignore zero label. Default: False.
+        label_lut (ndarray, optional): Lookup table built by
+            :func:`build_label_lut`. If specified, it is used instead of
+            ``label_map`` and ``reduce_zero_label``. Default: None.
+
+     Returns:
+         torch.Tensor: The confusion matrix of shape (num_classes,
+            num_classes + 1), rows are ground truth classes and columns are
+            predicted classes, the last column counts the invalid predictions.
+    """
+
+    if isinstance(pred_label, str):
+        pred_label = torch.from_numpy(np.load(pred_label))
+    else:
+        pred_label = torch.from_numpy((pred_label))
+
+    if isinstance(label, str):
+        label = mmcv.imread(label, flag='unchanged', backend='pillow')
+
+    if label_lut is None and (label_map or reduce_zero_label):
+        label_lut = build_label_lut(label_map, reduce_zero_label)
+    if label_lut is not None:
+        # a new array is returned, so shared label maps stay untouched
+        label = apply_label_lut(label, label_lut)
+    label = torch.from_numpy(label)
+
+    # labels out of [0, num_classes) are not counted, predictions out of
+    # [0, num_classes) go to the invalid column
+    mask = (label != ignore_index) & (label >= 0) & (label < num_classes)
+    pred_label = pred_label[mask].long()
+    label = label[mask].long()
+    pred_label[(pred_label < 0) | (pred_label >= num_classes)] = num_classes
+
+    conf_mat = torch.bincount(
+        (num_classes + 1) * label + pred_label,
+        minlength=num_classes * (num_classes + 1))
+
+    return conf_mat.reshape(num_classes, num_classes + 1)
+
+
+def total_confusion_matrix(results,
+                           gt_seg_maps,
+                           num_classes,
+                           ignore_index,
+                           label_map=dict(),
+                           reduce_zero_label=False,
+                           label_lut=None):
+    """Calculate the total confusion matrix over a set of predictions.
+
+    Args:
+        results (list[ndarray] | list[str]): List of prediction segmentation
+            maps or list of prediction result filenames.
+        gt_seg_maps (list[ndarray] | list[str]): list of ground truth
+            segmentation maps or list of label filenames.
+        num_classes (int): Number of categories.
+        ignore_index (int): Index that will be ignored in evaluation.
+        label_map (dict): Mapping old labels to new labels. Default: dict().
+        reduce_zero_label (bool): Wether ignore zero label. Default: False.
+        label_lut (ndarray, optional): Lookup table built by
+            :func:`build_label_lut`. Default: None.
+
+     Returns:
+         torch.Tensor: The confusion matrix of shape (num_classes,
+            num_classes + 1) accumulated over all images.
+    """
+    num_imgs = len(results)
+    assert len(gt_seg_maps) == num_imgs
+
+    if label_lut is None and (label_map or reduce_zero_label):
+        label_lut = build_label_lut(label_map, reduce_zero_label)
+
+    total_conf_mat = torch.zeros((num_classes, num_classes + 1), dtype=torch.int64)
+    for i in range(num_imgs):
+        total_conf_mat += confusion_matrix(
+            results[i], gt_seg_maps[i], num_classes, ignore_index,
+            label_lut=label_lut)
+
+    return total_conf_mat
+
+
+def confusion_matrix_to_areas(conf_mat):
+    """Derive the per-class areas from a confusion matrix.
+
+    Args:
+        conf_mat (torch.Tensor): The confusion matrix of shape (num_classes,
+            num_classes) or (num_classes, num_classes + 1), the extra column
+            counts the ground truth pixels with an invalid prediction.
+
+     Returns:
+         torch.Tensor: The intersection of prediction and ground truth
+            histogram on all classes.
+         torch.Tensor: The union of prediction and ground truth histogram on
+            all classes.
+         torch.Tensor: The prediction histogram on all classes.
+         torch.Tensor: The ground truth histogram on all classes.
+    """
+    conf_mat = conf_mat.to(torch.float64)
+    num_classes = conf_mat.shape[0]
+
+    # the invalid predictions only count in the ground truth areas
+    area_label = conf_mat.sum(dim=1)
+    conf_mat = conf_mat[:, :num_classes]
+    area_intersect = torch.diag(conf_mat)
+    area_pred_label = conf_mat.sum(dim=0)
+    area_union = area_pred_label + area_label - area_intersect
+
+    return area_intersect, area_union, area_pred_label, area_label
+
+
 def intersect_and_union(pred_label,
                         label,
                         num_classes,
@@ -51,36 +230,10 @@ def intersect_and_union(pred_label,
          torch.Tensor: The ground truth histogram on all classes.
     """
 
-    if isinstance(pred_label, str):
-        pred_label = torch.from_numpy(np.load(pred_label))
-    else:
-        pred_label = torch.from_numpy((pred_label))
-
-    if isinstance(label, str):
-        label = torch.from_numpy(
-            mmcv.imread(label, flag='unchanged', backend='pillow'))
-    else:
-        label = torch.from_numpy(label)
-
-    if label_map is not None:
-        for old_id, new_id in label_map.items():
-            label[label == old_id] = new_id
-    if reduce_zero_label:
-        label[label == 0] = 255
-        label = label - 1
-        label[label == 254] = 255
-
-    mask = (label != ignore_index)
-    pred_label = pred_label[mask]
-    label = label[mask]
-
-    intersect = pred_label[pred_label == label]
-    area_intersect = torch.histc(intersect.float(), bins=num_classes, min=0, max=num_classes - 1)
-    area_pred_label = torch.histc(pred_label.float(), bins=num_classes, min=0, max=num_classes - 1)
-    area_label = torch.histc(label.float(), bins=num_classes, min=0, max=num_classes - 1)
-    area_union = area_pred_label + area_label - area_intersect
+    conf_mat = confusion_matrix(pred_label, label, num_classes, ignore_index,
+                                label_map, reduce_zero_label)
 
-    return area_intersect, area_union, area_pred_label, area_label
+    return confusion_matrix_to_areas(conf_mat)
 
 
 def total_intersect_and_union(results,
@@ -109,23 +262,12 @@ def total_intersect_and_union(results,
          ndarray: The prediction histogram on all classes.
          ndarray: The ground truth histogram on all classes.
     """
-    num_imgs = len(results)
-    assert len(gt_seg_maps) == num_imgs
 
-    total_area_intersect = torch.zeros((num_classes, ), dtype=torch.float64)
-    total_area_union = torch.zeros((num_classes, ), dtype=torch.float64)
-    total_area_pred_label = torch.zeros((num_classes, ), dtype=torch.float64)
-    total_area_label = torch.zeros((num_classes, ), dtype=torch.float64)
-    for i in range(num_imgs):
-        area_intersect, area_union, area_pred_label, area_label = \
-            intersect_and_union(results[i], gt_seg_maps[i], num_classes,
-                                ignore_index, label_map, reduce_zero_label)
-        total_area_intersect += area_intersect
-        total_area_union += area_union
-        total_area_pred_label += area_pred_label
-        total_area_label += area_label
+    total_conf_mat = total_confusion_matrix(results, gt_seg_maps, num_classes,
+                                            ignore_index, label_map,
+                                            reduce_zero_label)
 
-    return total_area_intersect, total_area_union, total_area_pred_label, total_area_label
+    return confusion_matrix_to_areas(total_conf_mat)
 
 
 def mean_iou(results,
@@ -260,7 +402,8 @@ def eval_metrics(results,
                  nan_to_num=None,
                  label_map=dict(),
                  reduce_zero_label=False,
-                 beta=1):
+                 beta=1,
+                 label_lut=None):
     """Calculates evaluation metrics
     Args:
         results (list[ndarray] | list[str]): List of prediction segmentation
@@ -274,6 +417,9 @@ def eval_metrics(results,
             by the numbers defined by the user. Default: None.
         label_map (dict): Mapping old labels to new labels. Default: dict().
         reduce_zero_label (bool): Wether ignore zero label. Default: False.
+        label_lut (ndarray, optional): Lookup table built by
+            :func:`build_label_lut`. If specified, it is used instead of
+            ``label_map`` and ``reduce_zero_label``. Default: None.
      Returns:
         float: Overall accuracy on all images.
         ndarray: Per category accuracy, shape (num_classes, ).
@@ -286,8 +432,47 @@ def eval_metrics(results,
     if not set(metrics).issubset(set(allowed_metrics)):
         raise KeyError('metrics {} is not supported'.format(metrics))
 
+    total_conf_mat = total_confusion_matrix(results, gt_seg_maps, num_classes,
+                                            ignore_index, label_map,
+                                            reduce_zero_label, label_lut)
+
+    return confusion_matrix_to_metrics(total_conf_mat, metrics, nan_to_num,
+                                       beta)
+
+
+def confusion_matrix_to_metrics(conf_mat,
+                                metrics=['mIoU'],
+                                nan_to_num=None,
+                                beta=1):
+    """Calculates evaluation metrics from a confusion matrix.
+
+    Args:
+        conf_mat (torch.Tensor | ndarray): The confusion matrix of shape
+            (num_classes, num_classes) or (num_classes, num_classes + 1), rows
+            are ground truth classes and columns are predicted classes.
+        metrics (list[str] | str): Metrics to be evaluated, 'mIoU', 'mDice'
+            and 'mFscore'.
+        nan_to_num (int, optional): If specified, NaN values will be replaced
+            by the numbers defined by the user. Default: None.
+        beta (int): Determines the weight of recall in the combined score.
+            Default: 1.
+     Returns:
+        float: Overall accuracy on all images.
+        ndarray: Per category accuracy, shape (num_classes, ).
+        ndarray: Per category evaluation metrics, shape (num_classes, ).
+    """
+    if isinstance(metrics, str):
+        metrics = [metrics]
+
+    allowed_metrics = ['mIoU', 'mDice', 'mFscore']
+    if not set(metrics).issubset(set(allowed_metrics)):
+        raise KeyError('metrics {} is not supported'.format(metrics))
+
+    if isinstance(conf_mat, np.ndarray):
+        conf_mat = torch.from_numpy(conf_mat)
+
     total_area_intersect, total_area_union, total_area_pred_label, total_area_label = \
-        total_intersect_and_union(results, gt_seg_maps, num_classes, ignore_index, label_map, reduce_zero_label)
+        confusion_matrix_to_areas(conf_mat)
     all_acc = total_area_intersect.sum() / total_area_label.sum()
 
     ret_metrics = OrderedDict({'aAcc': all_acc})
@@ -305,7 +490,7 @@ def eval_metrics(results,
         elif metric == 'mFscore':
             precision = total_area_intersect / total_area_pred_label
             recall = total_area_intersect / total_area_label
-            f_value = torch.tensor([f_score(x[0], x[1], beta) for x in zip(precision, recall)])
+            f_value = f_score(precision, recall, beta)
             ret_metrics['Fscore'] = f_value
             ret_metrics['Precision'] = precision
             ret_metrics['Recall'] = recall
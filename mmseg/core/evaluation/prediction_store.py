@@ -0,0 +1,139 @@
+import os
+import os.path as osp
+import tempfile
+
+import numpy as np
+
+
+class PredictionStore(object):
+    """Memory-mapped store of uint8 segmentation predictions.
+
+    The predictions are appended to a single data file and located through an
+    offset index, so testing with ``efficient_test=True`` creates one file
+    instead of a temporary ``.npy`` file per image. The items are returned as
+    views of the memory-mapped data file, so reading them does not copy the
+    predictions.
+
+    When pickled, only the paths of the data files and the index are stored,
+    which allows to collect the stores of several ranks without moving the
+    predictions.
+
+    Args:
+        data_file (str, optional): Path of the data file. If None, a temporary
+            file is created. Default: None.
+    """
+
+    def __init__(self, data_file=None):
+        if data_file is None:
+            fd, data_file = tempfile.mkstemp(suffix='.bin')
+            os.close(fd)
+
+        self.data_files = [data_file]
+        # (file id, byte offset, height, width) of every prediction
+        self.index = []
+        self._writer = open(data_file, 'wb')
+        self._offset = 0
+        self._mmaps = dict()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, idx):
+        file_id, offset, height, width = self.index[idx]
+        data = self._get_mmap(file_id, offset + height * width)
+
+        return data[offset:offset + height * width].reshape(height, width)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __getstate__(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+        return dict(data_files=self.data_files, index=self.index)
+
+    def __setstate__(self, state):
+        self.data_files = state['data_files']
+        self.index = state['index']
+        self._writer = None
+        self._offset = None
+        self._mmaps = dict()
+
+    def append(self, pred):
+        """Append a prediction to the data file.
+
+        Args:
+            pred (ndarray): The prediction of shape (H, W) with values in
+                [0, 255].
+        """
+        assert self._writer is not None, 'the store is read-only'
+        assert pred.ndim == 2, 'only 2D predictions are supported'
+        if pred.dtype != np.uint8:
+            assert pred.size == 0 or 0 <= pred.min() and pred.max() <= 255, \
+                'predictions must fit into uint8'
+            pred = pred.astype(np.uint8)
+
+        self._writer.write(np.ascontiguousarray(pred).data)
+        self.index.append((0, self._offset, pred.shape[0], pred.shape[1]))
+        self._offset += pred.size
+
+    def _get_mmap(self, file_id, min_size):
+        data = self._mmaps.get(file_id)
+        if data is None or len(data) < min_size:
+            if self._writer is not None and file_id == 0:
+                self._writer.flush()
+            # copy-on-write mapping, so the views are writable but the
+            # changes never reach the data file
+            data = np.memmap(self.data_files[file_id], dtype=np.uint8, mode='c')
+            data = data.view(np.ndarray)
+            self._mmaps[file_id] = data
+
+        return data
+
+    def close(self):
+        """Finish writing, the store stays readable."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def cleanup(self):
+        """Close the store and remove its data files."""
+        self.close()
+        self._mmaps.clear()
+        for data_file in self.data_files:
+            if osp.exists(data_file):
+                os.remove(data_file)
+
+    @classmethod
+    def merge(cls, stores, size):
+        """Merge the stores filled by several ranks.
+
+        The items are interleaved in the order they were distributed by the
+        sampler, as done by ``collect_results_cpu``.
+
+        Args:
+            stores (list[PredictionStore]): The stores ordered by rank.
+            size (int): The size of the dataset, the dataloader may pad some
+                samples.
+
+        Returns:
+            PredictionStore: The read-only merged store.
+        """
+        data_files = []
+        index_parts = []
+        for store in stores:
+            store.close()
+            file_ids = [len(data_files) + file_id for file_id in range(len(store.data_files))]
+            data_files.extend(store.data_files)
+            index_parts.append([(file_ids[entry[0]], ) + tuple(entry[1:]) for entry in store.index])
+
+        index = []
+        for entries in zip(*index_parts):
+            index.extend(entries)
+
+        merged = cls.__new__(cls)
+        merged.__setstate__(dict(data_files=data_files, index=index[:size]))
+
+        return merged
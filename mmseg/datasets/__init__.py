@@ -11,6 +11,7 @@ from .stare import STAREDataset
 from .voc import PascalVOCDataset
 from .kvasir import KvasirDataset
 from .coco_stuff import COCOStuffDataset
+from .packed import PackedBackend, PackedWriter, pack_directory
 
 __all__ = [
     'CustomDataset',
@@ -31,4 +32,7 @@ __all__ = [
     'STAREDataset',
     'KvasirDataset',
     'COCOStuffDataset',
+    'PackedBackend',
+    'PackedWriter',
+    'pack_directory',
 ]
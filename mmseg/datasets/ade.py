@@ -5,6 +5,7 @@ import mmcv
 import numpy as np
 from PIL import Image
 
+from mmseg.core import PredictionStore
 from .builder import DATASETS
 from .custom import CustomDataset
 
@@ -148,7 +149,8 @@ class ADE20KDataset(CustomDataset):
                 for saving json/png files when img_prefix is not specified.
         """
 
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, (list, PredictionStore)), \
+            'results must be a list or a PredictionStore'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: '
             f'{len(results)} != {len(self)}')
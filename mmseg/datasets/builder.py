@@ -1,9 +1,13 @@
 import copy
 import platform
 import random
+from collections.abc import Mapping, Sequence
 from functools import partial
 
+import mmcv
 import numpy as np
+import torch
+import torch.nn.functional as F
 from mmcv.parallel import collate
 from mmcv.runner import get_dist_info
 from mmcv.utils import Registry, build_from_cfg
@@ -142,7 +146,7 @@ def build_dataloader(dataset,
         batch_size=batch_size,
         sampler=sampler,
         num_workers=num_workers,
-        collate_fn=partial(collate, samples_per_gpu=samples_per_gpu),
+        collate_fn=partial(pad_collate, samples_per_gpu=samples_per_gpu),
         pin_memory=pin_memory,
         shuffle=shuffle,
         worker_init_fn=init_fn,
@@ -152,6 +156,38 @@ def build_dataloader(dataset,
     return data_loader
 
 
+def pad_collate(batch, samples_per_gpu=1):
+    """Collate a batch, padding the test images to a common shape.
+
+    The test pipelines return each augmentation of an image as a plain
+    tensor, so images of different sizes cannot be stacked as they are. They
+    are padded with zeros at the bottom and the right to the largest shape of
+    the batch, while the ``pad_shape`` of their meta still gives their shape
+    before the batch padding, so the predictions can be cropped back. Other
+    samples are collated by :func:`mmcv.parallel.collate`.
+
+    Args:
+        batch (list[dict]): The samples of the batch.
+        samples_per_gpu (int): Number of samples on each GPU. Default: 1.
+
+    Returns:
+        dict: The collated batch.
+    """
+
+    if len(batch) > 1 and isinstance(batch[0], Mapping) and isinstance(batch[0].get('img'), Sequence) \
+            and mmcv.is_list_of(batch[0]['img'], torch.Tensor):
+        batch = [dict(sample, img=list(sample['img'])) for sample in batch]
+        for aug_idx in range(len(batch[0]['img'])):
+            imgs = [sample['img'][aug_idx] for sample in batch]
+            max_h = max(img.shape[-2] for img in imgs)
+            max_w = max(img.shape[-1] for img in imgs)
+            for sample, img in zip(batch, imgs):
+                if img.shape[-2:] != (max_h, max_w):
+                    sample['img'][aug_idx] = F.pad(img, (0, max_w - img.shape[-1], 0, max_h - img.shape[-2]))
+
+    return collate(batch, samples_per_gpu=samples_per_gpu)
+
+
 def worker_init_fn(worker_id, num_workers, rank, seed):
     """Worker init func for dataloader.
 
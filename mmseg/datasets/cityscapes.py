@@ -1,11 +1,13 @@
 import os.path as osp
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 import mmcv
 import numpy as np
 from mmcv.utils import print_log
 from PIL import Image
 
+from mmseg.core import PredictionStore, apply_label_lut
 from .builder import DATASETS
 from .custom import CustomDataset
 
@@ -36,18 +38,40 @@ class CityscapesDataset(CustomDataset):
             **kwargs)
 
     @staticmethod
-    def _convert_to_label_id(result):
+    def _get_label_id_lut():
+        """Build the lookup table converting trainIds to ids.
+
+        Values that are not a trainId are kept as is.
+        """
+        import cityscapesscripts.helpers.labels as CSLabels
+        label_id_lut = np.arange(256, dtype=np.uint8)
+        for train_id, label in CSLabels.trainId2label.items():
+            if 0 <= train_id < 256 and label.id >= 0:
+                label_id_lut[train_id] = label.id
+
+        return label_id_lut
+
+    @staticmethod
+    def _get_label_id_palette():
+        """Build the palette of the Cityscapes label ids."""
+        import cityscapesscripts.helpers.labels as CSLabels
+        palette = np.zeros((len(CSLabels.id2label), 3), dtype=np.uint8)
+        for label_id, label in CSLabels.id2label.items():
+            palette[label_id] = label.color
+
+        return palette
+
+    @staticmethod
+    def _convert_to_label_id(result, label_id_lut=None):
         """Convert trainId to id for cityscapes."""
         if isinstance(result, str):
             result = np.load(result)
-        import cityscapesscripts.helpers.labels as CSLabels
-        result_copy = result.copy()
-        for trainId, label in CSLabels.trainId2label.items():
-            result_copy[result == trainId] = label.id
+        if label_id_lut is None:
+            label_id_lut = CityscapesDataset._get_label_id_lut()
 
-        return result_copy
+        return apply_label_lut(result, label_id_lut)
 
-    def results2img(self, results, imgfile_prefix, to_label_id):
+    def results2img(self, results, imgfile_prefix, to_label_id, nproc=4):
         """Write the segmentation results to images.
 
         Args:
@@ -58,37 +82,50 @@ class CityscapesDataset(CustomDataset):
                 the png files will be named "somepath/xxx.png".
             to_label_id (bool): whether convert output to label_id for
                 submission
+            nproc (int): Number of threads encoding and saving the png files.
+                Default: 4.
 
         Returns:
             list[str: str]: result txt files which contains corresponding
             semantic segmentation images.
         """
         mmcv.mkdir_or_exist(imgfile_prefix)
-        result_files = []
-        prog_bar = mmcv.ProgressBar(len(self))
-        for idx in range(len(self)):
+        label_id_lut = self._get_label_id_lut() if to_label_id else None
+        palette = self._get_label_id_palette()
+
+        def write_result(idx):
             result = results[idx]
             if to_label_id:
-                result = self._convert_to_label_id(result)
+                result = self._convert_to_label_id(result, label_id_lut)
             filename = self.img_infos[idx]['filename']
             basename = osp.splitext(osp.basename(filename))[0]
 
             png_filename = osp.join(imgfile_prefix, f'{basename}.png')
 
             output = Image.fromarray(result.astype(np.uint8)).convert('P')
-            import cityscapesscripts.helpers.labels as CSLabels
-            palette = np.zeros((len(CSLabels.id2label), 3), dtype=np.uint8)
-            for label_id, label in CSLabels.id2label.items():
-                palette[label_id] = label.color
-
             output.putpalette(palette)
             output.save(png_filename)
-            result_files.append(png_filename)
-            prog_bar.update()
+
+            return png_filename
+
+        prog_bar = mmcv.ProgressBar(len(self))
+        if nproc > 1:
+            # PIL releases the GIL while encoding, so threads are enough and
+            # the results do not need to be copied to worker processes
+            with ThreadPoolExecutor(nproc) as executor:
+                result_files = []
+                for png_filename in executor.map(write_result, range(len(self))):
+                    result_files.append(png_filename)
+                    prog_bar.update()
+        else:
+            result_files = []
+            for idx in range(len(self)):
+                result_files.append(write_result(idx))
+                prog_bar.update()
 
         return result_files
 
-    def format_results(self, results, imgfile_prefix=None, to_label_id=True):
+    def format_results(self, results, imgfile_prefix=None, to_label_id=True, nproc=4):
         """Format the results into dir (standard format for Cityscapes
         evaluation).
 
@@ -100,6 +137,8 @@ class CityscapesDataset(CustomDataset):
                 Default: None.
             to_label_id (bool): whether convert output to label_id for
                 submission. Default: False
+            nproc (int): Number of threads encoding and saving the png files.
+                Default: 4.
 
         Returns:
             tuple: (result_files, tmp_dir), result_files is a list containing
@@ -107,7 +146,8 @@ class CityscapesDataset(CustomDataset):
                 for saving json/png files when img_prefix is not specified.
         """
 
-        assert isinstance(results, list), 'results must be a list'
+        assert isinstance(results, (list, PredictionStore)), \
+            'results must be a list or a PredictionStore'
         assert len(results) == len(self), (
             'The length of results is not equal to the dataset len: '
             f'{len(results)} != {len(self)}')
@@ -117,7 +157,7 @@ class CityscapesDataset(CustomDataset):
             imgfile_prefix = tmp_dir.name
         else:
             tmp_dir = None
-        result_files = self.results2img(results, imgfile_prefix, to_label_id)
+        result_files = self.results2img(results, imgfile_prefix, to_label_id, nproc)
 
         return result_files, tmp_dir
 
@@ -0,0 +1,111 @@
+import os
+import os.path as osp
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import mmcv
+import numpy as np
+
+
+class ClassHistogramIndex:
+    """Index of the per-image histograms of the ground truth labels.
+
+    The histogram of every segmentation map is computed once and keyed by
+    the absolute file path and its modification time, so only new or changed
+    annotations are decoded again. The index can be persisted to an ``.npz``
+    file, e.g. next to the annotations, to be reused across runs.
+
+    Args:
+        index_file (str, optional): The ``.npz`` file to persist the index.
+            If None, the index is kept in memory only. Default: None.
+    """
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        # absolute path -> (modification time, histogram)
+        self._entries = dict()
+        if self.index_file is not None and osp.exists(self.index_file):
+            self._load()
+
+    def _load(self):
+        with np.load(self.index_file) as data:
+            for filename, mtime, hist in zip(data['filenames'], data['mtimes'], data['histograms']):
+                self._entries[str(filename)] = (int(mtime), hist)
+
+    def _save(self):
+        filenames = sorted(self._entries)
+        num_bins = max([len(self._entries[_][1]) for _ in filenames], default=0)
+        histograms = np.zeros((len(filenames), num_bins), dtype=np.int64)
+        for i, filename in enumerate(filenames):
+            hist = self._entries[filename][1]
+            histograms[i, :len(hist)] = hist
+
+        index_dir = osp.dirname(osp.abspath(self.index_file))
+        mmcv.mkdir_or_exist(index_dir)
+        # write to a temporary file first, so concurrent readers never see a
+        # partially written index
+        with tempfile.NamedTemporaryFile(dir=index_dir, suffix='.npz', delete=False) as f:
+            np.savez(
+                f,
+                filenames=np.array(filenames, dtype=str),
+                mtimes=np.array([self._entries[_][0] for _ in filenames], dtype=np.int64),
+                histograms=histograms)
+        os.replace(f.name, self.index_file)
+
+    @staticmethod
+    def compute_histogram(seg_map):
+        """Count the pixels of every label value of a segmentation map.
+
+        Args:
+            seg_map (ndarray): The segmentation map.
+
+        Returns:
+            ndarray: The int64 histogram, indexed by the label values.
+        """
+
+        return np.bincount(seg_map.ravel(), minlength=256).astype(np.int64)
+
+    def get_histograms(self, filenames, load_fn, workers=0):
+        """Get the histograms of segmentation maps, updating the index.
+
+        Args:
+            filenames (list[str]): Paths to the segmentation maps.
+            load_fn (callable): Function loading a segmentation map from its
+                path, only called for the maps missing in the index.
+            workers (int): Number of threads decoding the missing maps.
+                Default: 0.
+
+        Returns:
+            ndarray: The histograms of shape (len(filenames), num_values),
+                the row ``i`` counts the pixels of every label value in the
+                map ``i``.
+        """
+
+        keys = []
+        for filename in filenames:
+            filename = osp.abspath(filename)
+            keys.append((filename, os.stat(filename).st_mtime_ns))
+
+        missing = [key for key in keys if self._entries.get(key[0], (None, ))[0] != key[1]]
+        if len(missing) > 0:
+            def compute(key):
+                return self.compute_histogram(load_fn(key[0]))
+
+            if workers > 0:
+                with ThreadPoolExecutor(workers) as pool:
+                    histograms = list(pool.map(compute, missing))
+            else:
+                histograms = [compute(key) for key in missing]
+
+            for (filename, mtime), hist in zip(missing, histograms):
+                self._entries[filename] = (mtime, hist)
+            if self.index_file is not None:
+                self._save()
+
+        num_bins = max([len(self._entries[key[0]][1]) for key in keys], default=0)
+        histograms = np.zeros((len(keys), num_bins), dtype=np.int64)
+        for i, key in enumerate(keys):
+            hist = self._entries[key[0]][1]
+            histograms[i, :len(hist)] = hist
+
+        return histograms
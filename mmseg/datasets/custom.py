@@ -1,18 +1,24 @@
 import os
 import os.path as osp
 from collections import OrderedDict
-from functools import reduce
+from concurrent.futures import ThreadPoolExecutor
 
 import mmcv
 import numpy as np
+import torch
+from mmcv.fileio.file_client import HardDiskBackend
 from mmcv.utils import print_log
 from prettytable import PrettyTable
 from torch.utils.data import Dataset
 
-from mmseg.core import eval_metrics
+from mmseg.core import (PredictionStore, build_label_lut, confusion_matrix,
+                        confusion_matrix_to_metrics, eval_metrics)
 from mmseg.utils import get_root_logger
 from .builder import DATASETS
+from .class_histograms import ClassHistogramIndex
+from .img_info_array import ImageInfoArray
 from .pipelines import Compose
+from .seg_map_cache import SegMapCache
 
 
 @DATASETS.register_module()
@@ -66,6 +72,31 @@ class CustomDataset(Dataset):
             The palette of segmentation map. If None is given, and
             self.PALETTE is None, random palette will be generated.
             Default: None
+        gt_seg_map_cache (str, optional): Cache of the decoded ground truth
+            maps used for evaluation. 'memory' keeps them in memory, any other
+            value is taken as a directory to keep them on disk. If None, the
+            maps are decoded on every evaluation. Default: None.
+        gt_seg_map_cache_bytes (int, optional): The byte budget of the
+            ground truth maps kept on disk, the least recently used ones
+            being removed beyond it, see :class:`SegMapCache`. If None, the
+            disk cache is unbounded. Default: None.
+        gt_seg_map_workers (int): Number of threads used to decode the ground
+            truth maps for evaluation. Default: 0.
+        class_hist_file (str, optional): ``.npz`` file to persist the
+            per-image class histograms used to discover the classes when
+            ``CLASSES`` is None. Relative paths are resolved against
+            ``ann_dir``. If None, the histograms are kept in memory only and
+            every new process, e.g. every run of ``tools/test.py``, decodes
+            all the annotations again to compute them; set it, e.g. to
+            ``'class_histograms.npz'``, to reuse them across runs.
+            Default: None.
+        file_client_args (dict): Arguments to instantiate the FileClient
+            listing the images and reading the split file and the ground truth
+            maps for evaluation, e.g. ``dict(backend='packed',
+            pack_dir=data_root)`` for a dataset packed with
+            ``tools/convert_datasets/pack_dataset.py``. The ground truth cache
+            and the class histogram file are only supported with the disk
+            backend. Default: dict(backend='disk').
     """
 
     CLASSES = None
@@ -84,7 +115,12 @@ class CustomDataset(Dataset):
                  ignore_index=255,
                  reduce_zero_label=False,
                  classes=None,
-                 palette=None):
+                 palette=None,
+                 gt_seg_map_cache=None,
+                 gt_seg_map_cache_bytes=None,
+                 gt_seg_map_workers=0,
+                 class_hist_file=None,
+                 file_client_args=dict(backend='disk')):
         self.pipeline = Compose(pipeline)
         self.img_dir = img_dir
         self.img_suffix = img_suffix
@@ -96,9 +132,23 @@ class CustomDataset(Dataset):
         self.ignore_index = ignore_index
         self.reduce_zero_label = reduce_zero_label
         self.label_map = None
+        self.gt_seg_map_workers = gt_seg_map_workers
+        self.file_client_args = file_client_args.copy()
+        self.file_client = mmcv.FileClient(**self.file_client_args)
+        is_disk = self.file_client_args['backend'] == 'disk'
+        assert is_disk or (gt_seg_map_cache is None and class_hist_file is None), \
+            'gt_seg_map_cache and class_hist_file are only supported with the disk backend'
 
         self.CLASSES, self.PALETTE = self.get_classes_and_palette(classes, palette)
 
+        # lookup tables to remap the labels with a single indexing pass:
+        # the first one is used by the loading pipeline, the second one also
+        # reduces the zero label for evaluation
+        self.label_map_lut = build_label_lut(self.label_map) \
+            if self.label_map is not None else None
+        self.label_lut = build_label_lut(self.label_map, self.reduce_zero_label) \
+            if self.label_map is not None or self.reduce_zero_label else None
+
         # join paths if data_root is specified
         if self.data_root is not None:
             if not osp.isabs(self.img_dir):
@@ -108,13 +158,25 @@ class CustomDataset(Dataset):
             if not (self.split is None or osp.isabs(self.split)):
                 self.split = osp.join(self.data_root, self.split)
 
+        if gt_seg_map_cache is None:
+            self.gt_seg_map_cache = None
+        elif gt_seg_map_cache == 'memory':
+            self.gt_seg_map_cache = SegMapCache()
+        else:
+            self.gt_seg_map_cache = SegMapCache(cache_dir=gt_seg_map_cache, max_bytes=gt_seg_map_cache_bytes)
+
+        if not (class_hist_file is None or self.ann_dir is None or osp.isabs(class_hist_file)):
+            class_hist_file = osp.join(self.ann_dir, class_hist_file)
+        self.class_hist_index = ClassHistogramIndex(class_hist_file)
+
         # load annotations
         self.img_infos = self.load_annotations(
             self.img_dir,
             self.img_suffix,
             self.ann_dir,
             self.seg_map_suffix,
-            self.split
+            self.split,
+            file_client=None if is_disk else self.file_client
         )
 
     def __len__(self):
@@ -122,7 +184,7 @@ class CustomDataset(Dataset):
         return len(self.img_infos)
 
     @staticmethod
-    def load_annotations(img_dir, img_suffix, ann_dir, seg_map_suffix, split):
+    def load_annotations(img_dir, img_suffix, ann_dir, seg_map_suffix, split, file_client=None):
         """Load annotation from directory.
 
         Args:
@@ -133,29 +195,40 @@ class CustomDataset(Dataset):
             split (str|None): Split txt file. If split is specified, only file
                 with suffix in the splits will be loaded. Otherwise, all images
                 in img_dir/ann_dir will be loaded. Default: None
+            file_client (:obj:`FileClient`, optional): The file client listing
+                img_dir and reading the split file. If None, they are read
+                from the disk. Default: None.
 
         Returns:
-            list[dict]: All image info of dataset.
+            :obj:`ImageInfoArray`: All image info of dataset, a compact
+                sequence of dicts shared by the forked data loader workers.
         """
 
-        img_infos = []
+        filenames, seg_maps = [], []
         if split is not None:
-            with open(split) as f:
-                for line in f:
-                    img_name = line.strip()
-                    img_info = dict(filename=img_name + img_suffix)
-                    if ann_dir is not None:
-                        seg_map = img_name + seg_map_suffix
-                        img_info['ann'] = dict(seg_map=seg_map)
-                    img_infos.append(img_info)
+            if file_client is not None:
+                lines = file_client.get_text(split).splitlines()
+            else:
+                with open(split) as f:
+                    lines = f.readlines()
+            for line in lines:
+                img_name = line.strip()
+                filenames.append(img_name + img_suffix)
+                seg_maps.append(img_name + seg_map_suffix)
         else:
-            for img in mmcv.scandir(img_dir, img_suffix, recursive=True):
-                img_info = dict(filename=img)
-                if ann_dir is not None:
-                    seg_map = img.replace(img_suffix, seg_map_suffix)
-                    img_info['ann'] = dict(seg_map=seg_map)
-                img_infos.append(img_info)
-
+            if file_client is None or isinstance(file_client.client, HardDiskBackend):
+                imgs = mmcv.scandir(img_dir, img_suffix, recursive=True)
+            elif hasattr(file_client.client, 'list_dir_or_file'):
+                imgs = file_client.client.list_dir_or_file(img_dir, list_dir=False, suffix=img_suffix, recursive=True)
+            else:
+                raise NotImplementedError(
+                    f'{file_client.client.__class__.__name__} cannot list {img_dir}, '
+                    'listing the storage backends of mmcv requires mmcv>=1.3.16')
+            for img in imgs:
+                filenames.append(img)
+                seg_maps.append(img.replace(img_suffix, seg_map_suffix))
+
+        img_infos = ImageInfoArray(filenames, seg_maps if ann_dir is not None else None)
         print_log(f'Loaded {len(img_infos)} images', logger=get_root_logger())
         return img_infos
 
@@ -178,6 +251,7 @@ class CustomDataset(Dataset):
         results['seg_prefix'] = self.ann_dir
         if self.custom_classes:
             results['label_map'] = self.label_map
+            results['label_lut'] = self.label_map_lut
 
     def __getitem__(self, idx):
         """Get training/test data after pipeline.
@@ -231,20 +305,120 @@ class CustomDataset(Dataset):
     def format_results(self, results, **kwargs):
         """Place holder to format result to dataset specific output."""
 
+    def get_gt_seg_map_by_idx(self, index, efficient_test=False):
+        """Get one ground truth segmentation map for evaluation."""
+        ann_info = self.get_ann_info(index)
+        seg_map = osp.join(self.ann_dir, ann_info['seg_map'])
+        if efficient_test:
+            return seg_map
+
+        return self._load_gt_seg_map(seg_map)
+
+    def _load_gt_seg_map(self, seg_map):
+        """Decode a ground truth segmentation map, using the cache if any."""
+        if self.gt_seg_map_cache is not None:
+            return self.gt_seg_map_cache.load(seg_map)
+        if self.file_client_args['backend'] != 'disk':
+            return mmcv.imfrombytes(self.file_client.get(seg_map), flag='unchanged', backend='pillow')
+
+        return mmcv.imread(seg_map, flag='unchanged', backend='pillow')
+
     def get_gt_seg_maps(self, efficient_test=False):
         """Get ground truth segmentation maps for evaluation."""
+        if self.gt_seg_map_workers > 0 and not efficient_test:
+            with ThreadPoolExecutor(self.gt_seg_map_workers) as pool:
+                return list(pool.map(self.get_gt_seg_map_by_idx, range(len(self))))
+
         gt_seg_maps = []
         for item_id in range(len(self)):
-            ann_info = self.get_ann_info(item_id)
-            seg_map = osp.join(self.ann_dir, ann_info['seg_map'])
-            if efficient_test:
-                gt_seg_map = seg_map
-            else:
-                gt_seg_map = mmcv.imread(seg_map, flag='unchanged', backend='pillow')
-            gt_seg_maps.append(gt_seg_map)
+            gt_seg_maps.append(self.get_gt_seg_map_by_idx(item_id, efficient_test))
 
         return gt_seg_maps
 
+    def get_class_histograms(self, gt_seg_maps=None):
+        """Get the per-image histograms of the ground truth labels.
+
+        The histograms are computed once and kept in
+        :obj:`ClassHistogramIndex`, they count the raw label values of the
+        annotation files, i.e. before ``label_map`` and ``reduce_zero_label``
+        are applied. The index is only saved to disk if ``class_hist_file``
+        is set, otherwise every new process computes the histograms again.
+
+        Args:
+            gt_seg_maps (list[ndarray], optional): The ground truth maps of
+                all the images, as returned by :meth:`get_gt_seg_maps`. If
+                given, the missing histograms are computed from them instead
+                of decoding the annotation files again. Default: None.
+
+        Returns:
+            ndarray: The histograms of shape (len(self), num_values).
+        """
+
+        seg_maps = [osp.join(self.ann_dir, self.get_ann_info(idx)['seg_map']) for idx in range(len(self))]
+        if gt_seg_maps is None:
+            load_fn = self._load_gt_seg_map
+        else:
+            assert len(gt_seg_maps) == len(seg_maps)
+            decoded = {osp.abspath(seg_map): gt_seg_map for seg_map, gt_seg_map in zip(seg_maps, gt_seg_maps)}
+
+            def load_fn(seg_map):
+                return decoded[osp.abspath(seg_map)]
+
+        if self.file_client_args['backend'] != 'disk':
+            # the index is keyed by the modification times of the files on
+            # the disk, so the histograms of other backends are not persisted
+            def compute(seg_map):
+                return ClassHistogramIndex.compute_histogram(load_fn(seg_map))
+
+            if self.gt_seg_map_workers > 0:
+                with ThreadPoolExecutor(self.gt_seg_map_workers) as pool:
+                    hists = list(pool.map(compute, seg_maps))
+            else:
+                hists = [compute(seg_map) for seg_map in seg_maps]
+
+            histograms = np.zeros((len(hists), max([len(hist) for hist in hists], default=0)), dtype=np.int64)
+            for i, hist in enumerate(hists):
+                histograms[i, :len(hist)] = hist
+            return histograms
+
+        return self.class_hist_index.get_histograms(seg_maps, load_fn, self.gt_seg_map_workers)
+
+    def pre_eval(self, preds, indices):
+        """Collect the confusion matrices of a batch of predictions.
+
+        It allows to evaluate the predictions on the fly, so they can be
+        dropped right after the forward pass instead of being kept until the
+        end of the test loop.
+
+        Args:
+            preds (list[ndarray] | ndarray): The predictions of the batch.
+            indices (list[int] | int): The dataset indices of the predictions.
+
+        Returns:
+            list[torch.Tensor]: The confusion matrices of the predictions.
+        """
+
+        if not isinstance(preds, list):
+            preds = [preds]
+        if not isinstance(indices, list):
+            indices = [indices]
+        assert len(preds) == len(indices)
+        assert self.CLASSES is not None, \
+            'CLASSES must be specified to evaluate the predictions on the fly'
+
+        pre_eval_results = []
+        for pred, index in zip(preds, indices):
+            seg_map = self.get_gt_seg_map_by_idx(index)
+            pre_eval_results.append(confusion_matrix(
+                pred,
+                seg_map,
+                len(self.CLASSES),
+                self.ignore_index,
+                label_lut=self.label_lut
+            ))
+
+        return pre_eval_results
+
     def get_classes_and_palette(self, classes=None, palette=None):
         """Get class names of current dataset.
 
@@ -318,7 +492,10 @@ class CustomDataset(Dataset):
         """Evaluate the dataset.
 
         Args:
-            results (list): Testing results of the dataset.
+            results (list[ndarray] | PredictionStore | list[torch.Tensor]):
+                Testing results of the dataset or the confusion matrices
+                collected by :meth:`pre_eval`. The data files of a
+                :obj:`PredictionStore` are removed after the evaluation.
             metric (str | list[str]): Metrics to be evaluated. 'mIoU',
                 'mDice' and 'mFscore' are supported.
             logger (logging.Logger | None | str): Logger used for printing
@@ -335,22 +512,32 @@ class CustomDataset(Dataset):
         if not set(metric).issubset(set(allowed_metrics)):
             raise KeyError('metric {} is not supported'.format(metric))
 
-        gt_seg_maps = self.get_gt_seg_maps(efficient_test)
-        num_classes = len(reduce(np.union1d, [np.unique(_) for _ in gt_seg_maps])) \
-            if self.CLASSES is None else len(self.CLASSES)
+        if isinstance(results, torch.Tensor) or mmcv.is_list_of(results, torch.Tensor):
+            # confusion matrices collected by pre_eval
+            total_conf_mat = results if isinstance(results, torch.Tensor) else sum(results)
+            num_classes = total_conf_mat.shape[0]
+            ret_metrics = confusion_matrix_to_metrics(total_conf_mat, metric)
+        else:
+            gt_seg_maps = self.get_gt_seg_maps(efficient_test)
+            if self.CLASSES is None:
+                # the missing histograms are computed from the decoded maps
+                histograms = self.get_class_histograms(None if efficient_test else gt_seg_maps)
+                num_classes = np.count_nonzero(histograms.sum(axis=0))
+            else:
+                num_classes = len(self.CLASSES)
+
+            ret_metrics = eval_metrics(
+                results,
+                gt_seg_maps,
+                num_classes,
+                self.ignore_index,
+                metric,
+                label_lut=self.label_lut
+            )
+
         class_names = tuple(range(num_classes)) \
             if self.CLASSES is None else self.CLASSES
 
-        ret_metrics = eval_metrics(
-            results,
-            gt_seg_maps,
-            num_classes,
-            self.ignore_index,
-            metric,
-            label_map=self.label_map,
-            reduce_zero_label=self.reduce_zero_label
-        )
-
         # summary table
         ret_metrics_summary = OrderedDict({
             ret_metric: np.round(np.nanmean(ret_metric_value) * 100.0, 2)
@@ -402,5 +589,7 @@ class CustomDataset(Dataset):
         if mmcv.is_list_of(results, str):
             for file_name in results:
                 os.remove(file_name)
+        elif isinstance(results, PredictionStore):
+            results.cleanup()
 
         return eval_results
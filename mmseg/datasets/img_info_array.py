@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def _pack_strings(strings):
+    """Pack strings into a single utf-8 buffer and an offset array."""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class ImageInfoArray:
+    """Compact sequence of the image infos of a dataset.
+
+    The file names and the segmentation map names are kept in contiguous
+    numpy buffers with offset arrays instead of a list of nested dicts, so
+    the data loader workers forked from the main process never touch the
+    reference counts of millions of small Python objects and share the
+    infos instead of copying them on write. The dicts are built on demand
+    by :meth:`__getitem__`, in the format of
+    :meth:`CustomDataset.load_annotations`.
+
+    Args:
+        filenames (list[str]): The image file names.
+        seg_maps (list[str], optional): The segmentation map file names, one
+            per image. If None, the infos have no ``ann`` key.
+            Default: None.
+    """
+
+    def __init__(self, filenames, seg_maps=None):
+        assert seg_maps is None or len(seg_maps) == len(filenames)
+        self._filenames, self._filename_offsets = _pack_strings(filenames)
+        if seg_maps is not None:
+            self._seg_maps, self._seg_map_offsets = _pack_strings(seg_maps)
+        else:
+            self._seg_maps, self._seg_map_offsets = None, None
+
+    @staticmethod
+    def _get_string(buffer, offsets, idx):
+        return buffer[offsets[idx]:offsets[idx + 1]].tobytes().decode('utf-8')
+
+    def __len__(self):
+        return len(self._filename_offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('image info index out of range')
+
+        img_info = dict(filename=self._get_string(self._filenames, self._filename_offsets, idx))
+        if self._seg_maps is not None:
+            img_info['ann'] = dict(seg_map=self._get_string(self._seg_maps, self._seg_map_offsets, idx))
+
+        return img_info
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
@@ -0,0 +1,233 @@
+import mmap
+import os
+import os.path as osp
+import tempfile
+
+import mmcv
+import numpy as np
+from mmcv.fileio import BaseStorageBackend, FileClient
+
+INDEX_FILE = 'index.npz'
+
+
+def _shard_file(shard_id):
+    return f'shard_{shard_id:05d}.bin'
+
+
+class PackedWriter:
+    """Writer of a packed dataset.
+
+    A packed dataset is a directory of large shard files holding the encoded
+    files one after the other, and of a binary index giving the shard, the
+    byte offset and the size of every file, keyed by its path relative to the
+    packed directory.
+
+    Args:
+        pack_dir (str): The directory of the packed dataset.
+        shard_size (int): The size in bytes from which a new shard is
+            started. Default: 1GB.
+    """
+
+    def __init__(self, pack_dir, shard_size=1024**3):
+        assert shard_size > 0
+        self.pack_dir = pack_dir
+        self.shard_size = shard_size
+        mmcv.mkdir_or_exist(pack_dir)
+
+        self.keys = []
+        self.shards = []
+        self.offsets = []
+        self.sizes = []
+        self._shard_id = -1
+        self._writer = None
+        self._offset = 0
+
+    def add(self, key, data):
+        """Append the encoded bytes of a file.
+
+        Args:
+            key (str): The path of the file relative to the packed directory.
+            data (bytes): The content of the file.
+        """
+
+        if self._writer is None or self._offset >= self.shard_size:
+            self._next_shard()
+
+        self._writer.write(data)
+        self.keys.append(key.replace(os.sep, '/'))
+        self.shards.append(self._shard_id)
+        self.offsets.append(self._offset)
+        self.sizes.append(len(data))
+        self._offset += len(data)
+
+    def _next_shard(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._shard_id += 1
+        self._writer = open(osp.join(self.pack_dir, _shard_file(self._shard_id)), 'wb')
+        self._offset = 0
+
+    def close(self):
+        """Finish the last shard and write the index."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+        # write to a temporary file first, so readers never see a partially
+        # written index
+        with tempfile.NamedTemporaryFile(dir=self.pack_dir, suffix='.npz', delete=False) as f:
+            np.savez(
+                f,
+                keys=np.array(self.keys, dtype=str),
+                shards=np.array(self.shards, dtype=np.int32),
+                offsets=np.array(self.offsets, dtype=np.int64),
+                sizes=np.array(self.sizes, dtype=np.int64))
+        os.replace(f.name, osp.join(self.pack_dir, INDEX_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            # the pack is incomplete, so no index is written and it cannot be
+            # mistaken for a valid one
+            self._writer.close()
+            self._writer = None
+
+
+def pack_directory(src_dir, pack_dir, suffixes=None, shard_size=1024**3):
+    """Pack all the files of a directory into a packed dataset.
+
+    Args:
+        src_dir (str): The directory to pack, e.g. ``data/DRIVE``.
+        pack_dir (str): The directory of the packed dataset.
+        suffixes (tuple[str], optional): Only the files with these suffixes
+            are packed. If None, all the files are packed. Default: None.
+        shard_size (int): The size in bytes from which a new shard is
+            started. Default: 1GB.
+
+    Returns:
+        int: The number of packed files.
+    """
+
+    filenames = sorted(mmcv.scandir(src_dir, suffixes, recursive=True))
+    with PackedWriter(pack_dir, shard_size) as writer:
+        for filename in filenames:
+            with open(osp.join(src_dir, filename), 'rb') as f:
+                writer.add(filename, f.read())
+
+    return len(filenames)
+
+
+class PackedBackend(BaseStorageBackend):
+    """Storage backend reading the files of a packed dataset.
+
+    The paths are resolved relative to ``pack_dir``, so a dataset whose
+    ``data_root`` is the packed directory is read with the same ``img_dir``
+    and ``ann_dir`` as the original one. Every file is read with a single
+    copy from the memory-mapped shard.
+
+    Example:
+        >>> file_client = mmcv.FileClient(backend='packed', pack_dir='data/DRIVE.pack')
+        >>> img_bytes = file_client.get('data/DRIVE.pack/images/training/21.png')
+
+    Args:
+        pack_dir (str): The directory of the packed dataset.
+    """
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        with np.load(osp.join(pack_dir, INDEX_FILE)) as index:
+            keys = index['keys']
+            self._index = {
+                str(key): (int(shard), int(offset), int(size))
+                for key, shard, offset, size in zip(keys, index['shards'], index['offsets'], index['sizes'])
+            }
+        self._shards = dict()
+
+    def __getstate__(self):
+        # the memory maps are reopened by every process
+        state = self.__dict__.copy()
+        state['_shards'] = dict()
+        return state
+
+    def _get_key(self, filepath):
+        filepath = str(filepath)
+        if osp.isabs(filepath) != osp.isabs(self.pack_dir):
+            filepath = osp.abspath(filepath)
+            pack_dir = osp.abspath(self.pack_dir)
+        else:
+            pack_dir = self.pack_dir
+
+        return osp.relpath(filepath, pack_dir).replace(os.sep, '/')
+
+    def _get_shard(self, shard_id):
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            with open(osp.join(self.pack_dir, _shard_file(shard_id)), 'rb') as f:
+                shard = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._shards[shard_id] = shard
+
+        return shard
+
+    def exists(self, filepath):
+        """Whether a file or a directory is in the packed dataset."""
+        return self.isfile(filepath) or self.isdir(filepath)
+
+    def isfile(self, filepath):
+        """Whether a file is in the packed dataset."""
+        return self._get_key(filepath) in self._index
+
+    def isdir(self, filepath):
+        """Whether a directory is in the packed dataset."""
+        prefix = self._get_prefix(filepath)
+        return prefix == '' or any(key.startswith(prefix) for key in self._index)
+
+    def get(self, filepath):
+        """Read the bytes of a file of the packed dataset."""
+        key = self._get_key(filepath)
+        if key not in self._index:
+            raise FileNotFoundError(f'{filepath} is not in the packed dataset {self.pack_dir}')
+        shard_id, offset, size = self._index[key]
+        if size == 0:
+            return b''
+
+        return self._get_shard(shard_id)[offset:offset + size]
+
+    def get_text(self, filepath, encoding='utf-8'):
+        """Read the text of a file of the packed dataset."""
+        return self.get(filepath).decode(encoding)
+
+    def _get_prefix(self, dir_path):
+        prefix = self._get_key(dir_path).rstrip('/')
+        return '' if prefix == '.' else prefix + '/'
+
+    def list_dir_or_file(self, dir_path, list_dir=True, list_file=True, suffix=None, recursive=False):
+        """List the directories and files of a directory of the packed
+        dataset, with the same arguments as the other storage backends.
+
+        Returns:
+            list[str]: The sorted paths relative to ``dir_path``.
+        """
+
+        if list_dir and suffix is not None:
+            raise TypeError('`suffix` should be None when `list_dir` is True')
+
+        prefix = self._get_prefix(dir_path)
+        paths = set()
+        for key in self._index:
+            if not key.startswith(prefix):
+                continue
+            parts = key[len(prefix):].split('/')
+            if list_dir:
+                num_dirs = len(parts) - 1 if recursive else min(len(parts) - 1, 1)
+                paths.update('/'.join(parts[:i + 1]) for i in range(num_dirs))
+            if list_file and (recursive or len(parts) == 1) and (suffix is None or key.endswith(suffix)):
+                paths.add('/'.join(parts))
+
+        return sorted(paths)
+
+
+FileClient.register_backend('packed', PackedBackend)
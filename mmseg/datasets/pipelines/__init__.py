@@ -1,17 +1,19 @@
 from .compose import Compose, ProbCompose, MaskCompose
+from .decode_cache import DecodeCache
 from .formating import (Collect, ImageToTensor, ToDataContainer, ToTensor,
                         Transpose, to_tensor)
 from .loading import LoadAnnotations, LoadImageFromFile
 from .test_time_aug import MultiScaleFlipAug
 from .transforms import (CLAHE, AdjustGamma, Normalize, Pad,
                          PhotoMetricDistortion, RandomCrop, RandomFlip,
-                         RandomRotate, Rerange, Resize, RGB2Gray, SegRescale,
-                         CrossNorm, MixUp, BorderWeighting, Empty)
+                         RandomRotate, Rerange, Resize, ResizeCrop, RGB2Gray,
+                         SegRescale, CrossNorm, MixUp, BorderWeighting, Empty)
 
 __all__ = [
     'Compose',
     'ProbCompose',
     'MaskCompose',
+    'DecodeCache',
     'to_tensor',
     'ToTensor',
     'ImageToTensor',
@@ -22,6 +24,7 @@ __all__ = [
     'LoadImageFromFile',
     'MultiScaleFlipAug',
     'Resize',
+    'ResizeCrop',
     'RandomFlip',
     'Pad',
     'RandomCrop',
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import os.path as osp
+import tempfile
+
+import mmcv
+import numpy as np
+
+
+class DecodeCache(object):
+    """Cache of decoded arrays shared by the data loader workers.
+
+    Every decoded array is stored as an ``.npy`` file in ``cache_dir``, by
+    default a directory of the shared memory file system ``/dev/shm`` if it
+    exists, so the arrays decoded by a worker are read back by all the other
+    workers and epochs without decoding the files again. The entries are
+    keyed by the filename, its modification time if it is a local file and
+    the decode flags.
+
+    The cache holds about ``max_bytes`` bytes. The modification time of an
+    entry is updated when it is read. Every process keeps a running total of
+    the cache size, updated by its own writes, and only scans the cache
+    directory when the total exceeds the budget, to remove the least
+    recently used entries. The entries written by the other processes since
+    the last scan are not in the total, so the cache may exceed the budget
+    until the next scan. The entries are written atomically, so the cache is
+    safe to use from several processes.
+
+    Args:
+        max_bytes (int): The byte budget of the cache.
+        cache_dir (str, optional): The directory of the cache. Default: None.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None):
+        assert max_bytes > 0
+        if cache_dir is None:
+            root = '/dev/shm' if osp.isdir('/dev/shm') else tempfile.gettempdir()
+            uid = os.getuid() if hasattr(os, 'getuid') else 0
+            cache_dir = osp.join(root, f'mmseg_decode_cache_{uid}')
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        # the size of the cache at the last scan plus the size of the entries
+        # written since, None until the first write
+        self._total_bytes = None
+
+    def __getstate__(self):
+        # every data loader worker counts its own writes
+        state = self.__dict__.copy()
+        state['_total_bytes'] = None
+        return state
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(max_bytes={self.max_bytes}, '
+                f"cache_dir='{self.cache_dir}')")
+
+    def _get_path(self, filename, flags):
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except OSError:
+            # not a local file, e.g. read by another FileClient backend
+            mtime = None
+        key = hashlib.sha1(repr((filename, mtime, flags)).encode()).hexdigest()
+
+        return osp.join(self.cache_dir, key + '.npy')
+
+    def get(self, filename, flags, decode_fn):
+        """Get the decoded array of a file, decoding it on a cache miss.
+
+        Args:
+            filename (str): The file to decode.
+            flags (tuple): The decode flags, part of the cache key.
+            decode_fn (callable): The function decoding the file, called with
+                ``filename`` on a cache miss.
+
+        Returns:
+            ndarray: The decoded array.
+        """
+
+        path = self._get_path(filename, flags)
+        try:
+            array = np.load(path)
+        except (OSError, ValueError):
+            # missing, being evicted by another worker or partially written
+            array = None
+        if array is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return array
+
+        array = decode_fn(filename)
+        if array.nbytes <= self.max_bytes:
+            self._put(path, array)
+
+        return array
+
+    def _put(self, path, array):
+        mmcv.mkdir_or_exist(self.cache_dir)
+        # write to a temporary file first, so the other workers never read a
+        # partially written entry
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            np.save(f, array)
+            size = f.tell()
+        os.replace(f.name, path)
+
+        if self._total_bytes is None:
+            self._evict()
+        else:
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Scan the cache and remove the least recently used entries beyond
+        the budget."""
+
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.npy'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total_bytes = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already removed by another worker
+                pass
+            total_bytes -= size
+
+        self._total_bytes = total_bytes
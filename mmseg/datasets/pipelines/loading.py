@@ -3,7 +3,9 @@ import os.path as osp
 import mmcv
 import numpy as np
 
+from mmseg.core.evaluation.metrics import build_label_lut
 from ..builder import PIPELINES
+from .decode_cache import DecodeCache
 
 
 @PIPELINES.register_module()
@@ -26,18 +28,29 @@ class LoadImageFromFile(object):
             Defaults to ``dict(backend='disk')``.
         imdecode_backend (str): Backend for :func:`mmcv.imdecode`. Default:
             'cv2'
+        decode_cache (dict, optional): Arguments to instantiate a
+            :obj:`DecodeCache` shared by the data loader workers, e.g.
+            ``dict(max_bytes=2 * 1024**3)``. If None, the images are decoded
+            on every call. Default: None.
     """
 
     def __init__(self,
                  to_float32=False,
                  color_type='color',
                  file_client_args=dict(backend='disk'),
-                 imdecode_backend='cv2'):
+                 imdecode_backend='cv2',
+                 decode_cache=None):
         self.to_float32 = to_float32
         self.color_type = color_type
         self.file_client_args = file_client_args.copy()
         self.file_client = None
         self.imdecode_backend = imdecode_backend
+        self.decode_cache = DecodeCache(**decode_cache) if decode_cache is not None else None
+
+    def _decode(self, filename):
+        img_bytes = self.file_client.get(filename)
+        return mmcv.imfrombytes(
+            img_bytes, flag=self.color_type, backend=self.imdecode_backend)
 
     def __call__(self, results):
         """Call functions to load image and get image meta information.
@@ -57,9 +70,10 @@ class LoadImageFromFile(object):
                                 results['img_info']['filename'])
         else:
             filename = results['img_info']['filename']
-        img_bytes = self.file_client.get(filename)
-        img = mmcv.imfrombytes(
-            img_bytes, flag=self.color_type, backend=self.imdecode_backend)
+        if self.decode_cache is not None:
+            img = self.decode_cache.get(filename, (self.color_type, self.imdecode_backend), self._decode)
+        else:
+            img = self._decode(filename)
         if self.to_float32:
             img = img.astype(np.float32)
 
@@ -99,16 +113,28 @@ class LoadAnnotations(object):
             Defaults to ``dict(backend='disk')``.
         imdecode_backend (str): Backend for :func:`mmcv.imdecode`. Default:
             'pillow'
+        decode_cache (dict, optional): Arguments to instantiate a
+            :obj:`DecodeCache` shared by the data loader workers. The label
+            maps are cached before the label mapping. Default: None.
     """
 
     def __init__(self,
                  reduce_zero_label=False,
                  file_client_args=dict(backend='disk'),
-                 imdecode_backend='pillow'):
+                 imdecode_backend='pillow',
+                 decode_cache=None):
         self.reduce_zero_label = reduce_zero_label
+        self.reduce_lut = build_label_lut(reduce_zero_label=True) if reduce_zero_label else None
         self.file_client_args = file_client_args.copy()
         self.file_client = None
         self.imdecode_backend = imdecode_backend
+        self.decode_cache = DecodeCache(**decode_cache) if decode_cache is not None else None
+
+    def _decode(self, filename):
+        img_bytes = self.file_client.get(filename)
+        return mmcv.imfrombytes(
+            img_bytes, flag='unchanged',
+            backend=self.imdecode_backend).squeeze().astype(np.uint8)
 
     def __call__(self, results):
         """Call function to load multiple types annotations.
@@ -128,20 +154,21 @@ class LoadAnnotations(object):
                                 results['ann_info']['seg_map'])
         else:
             filename = results['ann_info']['seg_map']
-        img_bytes = self.file_client.get(filename)
-        gt_semantic_seg = mmcv.imfrombytes(
-            img_bytes, flag='unchanged',
-            backend=self.imdecode_backend).squeeze().astype(np.uint8)
-        # modify if custom classes
-        if results.get('label_map', None) is not None:
-            for old_id, new_id in results['label_map'].items():
-                gt_semantic_seg[gt_semantic_seg == old_id] = new_id
+        if self.decode_cache is not None:
+            gt_semantic_seg = self.decode_cache.get(
+                filename, ('unchanged', self.imdecode_backend), self._decode)
+        else:
+            gt_semantic_seg = self._decode(filename)
+        # modify if custom classes, the dataset provides the lookup table
+        # built once from its label_map
+        label_lut = results.get('label_lut', None)
+        if label_lut is None and results.get('label_map', None) is not None:
+            label_lut = build_label_lut(results['label_map'])
         # reduce zero_label
         if self.reduce_zero_label:
-            # avoid using underflow conversion
-            gt_semantic_seg[gt_semantic_seg == 0] = 255
-            gt_semantic_seg = gt_semantic_seg - 1
-            gt_semantic_seg[gt_semantic_seg == 254] = 255
+            label_lut = self.reduce_lut if label_lut is None else self.reduce_lut[label_lut]
+        if label_lut is not None:
+            gt_semantic_seg = label_lut[gt_semantic_seg]
         results['gt_semantic_seg'] = gt_semantic_seg
         results['seg_fields'].append('gt_semantic_seg')
         return results
@@ -1,5 +1,6 @@
 import os.path as osp
 
+import cv2
 import mmcv
 import numpy as np
 from mmcv.utils import deprecated_api_warning, is_tuple_of
@@ -545,6 +546,22 @@ class RandomCrop(object):
         img = img[crop_y1:crop_y2, crop_x1:crop_x2, ...]
         return img
 
+    def _count_labels(self, seg):
+        """Count the pixels of the labels present in ``seg``, except
+        ``ignore_index``.
+
+        Unsigned maps are counted with a linear ``np.bincount`` pass instead
+        of the sort of ``np.unique``.
+        """
+        if seg.dtype.kind != 'u' or seg.size == 0:
+            labels, cnt = np.unique(seg, return_counts=True)
+            return cnt[labels != self.ignore_index]
+
+        cnt = np.bincount(seg.ravel())
+        if 0 <= self.ignore_index < len(cnt):
+            cnt[self.ignore_index] = 0
+        return cnt[cnt > 0]
+
     def __call__(self, results):
         """Call function to randomly crop images, semantic segmentation maps.
 
@@ -562,8 +579,7 @@ class RandomCrop(object):
             # Repeat 10 times
             for _ in range(10):
                 seg_temp = self.crop(results['gt_semantic_seg'], crop_bbox)
-                labels, cnt = np.unique(seg_temp, return_counts=True)
-                cnt = cnt[labels != self.ignore_index]
+                cnt = self._count_labels(seg_temp)
                 if len(cnt) > 1 and np.max(cnt) / np.sum(
                         cnt) < self.cat_max_ratio:
                     break
@@ -585,6 +601,141 @@ class RandomCrop(object):
         return self.__class__.__name__ + f'(crop_size={self.crop_size})'
 
 
+@PIPELINES.register_module()
+class ResizeCrop(object):
+    """Resize and random crop the image & seg in a single resampling pass.
+
+    It is equivalent to :obj:`Resize` followed by :obj:`RandomCrop`, but the
+    crop window is drawn in the coordinates of the resized image first and
+    only the source region covered by the window is resampled, so a large
+    resize ratio does not resample the whole image to keep a small crop. The
+    scale and the crop window are drawn from the same distributions as the
+    two transforms, the image is resampled with bilinear interpolation and
+    the segmentation maps with the nearest neighbour.
+
+    When ``cat_max_ratio < 1``, the crop is rejected on the class
+    distribution of the resized label, so the two transforms are applied one
+    after the other.
+
+    Args:
+        img_scale (tuple or list[tuple]): Images scales for resizing.
+        multiscale_mode (str): Either "range" or "value".
+        ratio_range (tuple[float]): (min_ratio, max_ratio)
+        keep_ratio (bool): Whether to keep the aspect ratio when resizing the
+            image.
+        crop_size (tuple): Expected size after cropping, (h, w).
+        cat_max_ratio (float): The maximum ratio that single category could
+            occupy.
+        ignore_index (int): The label index ignored by ``cat_max_ratio``.
+            Default: 255.
+    """
+
+    def __init__(self,
+                 crop_size,
+                 img_scale=None,
+                 multiscale_mode='range',
+                 ratio_range=None,
+                 keep_ratio=True,
+                 cat_max_ratio=1.,
+                 ignore_index=255):
+        self.resize = Resize(img_scale, multiscale_mode, ratio_range, keep_ratio)
+        self.random_crop = RandomCrop(crop_size, cat_max_ratio, ignore_index)
+
+    @staticmethod
+    def _resize_crop_img(img, scale_factor, crop_bbox):
+        """Bilinearly resample the crop of the resized image from the source
+        region it covers, with the pixel mapping of ``cv2.resize``."""
+        crop_y1, crop_y2, crop_x1, crop_x2 = crop_bbox
+        w_scale, h_scale = scale_factor
+        h, w = img.shape[:2]
+
+        # source region covered by the crop, with a pixel margin for the
+        # bilinear neighbours
+        src_x1 = max(int(np.floor((crop_x1 + 0.5) / w_scale - 0.5)) - 1, 0)
+        src_x2 = min(int(np.ceil((crop_x2 - 0.5) / w_scale - 0.5)) + 2, w)
+        src_y1 = max(int(np.floor((crop_y1 + 0.5) / h_scale - 0.5)) - 1, 0)
+        src_y2 = min(int(np.ceil((crop_y2 - 0.5) / h_scale - 0.5)) + 2, h)
+
+        # map the output pixels to the source region
+        matrix = np.array([[1. / w_scale, 0., (crop_x1 + 0.5) / w_scale - 0.5 - src_x1],
+                           [0., 1. / h_scale, (crop_y1 + 0.5) / h_scale - 0.5 - src_y1]])
+
+        return cv2.warpAffine(
+            img[src_y1:src_y2, src_x1:src_x2],
+            matrix, (crop_x2 - crop_x1, crop_y2 - crop_y1),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE)
+
+    @staticmethod
+    def _resize_crop_seg(seg, size, crop_bbox):
+        """Nearest neighbour resample the crop of the resized map, with the
+        pixel mapping of ``cv2.resize``."""
+        crop_y1, crop_y2, crop_x1, crop_x2 = crop_bbox
+        new_w, new_h = size
+        h, w = seg.shape[:2]
+
+        ys = np.minimum(np.floor(np.arange(crop_y1, crop_y2) * (1. / (new_h / h))).astype(np.int64), h - 1)
+        xs = np.minimum(np.floor(np.arange(crop_x1, crop_x2) * (1. / (new_w / w))).astype(np.int64), w - 1)
+
+        return seg[ys[:, None], xs]
+
+    def __call__(self, results):
+        """Call function to resize and randomly crop images, semantic
+        segmentation maps.
+
+        Args:
+            results (dict): Result dict from loading pipeline.
+
+        Returns:
+            dict: Resized and cropped results, with the keys of
+                :obj:`Resize` and :obj:`RandomCrop`.
+        """
+
+        img = results['img']
+        if self.random_crop.cat_max_ratio < 1. or (img.ndim == 3 and img.shape[2] > 4):
+            return self.random_crop(self.resize(results))
+
+        if 'scale' not in results:
+            self.resize._random_scale(results)
+
+        h, w = img.shape[:2]
+        if self.resize.keep_ratio:
+            new_w, new_h = mmcv.rescale_size((w, h), results['scale'])
+        else:
+            new_w, new_h = results['scale']
+        w_scale, h_scale = new_w / w, new_h / h
+
+        # the same draw as RandomCrop on the resized image
+        crop_bbox = self.random_crop.get_crop_bbox(np.empty((new_h, new_w), dtype=np.uint8))
+        crop_y1, crop_y2, crop_x1, crop_x2 = crop_bbox
+        crop_bbox = crop_y1, min(crop_y2, new_h), crop_x1, min(crop_x2, new_w)
+
+        img = self._resize_crop_img(img, (w_scale, h_scale), crop_bbox)
+        if img.ndim < results['img'].ndim:
+            # cv2 drops the channel axis of single channel images
+            img = img[..., None]
+        results['img'] = img
+        results['img_shape'] = img.shape
+        results['pad_shape'] = (new_h, new_w) + img.shape[2:]
+        results['scale_factor'] = np.array([w_scale, h_scale, w_scale, h_scale], dtype=np.float32)
+        results['keep_ratio'] = self.resize.keep_ratio
+
+        for key in results.get('seg_fields', []):
+            results[key] = self._resize_crop_seg(results[key], (new_w, new_h), crop_bbox)
+
+        return results
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += (f'(crop_size={self.random_crop.crop_size}, '
+                     f'img_scale={self.resize.img_scale}, '
+                     f'multiscale_mode={self.resize.multiscale_mode}, '
+                     f'ratio_range={self.resize.ratio_range}, '
+                     f'keep_ratio={self.resize.keep_ratio}, '
+                     f'cat_max_ratio={self.random_crop.cat_max_ratio})')
+        return repr_str
+
+
 @PIPELINES.register_module()
 class RandomRotate(object):
     """Rotate the image & seg.
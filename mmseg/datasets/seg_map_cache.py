@@ -0,0 +1,154 @@
+import hashlib
+import os
+import os.path as osp
+import tempfile
+
+import mmcv
+import numpy as np
+
+
+class SegMapCache:
+    """Cache of decoded segmentation maps.
+
+    The decoded uint8 label maps are keyed by the absolute file path and its
+    modification time, so an annotation that has been changed on disk is
+    decoded again instead of being served from the cache.
+
+    The maps kept on disk are bounded by ``max_bytes``, with the same least
+    recently used eviction as :class:`DecodeCache`: the modification time of
+    a cache file is updated when it is read, and the cache directory is only
+    scanned when the running total of the cache size exceeds the budget. The
+    files of the annotations changed on disk are never read again, so they
+    are the first ones to be removed. If ``max_bytes`` is None, the cache
+    grows with every new annotation and can be emptied with :meth:`clear`.
+
+    Args:
+        cache_dir (str, optional): Directory to keep the decoded maps as
+            ``.npy`` files. If None, the maps are kept in memory.
+            Default: None.
+        max_bytes (int, optional): The byte budget of the maps kept on disk.
+            If None, the cache is unbounded. Default: None.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        assert max_bytes is None or max_bytes > 0
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if self.cache_dir is not None:
+            mmcv.mkdir_or_exist(self.cache_dir)
+        self._memory_cache = dict()
+        # the size of the cache at the last scan plus the size of the files
+        # written since, None until the first write
+        self._total_bytes = None
+
+    @staticmethod
+    def _get_key(filename):
+        filename = osp.abspath(filename)
+        mtime = os.stat(filename).st_mtime_ns
+
+        return filename, mtime
+
+    def _get_cache_file(self, key):
+        key_hash = hashlib.sha1(f'{key[0]}:{key[1]}'.encode()).hexdigest()
+
+        return osp.join(self.cache_dir, f'{key_hash}.npy')
+
+    def load(self, filename):
+        """Load a segmentation map, decoding it only on a cache miss.
+
+        Args:
+            filename (str): Path to the segmentation map.
+
+        Returns:
+            ndarray: The decoded segmentation map.
+        """
+
+        key = self._get_key(filename)
+
+        if self.cache_dir is None:
+            cached = self._memory_cache.get(key[0])
+            if cached is not None and cached[0] == key[1]:
+                return cached[1]
+        else:
+            cache_file = self._get_cache_file(key)
+            try:
+                seg_map = np.load(cache_file)
+            except (OSError, ValueError):
+                # missing or being evicted
+                seg_map = None
+            if seg_map is not None:
+                if self.max_bytes is not None:
+                    try:
+                        os.utime(cache_file)
+                    except OSError:
+                        pass
+                return seg_map
+
+        seg_map = mmcv.imread(filename, flag='unchanged', backend='pillow')
+
+        if self.cache_dir is None:
+            self._memory_cache[key[0]] = (key[1], seg_map)
+        elif self.max_bytes is None or seg_map.nbytes <= self.max_bytes:
+            self._put(cache_file, seg_map)
+
+        return seg_map
+
+    def _put(self, cache_file, seg_map):
+        # write to a temporary file first, so concurrent readers never see a
+        # partially written cache file
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            np.save(f, seg_map)
+            size = f.tell()
+        os.replace(f.name, cache_file)
+
+        if self.max_bytes is None:
+            return
+        if self._total_bytes is None:
+            self._evict()
+        else:
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.npy'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        return entries
+
+    def _evict(self):
+        """Scan the cache and remove the least recently used maps beyond the
+        budget."""
+
+        entries = self._scan()
+        total_bytes = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already removed by another process
+                pass
+            total_bytes -= size
+
+        self._total_bytes = total_bytes
+
+    def clear(self):
+        """Drop the decoded maps kept in memory and remove the ones kept on
+        disk."""
+        self._memory_cache.clear()
+        if self.cache_dir is not None and osp.isdir(self.cache_dir):
+            for _, _, path in self._scan():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._total_bytes = None
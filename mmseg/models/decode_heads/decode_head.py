@@ -42,6 +42,9 @@ class BaseDecodeHead(nn.Module, metaclass=ABCMeta):
             Default: None.
         align_corners (bool): align_corners argument of F.interpolate.
             Default: False.
+
+    At inference, the outputs can be restricted to a subset of the classes
+    with :meth:`set_class_subset`.
     """
 
     def __init__(self,
@@ -106,6 +109,42 @@ class BaseDecodeHead(nn.Module, metaclass=ABCMeta):
                     kernel_size=1
                 )
 
+        self.set_class_subset(None)
+
+    def set_class_subset(self, class_ids=None, with_other=False):
+        """Restrict the test outputs to a subset of the classes.
+
+        Only the rows of ``conv_seg`` of the selected classes are applied, so
+        the outputs have ``len(class_ids)`` channels in the order of
+        ``class_ids``. With ``with_other=True``, an extra last channel gives
+        the log-sum-exp of the logits of the other classes, so the softmax
+        of this channel is the probability of any other class. The training
+        outputs are not restricted.
+
+        Args:
+            class_ids (Sequence[int], optional): The selected classes. If
+                None, all the classes are output. Default: None.
+            with_other (bool): Whether to add a channel for the other
+                classes. Default: False.
+        """
+
+        if class_ids is None:
+            self.class_subset = None
+            self.with_other = False
+            return
+
+        class_ids = [int(class_id) for class_id in class_ids]
+        assert getattr(self, 'conv_seg', None) is not None, 'the head has no conv_seg to restrict'
+        assert len(class_ids) > 0 and len(set(class_ids)) == len(class_ids), \
+            'class_ids must be unique'
+        assert all(0 <= class_id < self.num_classes for class_id in class_ids)
+        assert not with_other or len(class_ids) < self.num_classes, \
+            'there are no other classes'
+
+        self.class_subset = class_ids
+        self.other_classes = [i for i in range(self.num_classes) if i not in set(class_ids)]
+        self.with_other = with_other
+
     @property
     def last_scale(self):
         num_losses = len(self.loss_modules)
@@ -259,10 +298,43 @@ class BaseDecodeHead(nn.Module, metaclass=ABCMeta):
         if self.enable_out_norm:
             feat = normalize(feat, dim=1, p=2)
 
+        if self.class_subset is not None and not self.training:
+            return self._cls_seg_subset(feat)
+
         output = self.conv_seg(feat)
 
         return output
 
+    def _cls_seg_subset(self, feat):
+        """Classify each pixel among the classes of ``class_subset``."""
+
+        if isinstance(self.conv_seg, AngularPWConv):
+            weight = normalize(self.conv_seg.weight, dim=1, p=2)[..., None, None]
+            bias = None
+        else:
+            weight, bias = self.conv_seg.weight, self.conv_seg.bias
+
+        def classify(class_ids):
+            class_ids = torch.as_tensor(class_ids, device=weight.device)
+            output = F.conv2d(feat, weight[class_ids], bias[class_ids] if bias is not None else None)
+            if isinstance(self.conv_seg, AngularPWConv) and self.conv_seg.clip_output:
+                output = output.clamp(-1.0, 1.0)
+
+            return output
+
+        output = classify(self.class_subset)
+        if self.with_other:
+            other = classify(self.other_classes)
+            if isinstance(self.conv_seg, AngularPWConv):
+                # the cosines are scaled after the head, the maximum is the
+                # log-sum-exp of the scaled cosines in the limit
+                other = other.max(dim=1, keepdim=True)[0]
+            else:
+                other = torch.logsumexp(other, dim=1, keepdim=True)
+            output = torch.cat([output, other], dim=1)
+
+        return output
+
     @staticmethod
     def _mix_loss(logits, target, ignore_index=255):
         num_samples = logits.size(0)
@@ -97,15 +97,11 @@ class BaseSegmentor(nn.Module):
         if num_augs != len(img_metas):
             raise ValueError(f'num of augmentations ({len(imgs)}) != '
                              f'num of image meta ({len(img_metas)})')
-        # all images in the same aug batch all of the same ori_shape and pad
-        # shape
-        for img_meta in img_metas:
-            ori_shapes = [_['ori_shape'] for _ in img_meta]
-            assert all(shape == ori_shapes[0] for shape in ori_shapes)
-            img_shapes = [_['img_shape'] for _ in img_meta]
-            assert all(shape == img_shapes[0] for shape in img_shapes)
-            pad_shapes = [_['pad_shape'] for _ in img_meta]
-            assert all(shape == pad_shapes[0] for shape in pad_shapes)
+        # the images of a batch may have different shapes, they are padded
+        # to the shape of the batch by the collate function and cropped back
+        # to their ``pad_shape`` by the segmentor
+        for img, img_meta in zip(imgs, img_metas):
+            assert all(img.shape[2] >= _['pad_shape'][0] and img.shape[3] >= _['pad_shape'][1] for _ in img_meta)
 
         if num_augs == 1:
             return self.simple_test(imgs[0], img_metas[0], **kwargs)
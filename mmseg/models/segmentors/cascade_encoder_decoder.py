@@ -1,9 +1,15 @@
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
 from torch import nn
+from torch.utils.hooks import RemovableHandle
 
 from mmseg.core import add_prefix
 from mmseg.ops import resize
 from .. import builder
 from ..builder import SEGMENTORS
+from ..decode_heads.point_head import calculate_uncertainty
 from .encoder_decoder import EncoderDecoder
 
 
@@ -14,6 +20,16 @@ class CascadeEncoderDecoder(EncoderDecoder):
     CascadeEncoderDecoder almost the same as EncoderDecoder, while decoders of
     CascadeEncoderDecoder are cascaded. The output of previous decoder_head
     will be the input of next decoder_head.
+
+    At inference, the later stages may be skipped for the confident images
+    by setting ``test_cfg.early_exit``, e.g. ``dict(threshold=0.8)``. After
+    every stage but the last one, the confidence of an image is the mean
+    top-2 margin of its class probabilities, or the lowest mean margin of its
+    regions of ``region_size`` pixels of the stage output if given. The
+    images with a confidence of at least ``threshold`` keep the output of
+    the stage, the others go through the next stage. The number of images
+    skipping each stage is accumulated in ``early_exit_stats`` and reported
+    to the hooks registered by :meth:`register_early_exit_hook`.
     """
 
     def __init__(self,
@@ -34,6 +50,8 @@ class CascadeEncoderDecoder(EncoderDecoder):
             train_cfg=train_cfg,
             test_cfg=test_cfg,
             pretrained=pretrained)
+        self._early_exit_hooks = OrderedDict()
+        self.reset_early_exit_stats()
 
     def _init_decode_head(self, decode_head):
         """Initialize ``decode_head``"""
@@ -75,15 +93,109 @@ class CascadeEncoderDecoder(EncoderDecoder):
             else:
                 self.auxiliary_head.init_weights()
 
-    def encode_decode(self, img, img_metas):
-        """Encode images with backbone and decode into a semantic segmentation
-        map of the same size as input."""
+    def reset_early_exit_stats(self):
+        """Reset the number of images skipping each stage."""
+        self.early_exit_stats = dict(num_images=0, num_skipped=[0] * self.num_stages)
+
+    def register_early_exit_hook(self, hook):
+        """Register a hook called when the decode heads skip some images.
+
+        The hook is called after every stage but the first one with
+        ``hook(module, stage, skipped)``, ``skipped`` being a bool tensor
+        marking the images of the batch which skip the ``stage``.
+
+        Returns:
+            :obj:`RemovableHandle`: A handle to remove the hook.
+        """
+
+        handle = RemovableHandle(self._early_exit_hooks)
+        self._early_exit_hooks[handle.id] = hook
+
+        return handle
+
+    def _get_confidence(self, seg_logit, early_exit_cfg):
+        """Confidence of every image of the batch for the early exit."""
+
+        margin = -calculate_uncertainty(F.softmax(seg_logit, dim=1))
+        region_size = early_exit_cfg.get('region_size', None)
+        if region_size is None:
+            return margin.flatten(1).mean(dim=1)
+
+        margin = F.avg_pool2d(margin, region_size, ceil_mode=True)
+        return margin.flatten(1).min(dim=1)[0]
+
+    def _report_skipped(self, stage, skipped):
+        self.early_exit_stats['num_skipped'][stage] += int(skipped.sum())
+        for hook in self._early_exit_hooks.values():
+            hook(self, stage, skipped)
+
+    def _select_class_subset(self, seg_logit):
+        """Restrict the logits of an intermediate stage to the class subset
+        of the last stage, see :meth:`set_class_subset`."""
+
+        head = self.decode_head[-1]
+        if head.class_subset is None:
+            return seg_logit
+
+        out = seg_logit[:, head.class_subset]
+        if head.with_other:
+            other = torch.logsumexp(seg_logit[:, head.other_classes], dim=1, keepdim=True)
+            out = torch.cat([out, other], dim=1)
+
+        return out
+
+    def _early_exit_decode(self, x, img_metas, early_exit_cfg, size):
+        """Decode with the cascade, skipping the later stages for the
+        confident images. The outputs are resized to ``size``.
+
+        The batch may hold more images than ``img_metas``, e.g. the crops of
+        a sliding window inference, so only the tensors are filtered and the
+        image infos are passed unchanged to the decode heads.
+        """
 
-        x = self.extract_feat(img)
+        num_imgs = x[0].shape[0]
+        self.early_exit_stats['num_images'] += num_imgs
+        outs = [None] * num_imgs
+        active = torch.arange(num_imgs)
+        exited = torch.zeros(num_imgs, dtype=torch.bool)
 
         out = self.decode_head[0].forward_test(x, img_metas, self.test_cfg)
         for i in range(1, self.num_stages):
-            out = self.decode_head[i].forward_test(x, out, img_metas, self.test_cfg)
+            if len(active) > 0:
+                confident = self._get_confidence(out, early_exit_cfg) >= early_exit_cfg['threshold']
+                confident = confident.cpu()
+                exit_out = self._select_class_subset(out)
+                for j in confident.nonzero().flatten().tolist():
+                    outs[active[j]] = exit_out[j:j + 1]
+                exited[active[confident]] = True
+
+                keep = (~confident).nonzero().flatten()
+                if len(keep) < len(active):
+                    keep_on_device = keep.to(out.device)
+                    x = [feat[keep_on_device] for feat in x]
+                    out = out[keep_on_device]
+                    active = active[keep]
+            self._report_skipped(i, exited.clone())
+
+            if len(active) > 0:
+                out = self.decode_head[i].forward_test(x, out, img_metas, self.test_cfg)
+        for j, idx in enumerate(active.tolist()):
+            outs[idx] = out[j:j + 1]
+
+        return torch.cat([resize(out, size=size, mode='bilinear', align_corners=self.align_corners)
+                          for out in outs])
+
+    def _decode_feat(self, x, img_metas, size):
+        """Decode the features with the cascade into a semantic segmentation
+        map of the given size."""
+
+        early_exit_cfg = self.test_cfg.get('early_exit', None)
+        if early_exit_cfg is not None and not self.training and not torch.onnx.is_in_onnx_export():
+            out = self._early_exit_decode(x, img_metas, early_exit_cfg, size)
+        else:
+            out = self.decode_head[0].forward_test(x, img_metas, self.test_cfg)
+            for i in range(1, self.num_stages):
+                out = self.decode_head[i].forward_test(x, out, img_metas, self.test_cfg)
 
         out_scale = self.test_cfg.get('output_scale', None)
         if out_scale is not None and not self.training:
@@ -91,7 +203,7 @@ class CascadeEncoderDecoder(EncoderDecoder):
 
         out = resize(
             input=out,
-            size=img.shape[2:],
+            size=size,
             mode='bilinear',
             align_corners=self.align_corners
         )
@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -16,8 +19,23 @@ class EncoderDecoder(BaseSegmentor):
     EncoderDecoder typically consists of backbone, decode_head, auxiliary_head.
     Note that auxiliary_head is only used for deep supervision during training,
     which could be dumped during inference.
+
+    The frames of a video stream can be tested with :meth:`video_test`. Only
+    the keyframes are run through the backbone and the neck at full
+    resolution, the decode heads of the other frames reuse the features of
+    the last keyframe. A frame is a keyframe when
+    ``test_cfg.video.keyframe_interval`` frames passed since the last
+    keyframe, or when the mean absolute difference between the normalized
+    frame and the last keyframe exceeds ``test_cfg.video.diff_threshold``.
+
+    The test outputs can be restricted to a subset of the classes, e.g. with
+    ``test_cfg.class_subset=dict(class_ids=[2, 12], with_other=True)``, see
+    :meth:`set_class_subset`.
     """
 
+    # number of image sizes whose sliding-window plan is cached
+    _max_slide_plans = 16
+
     def __init__(self,
                  backbone,
                  decode_head,
@@ -37,6 +55,13 @@ class EncoderDecoder(BaseSegmentor):
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
 
+        # sliding-window plans keyed by the image size and the window setup
+        self._slide_plans = OrderedDict()
+        self.reset_video()
+        self._class_subset_lut = None
+        if test_cfg is not None and test_cfg.get('class_subset', None) is not None:
+            self.set_class_subset(**test_cfg['class_subset'])
+
         self.init_weights(pretrained=pretrained)
 
         assert self.with_decode_head
@@ -90,6 +115,41 @@ class EncoderDecoder(BaseSegmentor):
             else:
                 self.auxiliary_head.init_weights()
 
+    def set_class_subset(self, class_ids=None, with_other=False, other_label=255):
+        """Restrict the test outputs to a subset of the classes.
+
+        The last decode head only computes the logits of the selected
+        classes and, with ``with_other=True``, a channel for all the other
+        classes, so the rescaling and the softmax run on fewer channels. The
+        label maps keep the original class ids, the pixels of the other
+        classes are labeled ``other_label``. The probability maps have one
+        channel per selected class, in the order of ``class_ids``, and the
+        channel of the other classes last.
+
+        Args:
+            class_ids (Sequence[int], optional): The selected classes. If
+                None, all the classes are output. Default: None.
+            with_other (bool): Whether to predict the other classes as a
+                single class. Default: False.
+            other_label (int): The label of the other classes. Default: 255.
+        """
+
+        head = self.decode_head[-1] if isinstance(self.decode_head, nn.ModuleList) else self.decode_head
+        head.set_class_subset(class_ids, with_other)
+        if class_ids is None:
+            self._class_subset_lut = None
+        else:
+            labels = list(class_ids) + ([other_label] if with_other else [])
+            self._class_subset_lut = torch.tensor(labels, dtype=torch.long)
+
+    def _map_class_subset(self, seg_pred):
+        """Map the label maps of a class subset back to the class ids."""
+
+        if self._class_subset_lut is None:
+            return seg_pred
+
+        return self._class_subset_lut.to(seg_pred.device)[seg_pred]
+
     def extract_feat(self, img):
         """Extract features from images."""
 
@@ -106,6 +166,12 @@ class EncoderDecoder(BaseSegmentor):
 
         x = self.extract_feat(img)
 
+        return self._decode_feat(x, img_metas, img.shape[2:])
+
+    def _decode_feat(self, x, img_metas, size):
+        """Decode the features into a semantic segmentation map of the given
+        size."""
+
         out = self._decode_head_forward_test(x, img_metas)
 
         out_scale = self.test_cfg.get('output_scale', None)
@@ -114,7 +180,7 @@ class EncoderDecoder(BaseSegmentor):
 
         out = resize(
             input=out,
-            size=img.shape[2:],
+            size=size,
             mode='bilinear',
             align_corners=self.align_corners
         )
@@ -204,22 +270,14 @@ class EncoderDecoder(BaseSegmentor):
 
         return losses
 
-    # TODO refactor
-    def slide_inference(self, img, img_meta, rescale):
-        """Inference by sliding-window with overlap.
-
-        If h_crop > h_img or w_crop > w_img, the small patch will be used to
-        decode without padding.
-        """
+    def _get_slide_windows(self, h_img, w_img):
+        """Get the (y1, y2, x1, x2) coordinates of the sliding windows."""
 
         h_stride, w_stride = self.test_cfg.stride
         h_crop, w_crop = self.test_cfg.crop_size
-        batch_size, _, h_img, w_img = img.size()
-        num_classes = self.num_classes
         h_grids = max(h_img - h_crop + h_stride - 1, 0) // h_stride + 1
         w_grids = max(w_img - w_crop + w_stride - 1, 0) // w_stride + 1
-        preds = img.new_zeros((batch_size, num_classes, h_img, w_img))
-        count_mat = img.new_zeros((batch_size, 1, h_img, w_img))
+        windows = []
         for h_idx in range(h_grids):
             for w_idx in range(w_grids):
                 y1 = h_idx * h_stride
@@ -228,19 +286,113 @@ class EncoderDecoder(BaseSegmentor):
                 x2 = min(x1 + w_crop, w_img)
                 y1 = max(y2 - h_crop, 0)
                 x1 = max(x2 - w_crop, 0)
-                crop_img = img[:, :, y1:y2, x1:x2]
-                crop_seg_logit = self.encode_decode(crop_img, img_meta)
-                preds += F.pad(crop_seg_logit,
-                               (int(x1), int(preds.shape[3] - x2), int(y1),
-                                int(preds.shape[2] - y2)))
-
-                count_mat[:, :, y1:y2, x1:x2] += 1
-        assert (count_mat == 0).sum() == 0
-        if torch.onnx.is_in_onnx_export():
-            # cast count_mat to constant while exporting to ONNX
-            count_mat = torch.from_numpy(
-                count_mat.cpu().detach().numpy()).to(device=img.device)
-        preds = preds / count_mat
+                windows.append((y1, y2, x1, x2))
+
+        return windows
+
+    @staticmethod
+    def _get_blending_weight(h_win, w_win, blending):
+        """Get the (h_win, w_win) weights blending the overlapping windows.
+
+        Args:
+            h_win (int): The window height.
+            w_win (int): The window width.
+            blending (str | None): 'gaussian' or 'cosine' to weight the window
+                centers more than their borders, None for uniform weights.
+
+        Returns:
+            ndarray | None: The weights or None for uniform weights.
+        """
+
+        assert blending in [None, 'gaussian', 'cosine'], \
+            f'unsupported slide_blending {blending}'
+        if blending is None:
+            return None
+
+        weights = []
+        for size in (h_win, w_win):
+            pos = np.arange(size, dtype=np.float64) + 0.5
+            if blending == 'gaussian':
+                sigma = size / 4.
+                weight = np.exp(-(pos - size / 2.) ** 2 / (2 * sigma ** 2))
+            else:
+                weight = np.sin(np.pi * pos / size) ** 2
+            weights.append(weight)
+
+        return np.outer(weights[0], weights[1])
+
+    def _get_slide_plan(self, h_img, w_img, device, dtype):
+        """Get the cached windows and normalization map of an image size.
+
+        Returns:
+            tuple[list[tuple[int]], Tensor | None, Tensor]: The window
+                coordinates, the (1, 1, h_win, w_win) blending weights or
+                None for uniform weights, and the (1, 1, h_img, w_img) sum of
+                the weights over the windows.
+        """
+
+        blending = self.test_cfg.get('slide_blending', None)
+        key = (h_img, w_img, tuple(self.test_cfg.crop_size), tuple(self.test_cfg.stride), blending, device, dtype)
+        plan = self._slide_plans.get(key)
+        if plan is not None:
+            self._slide_plans.move_to_end(key)
+            return plan
+
+        windows = self._get_slide_windows(h_img, w_img)
+        y1, y2, x1, x2 = windows[0]
+        weight = self._get_blending_weight(y2 - y1, x2 - x1, blending)
+        norm_mat = np.zeros((h_img, w_img), dtype=np.float64)
+        for y1, y2, x1, x2 in windows:
+            norm_mat[y1:y2, x1:x2] += 1 if weight is None else weight
+        assert (norm_mat == 0).sum() == 0
+
+        # the tensors are built from numpy, so they are constants while
+        # exporting to ONNX
+        if weight is not None:
+            weight = torch.from_numpy(weight[None, None]).to(device=device, dtype=dtype)
+        norm_mat = torch.from_numpy(norm_mat[None, None]).to(device=device, dtype=dtype)
+
+        plan = windows, weight, norm_mat
+        self._slide_plans[key] = plan
+        if len(self._slide_plans) > self._max_slide_plans:
+            self._slide_plans.popitem(last=False)
+
+        return plan
+
+    def slide_inference(self, img, img_meta, rescale):
+        """Inference by sliding-window with overlap.
+
+        If h_crop > h_img or w_crop > w_img, the small patch will be used to
+        decode without padding. All the windows have the same size, so up to
+        ``test_cfg.slide_batch_size`` crops are decoded in a single forward
+        pass. The overlapping windows are averaged uniformly or, if
+        ``test_cfg.slide_blending`` is set, with 'gaussian' or 'cosine'
+        weights favouring the window centers.
+        """
+
+        slide_batch_size = self.test_cfg.get('slide_batch_size', 1)
+        batch_size, _, h_img, w_img = img.size()
+        windows, weight, norm_mat = self._get_slide_plan(h_img, w_img, img.device, img.dtype)
+        # the number of channels may be smaller than num_classes, see
+        # set_class_subset
+        preds = None
+        for start in range(0, len(windows), slide_batch_size):
+            batch_windows = windows[start:start + slide_batch_size]
+            crop_img = torch.cat([img[:, :, y1:y2, x1:x2] for y1, y2, x1, x2 in batch_windows], dim=0)
+            crop_seg_logits = self.encode_decode(crop_img, img_meta)
+            if weight is not None:
+                crop_seg_logits = crop_seg_logits * weight
+            if preds is None:
+                preds = img.new_zeros((batch_size, crop_seg_logits.shape[1], h_img, w_img))
+            crop_seg_logits = crop_seg_logits.split(batch_size, dim=0)
+            for (y1, y2, x1, x2), crop_seg_logit in zip(batch_windows, crop_seg_logits):
+                if torch.onnx.is_in_onnx_export():
+                    preds += F.pad(crop_seg_logit,
+                                   (int(x1), int(preds.shape[3] - x2), int(y1),
+                                    int(preds.shape[2] - y2)))
+                else:
+                    preds[:, :, y1:y2, x1:x2] += crop_seg_logit
+        preds = preds / norm_mat
         if rescale:
             preds = resize(
                 preds,
@@ -269,6 +421,35 @@ class EncoderDecoder(BaseSegmentor):
 
         return seg_logit
 
+    def _forward_logits(self, img, img_meta, rescale):
+        """Compute the logits with slide/whole style."""
+
+        assert self.test_cfg.mode in ['slide', 'whole']
+        if rescale:
+            ori_shape = img_meta[0]['ori_shape']
+            assert all(_['ori_shape'] == ori_shape for _ in img_meta)
+        if self.test_cfg.mode == 'slide':
+            seg_logit = self.slide_inference(img, img_meta, rescale)
+        else:
+            seg_logit = self.whole_inference(img, img_meta, rescale)
+
+        return seg_logit
+
+    @staticmethod
+    def _flip_back(output, img_meta):
+        """Undo the test-time flip of the (N, C, H, W) or (N, H, W) output."""
+
+        flip = img_meta[0]['flip']
+        if flip:
+            flip_direction = img_meta[0]['flip_direction']
+            assert flip_direction in ['horizontal', 'vertical']
+            if flip_direction == 'horizontal':
+                output = output.flip(dims=(-1, ))
+            elif flip_direction == 'vertical':
+                output = output.flip(dims=(-2, ))
+
+        return output
+
     def inference(self, img, img_meta, rescale):
         """Inference with slide/whole style.
 
@@ -285,61 +466,370 @@ class EncoderDecoder(BaseSegmentor):
             Tensor: The output segmentation map.
         """
 
-        assert self.test_cfg.mode in ['slide', 'whole']
-        ori_shape = img_meta[0]['ori_shape']
-        assert all(_['ori_shape'] == ori_shape for _ in img_meta)
-        if self.test_cfg.mode == 'slide':
-            seg_logit = self.slide_inference(img, img_meta, rescale)
-        else:
-            seg_logit = self.whole_inference(img, img_meta, rescale)
+        seg_logit = self._forward_logits(img, img_meta, rescale)
         output = F.softmax(seg_logit, dim=1)
-        flip = img_meta[0]['flip']
-        if flip:
-            flip_direction = img_meta[0]['flip_direction']
-            assert flip_direction in ['horizontal', 'vertical']
-            if flip_direction == 'horizontal':
-                output = output.flip(dims=(3, ))
-            elif flip_direction == 'vertical':
-                output = output.flip(dims=(2, ))
+        output = self._flip_back(output, img_meta)
 
         return output
 
-    def simple_test(self, img, img_meta, rescale=True, output_logits=False):
-        """Simple test with single image."""
+    def _get_source_rows(self, in_rows, out_rows, start, end, device):
+        """Compute the input rows and the weights of the bilinear
+        interpolation of the output rows in ``[start, end)``, as done by
+        :func:`torch.nn.functional.interpolate`."""
+
+        rows = torch.arange(start, end, dtype=torch.float32, device=device)
+        if self.align_corners:
+            scale = (in_rows - 1) / (out_rows - 1) if out_rows > 1 else 0.
+            src = rows * scale
+        else:
+            src = ((rows + 0.5) * (in_rows / out_rows) - 0.5).clamp(min=0)
+        top = src.floor().long().clamp(max=in_rows - 1)
+        bottom = (top + 1).clamp(max=in_rows - 1)
+        weight = (src - top.float()).view(1, 1, -1, 1)
+
+        return top, bottom, weight
+
+    def _rescale_argmax(self, seg_logit, size, chunk_size, with_max_prob=False):
+        """Rescale the logits and reduce them to the label map chunk by chunk.
+
+        The logits are first rescaled to the output width only, then the
+        bilinear interpolation along the height is computed for
+        ``chunk_size`` output rows at once and reduced over the channels
+        right away, so the full resolution (N, C, H, W) tensor is never
+        allocated.
+
+        Args:
+            seg_logit (Tensor): The logits of shape (N, C, h, w).
+            size (tuple[int]): The output size (H, W).
+            chunk_size (int): The number of output rows rescaled at once.
+            with_max_prob (bool): Whether to compute the softmax probability
+                of the predicted class as well. Default: False.
+
+        Returns:
+            tuple[Tensor, Tensor | None]: The label map of shape (N, H, W)
+                and the probability map of the same shape or None.
+        """
+
+        in_rows = seg_logit.shape[2]
+        out_rows, out_cols = size
+        seg_logit = resize(
+            seg_logit,
+            size=(in_rows, out_cols),
+            mode='bilinear',
+            align_corners=self.align_corners,
+            warning=False)
+
+        seg_pred = seg_logit.new_empty((seg_logit.shape[0], out_rows, out_cols), dtype=torch.long)
+        max_prob = seg_logit.new_empty((seg_logit.shape[0], out_rows, out_cols)) if with_max_prob else None
+        for start in range(0, out_rows, chunk_size):
+            end = min(start + chunk_size, out_rows)
+            top, bottom, weight = self._get_source_rows(in_rows, out_rows, start, end, seg_logit.device)
+            chunk = torch.lerp(seg_logit[:, :, top], seg_logit[:, :, bottom], weight)
+            chunk_max, seg_pred[:, start:end] = chunk.max(dim=1)
+            if with_max_prob:
+                max_prob[:, start:end] = torch.exp(chunk - chunk_max.unsqueeze(1)).sum(dim=1).reciprocal()
+
+        return seg_pred, max_prob
+
+    def _argmax_at_ori_shape(self, seg_logit, img_meta, chunk_size, with_max_prob=False):
+        """Reduce the logits at the input shape to the label maps at the
+        original shape with :meth:`_rescale_argmax`, then undo the test-time
+        flip."""
+
+        size = img_meta[0]['ori_shape'][:2]
+        assert all(_['ori_shape'][:2] == size for _ in img_meta)
+        seg_pred, max_prob = self._rescale_argmax(seg_logit, size, chunk_size, with_max_prob)
+
+        seg_pred = self._flip_back(seg_pred, img_meta)
+        if max_prob is not None:
+            max_prob = self._flip_back(max_prob, img_meta)
+
+        return seg_pred, max_prob
+
+    def inference_argmax(self, img, img_meta, with_max_prob=False):
+        """Inference of the label map at the original shape.
+
+        The logits are rescaled in bands of ``test_cfg.rescale_chunk_size``
+        output rows, which bounds the memory used for large images with many
+        classes. It is the path taken by :meth:`simple_test` when
+        ``test_cfg.rescale_chunk_size`` is set.
+
+        Args:
+            img (Tensor): The input image of shape (N, 3, H, W).
+            img_meta (dict): Image info dict, see :meth:`inference`.
+            with_max_prob (bool): Whether to return the softmax probability
+                of the predicted class as well. Default: False.
+
+        Returns:
+            tuple[Tensor, Tensor | None]: The label map of shape (N, H, W)
+                and the probability map of the same shape or None.
+        """
+
+        chunk_size = self.test_cfg.get('rescale_chunk_size', None)
+        seg_logit = self._forward_logits(img, img_meta, rescale=False)
+        if chunk_size is None:
+            chunk_size = img_meta[0]['ori_shape'][0]
+
+        seg_pred, max_prob = self._argmax_at_ori_shape(seg_logit, img_meta, chunk_size, with_max_prob)
+
+        return self._map_class_subset(seg_pred), max_prob
+
+    def _compact_output(self, seg_pred, output_logits):
+        """Reduce the output on the device before it is copied to the host.
+
+        The dtype is set by ``test_cfg.output_dtype``. If it is not set, the
+        label maps are returned as int64 and the probability maps as float32.
+        Otherwise, the label maps are returned as uint8 and the probability
+        maps are cast to 'float16' or quantized to 'uint8' in [0, 255]. The
+        label maps of a class subset are mapped back to the class ids.
+
+        Args:
+            seg_pred (Tensor): The label maps of shape (N, H, W) or, if
+                ``output_logits`` is set, the probability maps of shape
+                (N, C, H, W).
+            output_logits (bool): Whether ``seg_pred`` are probability maps.
+
+        Returns:
+            Tensor: The compacted label or probability maps.
+        """
+
+        output_dtype = self.test_cfg.get('output_dtype', None)
+        assert output_dtype in [None, 'float32', 'float16', 'uint8'], \
+            f'unsupported output_dtype {output_dtype}'
 
-        seg_logit = self.inference(img, img_meta, rescale)
         if output_logits:
-            seg_pred = seg_logit
+            if output_dtype == 'float16':
+                seg_pred = seg_pred.half()
+            elif output_dtype == 'uint8':
+                seg_pred = seg_pred.mul(255).round_().to(torch.uint8)
+            return seg_pred
+
+        seg_pred = self._map_class_subset(seg_pred)
+        if self._class_subset_lut is None:
+            max_label = self.num_classes - 1
+        else:
+            max_label = int(self._class_subset_lut.max())
+        if output_dtype is not None and max_label <= 255:
+            seg_pred = seg_pred.to(torch.uint8)
+
+        return seg_pred
+
+    def _postprocess_logits(self, seg_logit, img_meta, rescale, output_logits):
+        """Turn the logits of images with the same shapes into test outputs.
+
+        Args:
+            seg_logit (Tensor): The logits of shape (N, C, H, W) at the input
+                shape.
+            img_meta (list[dict]): The image info of the N images.
+            rescale (bool): Whether rescale back to original shape.
+            output_logits (bool): Whether to return the probability maps
+                instead of the label maps.
+
+        Returns:
+            Tensor: The compacted label or probability maps.
+        """
+
+        chunk_size = self.test_cfg.get('rescale_chunk_size', None)
+        if rescale and not output_logits and chunk_size:
+            seg_pred, _ = self._argmax_at_ori_shape(seg_logit, img_meta, chunk_size)
         else:
-            seg_pred = seg_logit.argmax(dim=1)
+            if rescale:
+                seg_logit = resize(
+                    seg_logit,
+                    size=img_meta[0]['ori_shape'][:2],
+                    mode='bilinear',
+                    align_corners=self.align_corners,
+                    warning=False)
+            seg_logit = self._flip_back(F.softmax(seg_logit, dim=1), img_meta)
+            seg_pred = seg_logit if output_logits else seg_logit.argmax(dim=1)
+
+        return self._compact_output(seg_pred, output_logits)
+
+    @staticmethod
+    def _is_padded_batch(img, img_meta):
+        """Whether images of different shapes were padded into the batch."""
+
+        ori_shape = img_meta[0]['ori_shape']
+        return any(tuple(_['pad_shape'][:2]) != tuple(img.shape[2:]) or _['ori_shape'] != ori_shape for _ in img_meta)
+
+    def reset_video(self):
+        """Forget the keyframe of the previous video stream."""
+        self._video_cache = None
+        self.video_stats = dict(num_frames=0, num_keyframes=0)
+
+    def _is_keyframe(self, img, video_cfg):
+        cache = self._video_cache
+        if cache is None or cache['img'].shape != img.shape:
+            return True
+
+        keyframe_interval = video_cfg.get('keyframe_interval', None)
+        diff_threshold = video_cfg.get('diff_threshold', None)
+        assert keyframe_interval is not None or diff_threshold is not None, \
+            'keyframe_interval or diff_threshold must be set in test_cfg.video'
+        if keyframe_interval is not None and cache['age'] + 1 >= keyframe_interval:
+            return True
+        if diff_threshold is not None and (img - cache['img']).abs().mean() > diff_threshold:
+            return True
+
+        return False
+
+    def _extract_small_feat(self, img, scale):
+        """Extract the features of the image downscaled by ``scale``."""
+
+        size = [max(int(round(dim * scale)), 1) for dim in img.shape[2:]]
+        img = resize(img, size=size, mode='bilinear', align_corners=self.align_corners)
+
+        return self.extract_feat(img)
+
+    def _update_feat(self, img, update_scale):
+        """Update the cached keyframe features with the changes of a frame.
+
+        The difference between the features of the frame and of the keyframe,
+        both extracted at ``update_scale`` of the input shape, is upsampled
+        and added to the full resolution features of the keyframe.
+        """
+
+        cache = self._video_cache
+        small_x = self._extract_small_feat(img, update_scale)
+        x = []
+        for feat, key_small_feat, cur_small_feat in zip(cache['x'], cache['small_x'], small_x):
+            diff = resize(
+                cur_small_feat - key_small_feat,
+                size=feat.shape[2:],
+                mode='bilinear',
+                align_corners=self.align_corners)
+            x.append(feat + diff)
+
+        return x
+
+    def video_test(self, img, img_meta, rescale=True, output_logits=False):
+        """Test a frame of a video stream.
+
+        The backbone and the neck only run at full resolution on the
+        keyframes, whose features are cached. The decode heads run on every
+        frame: the cached features are updated with the changes of the frame
+        seen at ``test_cfg.video.update_scale`` (0.25 by default) of the
+        input shape, or reused as they are if it is None. The stream is
+        started by :meth:`reset_video`.
+        """
+
+        assert img.shape[0] == 1, 'the frames are tested one by one'
+        assert self.test_cfg.mode == 'whole', 'the video streams are tested in whole mode'
+        video_cfg = self.test_cfg.get('video', dict())
+        update_scale = video_cfg.get('update_scale', 0.25)
+        self.video_stats['num_frames'] += 1
+        if self._is_keyframe(img, video_cfg):
+            x = self.extract_feat(img)
+            small_x = self._extract_small_feat(img, update_scale) if update_scale is not None else None
+            self._video_cache = dict(img=img, x=x, small_x=small_x, age=0)
+            self.video_stats['num_keyframes'] += 1
+        else:
+            self._video_cache['age'] += 1
+            if update_scale is not None and self._video_cache['small_x'] is not None:
+                x = self._update_feat(img, update_scale)
+            else:
+                x = self._video_cache['x']
+
+        seg_logit = self._decode_feat(x, img_meta, img.shape[2:])
+        seg_pred = self._postprocess_logits(seg_logit, img_meta, rescale, output_logits)
+
+        return list(seg_pred.cpu().numpy())
+
+    def simple_test(self, img, img_meta, rescale=True, output_logits=False, video=False):
+        """Simple test with single image.
+
+        The images of a batch padded to a common shape by the collate
+        function are cropped back to their ``pad_shape`` and rescaled one by
+        one. With ``video=True``, the image is a frame of a video stream
+        tested by :meth:`video_test`.
+        """
 
         if torch.onnx.is_in_onnx_export():
-            if not output_logits:
-                # our inference backend only support 4D output
-                seg_pred = seg_pred.unsqueeze(0)
+            seg_logit = self.inference(img, img_meta, rescale)
+            if output_logits:
+                return seg_logit
+
+            # our inference backend only support 4D output
+            return seg_logit.argmax(dim=1).unsqueeze(0)
+
+        if video:
+            return self.video_test(img, img_meta, rescale, output_logits)
+
+        seg_logit = self._forward_logits(img, img_meta, rescale=False)
+        if len(img_meta) > 1 and self._is_padded_batch(img, img_meta):
+            seg_pred = []
+            for i, cur_img_meta in enumerate(img_meta):
+                h, w = cur_img_meta['pad_shape'][:2]
+                cur_seg_pred = self._postprocess_logits(
+                    seg_logit[i:i + 1, :, :h, :w], [cur_img_meta], rescale, output_logits)
+                seg_pred.append(cur_seg_pred.cpu().numpy()[0])
 
             return seg_pred
 
+        seg_pred = self._postprocess_logits(seg_logit, img_meta, rescale, output_logits)
         seg_pred = seg_pred.cpu().numpy()
         seg_pred = list(seg_pred)
 
         return seg_pred
 
-    def aug_test(self, imgs, img_metas, rescale=True):
+    def aug_test(self, imgs, img_metas, rescale=True, output_logits=False):
         """Test with augmentations.
 
+        The augmented views with the same shape, e.g. a flip pair, are
+        decoded in one batched forward pass of up to
+        ``test_cfg.aug_batch_size`` views (all of them by default). The
+        probabilities are flipped back and accumulated inplace at the
+        original shape. As in :meth:`simple_test`, the images of a padded
+        batch are cropped back to their ``pad_shape`` and accumulated one by
+        one at their own original shape.
+
         Only rescale=True is supported.
         """
         # aug_test rescale all imgs back to ori_shape for now
         assert rescale
+
+        num_imgs = len(img_metas[0])
+        padded = num_imgs > 1 and any(
+            self._is_padded_batch(img, img_meta) for img, img_meta in zip(imgs, img_metas))
+        aug_batch_size = self.test_cfg.get('aug_batch_size', None) or len(imgs)
+        groups = OrderedDict()
+        for i, img in enumerate(imgs):
+            groups.setdefault(tuple(img.shape), []).append(i)
+
         # to save memory, we get augmented seg logit inplace
-        seg_logit = self.inference(imgs[0], img_metas[0], rescale)
-        for i in range(1, len(imgs)):
-            cur_seg_logit = self.inference(imgs[i], img_metas[i], rescale)
-            seg_logit += cur_seg_logit
-        seg_logit /= len(imgs)
-        seg_pred = seg_logit.argmax(dim=1)
-        seg_pred = seg_pred.cpu().numpy()
-        # unravel batch dim
-        seg_pred = list(seg_pred)
+        seg_logits = [None] * (num_imgs if padded else 1)
+        for indices in groups.values():
+            for start in range(0, len(indices), aug_batch_size):
+                batch_indices = indices[start:start + aug_batch_size]
+                batch_img = torch.cat([imgs[i] for i in batch_indices], dim=0)
+                batch_img_meta = [meta for i in batch_indices for meta in img_metas[i]]
+                batch_seg_logit = self._forward_logits(batch_img, batch_img_meta, rescale and not padded)
+                batch_seg_logit = batch_seg_logit.split(num_imgs, dim=0)
+                for i, cur_seg_logit in zip(batch_indices, batch_seg_logit):
+                    if padded:
+                        cur_seg_logits = []
+                        for cur_img_meta, img_seg_logit in zip(img_metas[i], cur_seg_logit.split(1, dim=0)):
+                            h, w = cur_img_meta['pad_shape'][:2]
+                            img_seg_logit = resize(
+                                img_seg_logit[:, :, :h, :w],
+                                size=cur_img_meta['ori_shape'][:2],
+                                mode='bilinear',
+                                align_corners=self.align_corners,
+                                warning=False)
+                            cur_seg_logits.append(self._flip_back(F.softmax(img_seg_logit, dim=1), [cur_img_meta]))
+                    else:
+                        cur_seg_logits = [self._flip_back(F.softmax(cur_seg_logit, dim=1), img_metas[i])]
+                    for j, cur_seg_logit in enumerate(cur_seg_logits):
+                        if seg_logits[j] is None:
+                            seg_logits[j] = cur_seg_logit.clone()
+                        else:
+                            seg_logits[j] += cur_seg_logit
+
+        seg_pred = []
+        for seg_logit in seg_logits:
+            seg_logit /= len(imgs)
+            cur_seg_pred = seg_logit if output_logits else seg_logit.argmax(dim=1)
+            cur_seg_pred = self._compact_output(cur_seg_pred, output_logits)
+            # unravel batch dim
+            seg_pred.extend(cur_seg_pred.cpu().numpy())
         return seg_pred
@@ -1,4 +1,5 @@
 from .collect_env import collect_env
+from .cpu_launcher import launch_cpu_workers
 from .logger import get_root_logger
 
-__all__ = ['get_root_logger', 'collect_env']
+__all__ = ['get_root_logger', 'collect_env', 'launch_cpu_workers']
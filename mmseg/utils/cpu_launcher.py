@@ -0,0 +1,90 @@
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def get_available_cores():
+    """Get the ids of the CPU cores the current process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+
+    return list(range(os.cpu_count()))
+
+
+def split_cores(cores, num_workers):
+    """Split the cores into contiguous sets, one per worker.
+
+    Args:
+        cores (list[int]): The ids of the available cores.
+        num_workers (int): The number of workers.
+
+    Returns:
+        list[list[int]]: The cores of every worker. If there are fewer cores
+            than workers, the cores are shared round-robin.
+    """
+
+    if len(cores) < num_workers:
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+
+    bounds = [len(cores) * i // num_workers for i in range(num_workers + 1)]
+    return [cores[bounds[i]:bounds[i + 1]] for i in range(num_workers)]
+
+
+def _find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _cpu_worker(rank, fn, world_size, port, worker_cores, num_threads, args):
+    if worker_cores is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, worker_cores[rank])
+    if num_threads is None:
+        num_threads = len(worker_cores[rank]) if worker_cores is not None else 1
+    torch.set_num_threads(num_threads)
+    # the data loader workers and the libraries started by the worker follow
+    # the same thread budget
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    os.environ['RANK'] = str(rank)
+    os.environ['LOCAL_RANK'] = str(rank)
+    os.environ['WORLD_SIZE'] = str(world_size)
+    dist.init_process_group(backend='gloo', rank=rank, world_size=world_size)
+    try:
+        fn(*args)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch_cpu_workers(fn, num_workers, args=(), num_threads=None, pin_cores=True):
+    """Run a function in several CPU worker processes.
+
+    Every worker is pinned to its own contiguous set of the available cores
+    and joins a gloo process group with the other workers, so the function
+    can shard the data with the distributed samplers and merge the results
+    with :mod:`torch.distributed` as on multiple GPUs.
+
+    Args:
+        fn (callable): The function run by every worker as ``fn(*args)``. It
+            must be picklable, e.g. defined at the top level of a module.
+        num_workers (int): The number of worker processes.
+        args (tuple): The arguments of ``fn``. Default: ().
+        num_threads (int, optional): The number of intra-op threads of every
+            worker. If None, it is the number of cores of the worker, or 1
+            if the cores are not pinned. Default: None.
+        pin_cores (bool): Whether to pin the workers to disjoint core sets.
+            Default: True.
+    """
+
+    assert num_workers >= 1
+    worker_cores = split_cores(get_available_cores(), num_workers) if pin_cores else None
+    mp.spawn(
+        _cpu_worker,
+        args=(fn, num_workers, _find_free_port(), worker_cores, num_threads, tuple(args)),
+        nprocs=num_workers,
+        join=True)
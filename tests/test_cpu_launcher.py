@@ -0,0 +1,38 @@
+import os
+import os.path as osp
+import tempfile
+
+import torch
+import torch.distributed as dist
+
+from mmseg.utils import launch_cpu_workers
+from mmseg.utils.cpu_launcher import split_cores
+
+
+def test_split_cores():
+    assert split_cores(list(range(8)), 3) == [[0, 1], [2, 3, 4], [5, 6, 7]]
+    assert split_cores([4, 6], 2) == [[4], [6]]
+    # the cores are shared when there are fewer cores than workers
+    assert split_cores([0, 1], 3) == [[0], [1], [0]]
+
+
+def _worker(out_dir):
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    rank_sum = torch.tensor([rank])
+    dist.all_reduce(rank_sum)
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    torch.save(dict(world_size=world_size, rank_sum=int(rank_sum), cores=cores,
+                    num_threads=torch.get_num_threads()), osp.join(out_dir, f'{rank}.pth'))
+
+
+def test_launch_cpu_workers():
+    with tempfile.TemporaryDirectory() as out_dir:
+        launch_cpu_workers(_worker, 2, args=(out_dir, ), num_threads=1)
+        infos = [torch.load(osp.join(out_dir, f'{rank}.pth')) for rank in range(2)]
+
+    for info in infos:
+        assert info['world_size'] == 2
+        assert info['rank_sum'] == 1
+        assert info['num_threads'] == 1
+    if hasattr(os, 'sched_getaffinity') and len(os.sched_getaffinity(0)) >= 2:
+        assert not set(infos[0]['cores']) & set(infos[1]['cores'])
@@ -1,13 +1,18 @@
+import os
 import os.path as osp
 from unittest.mock import MagicMock, patch
 
+import mmcv
 import numpy as np
 import pytest
 
-from mmseg.core.evaluation import get_classes, get_palette
+from mmseg.core.evaluation import PredictionStore, get_classes, get_palette
 from mmseg.datasets import (DATASETS, ADE20KDataset, CityscapesDataset,
-                            ConcatDataset, CustomDataset, PascalVOCDataset,
-                            RepeatDataset)
+                            ConcatDataset, CustomDataset, PackedBackend,
+                            PackedWriter, PascalVOCDataset, RepeatDataset,
+                            pack_directory)
+from mmseg.datasets.img_info_array import ImageInfoArray
+from mmseg.datasets.seg_map_cache import SegMapCache
 
 
 def test_classes():
@@ -211,6 +216,210 @@ def test_custom_dataset():
     assert 'mPrecision' in eval_results
     assert 'mRecall' in eval_results
 
+    # evaluation with the confusion matrices collected by pre_eval
+    pre_eval_results = train_dataset.pre_eval(pseudo_results,
+                                              list(range(len(pseudo_results))))
+    assert len(pre_eval_results) == len(pseudo_results)
+    pre_eval_eval_results = train_dataset.evaluate(
+        pre_eval_results, metric=['mIoU', 'mDice', 'mFscore'])
+    assert pre_eval_eval_results.keys() == eval_results.keys()
+    for key, value in eval_results.items():
+        assert np.isclose(pre_eval_eval_results[key], value, equal_nan=True)
+
+    # evaluation with the predictions kept in a PredictionStore
+    store = PredictionStore()
+    for result in pseudo_results:
+        store.append(result)
+    store.close()
+    data_file = store.data_files[0]
+    store_eval_results = train_dataset.evaluate(
+        store, metric=['mIoU', 'mDice', 'mFscore'])
+    for key, value in eval_results.items():
+        assert np.isclose(store_eval_results[key], value, equal_nan=True)
+    assert not osp.exists(data_file)
+
+
+@pytest.mark.parametrize('gt_seg_map_cache', [None, 'memory', 'disk'])
+def test_custom_dataset_gt_seg_map_cache(gt_seg_map_cache, tmp_path):
+    data_root = osp.join(osp.dirname(__file__), '../data/pseudo_dataset')
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png')
+    ref_gt_seg_maps = dataset.get_gt_seg_maps()
+
+    if gt_seg_map_cache == 'disk':
+        gt_seg_map_cache = str(tmp_path)
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png',
+        gt_seg_map_cache=gt_seg_map_cache, gt_seg_map_workers=2)
+    gt_seg_maps = dataset.get_gt_seg_maps()
+    assert len(gt_seg_maps) == len(ref_gt_seg_maps)
+    for gt_seg_map, ref_gt_seg_map in zip(gt_seg_maps, ref_gt_seg_maps):
+        assert np.array_equal(gt_seg_map, ref_gt_seg_map)
+
+    if gt_seg_map_cache is not None:
+        # the second evaluation must not decode the maps again
+        with patch('mmcv.imread', MagicMock(side_effect=RuntimeError)):
+            gt_seg_maps = dataset.get_gt_seg_maps()
+        for gt_seg_map, ref_gt_seg_map in zip(gt_seg_maps, ref_gt_seg_maps):
+            assert np.array_equal(gt_seg_map, ref_gt_seg_map)
+
+
+
+def test_seg_map_cache_max_bytes(tmp_path):
+    seg_maps = []
+    for i in range(3):
+        seg_map = np.full((4, 4), i, dtype=np.uint8)
+        filename = str(tmp_path / f'{i}.png')
+        mmcv.imwrite(seg_map, filename)
+        seg_maps.append((filename, seg_map))
+
+    cache_dir = str(tmp_path / 'cache')
+    probe = SegMapCache(cache_dir=str(tmp_path / 'probe'))
+    probe.load(seg_maps[0][0])
+    entry_size = sum(entry[1] for entry in probe._scan())
+
+    # the budget holds two maps, the least recently used one is removed
+    cache = SegMapCache(cache_dir=cache_dir, max_bytes=2 * entry_size)
+    for filename, _ in seg_maps[:2]:
+        cache.load(filename)
+    for ns, (filename, _) in enumerate(seg_maps[:2], 1):
+        os.utime(cache._get_cache_file(cache._get_key(filename)), ns=(ns, ns))
+    cache.load(seg_maps[0][0])
+    cache.load(seg_maps[2][0])
+
+    cached = [osp.exists(cache._get_cache_file(cache._get_key(filename))) for filename, _ in seg_maps]
+    assert cached == [True, False, True]
+    for filename, seg_map in seg_maps:
+        assert np.array_equal(cache.load(filename), seg_map)
+
+    cache.clear()
+    assert os.listdir(cache_dir) == []
+
+
+def test_custom_dataset_class_histograms(tmp_path):
+    data_root = osp.join(osp.dirname(__file__), '../data/pseudo_dataset')
+    class_hist_file = str(tmp_path / 'class_histograms.npz')
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png',
+        gt_seg_map_workers=2, class_hist_file=class_hist_file)
+    gt_seg_maps = dataset.get_gt_seg_maps()
+
+    histograms = dataset.get_class_histograms()
+    assert histograms.shape[0] == len(gt_seg_maps)
+    for hist, gt_seg_map in zip(histograms, gt_seg_maps):
+        values, counts = np.unique(gt_seg_map, return_counts=True)
+        assert np.array_equal(np.flatnonzero(hist), values)
+        assert np.array_equal(hist[values], counts)
+    assert osp.exists(class_hist_file)
+
+    # the persisted index is reused without decoding the maps again
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png',
+        class_hist_file=class_hist_file)
+    with patch('mmcv.imread', MagicMock(side_effect=RuntimeError)):
+        assert np.array_equal(dataset.get_class_histograms(), histograms)
+
+    # evaluate decodes every annotation once for the maps and the histograms
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png')
+    with patch('mmcv.imread', MagicMock(side_effect=mmcv.imread)) as imread:
+        eval_results = dataset.evaluate([gt_seg_map.copy() for gt_seg_map in gt_seg_maps], metric='mIoU')
+    assert imread.call_count == len(gt_seg_maps)
+    assert eval_results['aAcc'] == 1.
+    assert np.array_equal(dataset.get_class_histograms(), histograms)
+
+
+def test_image_info_array():
+    filenames = ['a.jpg', 'sub/b.jpg', 'ü.jpg', '']
+    seg_maps = ['a.png', 'sub/b.png', 'ü.png', '']
+    img_infos = ImageInfoArray(filenames, seg_maps)
+    assert len(img_infos) == 4
+    assert list(img_infos) == [dict(filename=f, ann=dict(seg_map=s)) for f, s in zip(filenames, seg_maps)]
+    assert img_infos[-3] == dict(filename='sub/b.jpg', ann=dict(seg_map='sub/b.png'))
+    with pytest.raises(IndexError):
+        img_infos[4]
+
+    # the dicts are built on demand, so mutating them does not change the infos
+    img_infos[0]['filename'] = 'c.jpg'
+    assert img_infos[0]['filename'] == 'a.jpg'
+
+    img_infos = ImageInfoArray(filenames)
+    assert list(img_infos) == [dict(filename=f) for f in filenames]
+    assert len(ImageInfoArray([])) == 0
+
+    data_root = osp.join(osp.dirname(__file__), '../data/pseudo_dataset')
+    dataset = CustomDataset(
+        [], data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+        img_suffix='img.jpg', seg_map_suffix='gt.png')
+    assert isinstance(dataset.img_infos, ImageInfoArray)
+    assert sorted(img_info['filename'] for img_info in dataset.img_infos) == \
+        [f'{idx:05d}_img.jpg' for idx in range(5)]
+    assert all(img_info['ann']['seg_map'] == img_info['filename'].replace('img.jpg', 'gt.png')
+               for img_info in dataset.img_infos)
+
+
+def test_packed_dataset(tmp_path):
+    data_root = osp.join(osp.dirname(__file__), '../data/pseudo_dataset')
+    pack_dir = str(tmp_path / 'pseudo_dataset.pack')
+    # a tiny shard size to spread the files over several shards
+    assert pack_directory(data_root, pack_dir, shard_size=1024) == 12
+
+    backend = PackedBackend(pack_dir)
+    assert len(set(shard for shard, _, _ in backend._index.values())) > 1
+    for filename in mmcv.scandir(data_root, recursive=True):
+        with open(osp.join(data_root, filename), 'rb') as f:
+            assert backend.get(osp.join(pack_dir, filename)) == f.read()
+    assert backend.list_dir_or_file(pack_dir, list_file=False) == ['gts', 'imgs', 'splits']
+    assert backend.list_dir_or_file(osp.join(pack_dir, 'splits'), list_dir=False) == ['train.txt', 'val.txt']
+    assert backend.isdir(osp.join(pack_dir, 'imgs'))
+    assert not backend.isfile(osp.join(pack_dir, 'imgs'))
+    with pytest.raises(FileNotFoundError):
+        backend.get(osp.join(pack_dir, 'missing.png'))
+
+    file_client_args = dict(backend='packed', pack_dir=pack_dir)
+    pipeline = [
+        dict(type='LoadImageFromFile', file_client_args=file_client_args),
+        dict(type='LoadAnnotations', file_client_args=file_client_args),
+    ]
+    ref_pipeline = [dict(type='LoadImageFromFile'), dict(type='LoadAnnotations')]
+    for split in [None, 'splits/train.txt']:
+        ref_dataset = CustomDataset(
+            ref_pipeline, data_root=data_root, img_dir='imgs/', ann_dir='gts/',
+            img_suffix='_img.jpg', seg_map_suffix='_gt.png', split=split)
+        dataset = CustomDataset(
+            pipeline, data_root=pack_dir, img_dir='imgs/', ann_dir='gts/',
+            img_suffix='_img.jpg', seg_map_suffix='_gt.png', split=split,
+            file_client_args=file_client_args)
+        key = lambda img_info: img_info['filename']  # noqa
+        assert sorted(dataset.img_infos, key=key) == sorted(ref_dataset.img_infos, key=key)
+
+    # the samples are read from the shards
+    for idx in range(len(dataset)):
+        data, ref_data = dataset[idx], ref_dataset[idx]
+        assert np.array_equal(data['img'], ref_data['img'])
+        assert np.array_equal(data['gt_semantic_seg'], ref_data['gt_semantic_seg'])
+    for gt_seg_map, ref_gt_seg_map in zip(dataset.get_gt_seg_maps(), ref_dataset.get_gt_seg_maps()):
+        assert np.array_equal(gt_seg_map, ref_gt_seg_map)
+    assert np.array_equal(dataset.get_class_histograms(), ref_dataset.get_class_histograms())
+
+    # a failed packing leaves no index
+    failed_dir = str(tmp_path / 'failed.pack')
+    with pytest.raises(RuntimeError):
+        with PackedWriter(failed_dir) as writer:
+            writer.add('a.png', b'abc')
+            raise RuntimeError
+    assert not osp.exists(osp.join(failed_dir, 'index.npz'))
+
+    # the backends that cannot list a directory are reported
+    file_client = MagicMock(client=object())
+    with pytest.raises(NotImplementedError):
+        CustomDataset.load_annotations('imgs', '.jpg', None, '.png', None, file_client=file_client)
+
 
 @patch('mmseg.datasets.CustomDataset.load_annotations', MagicMock)
 @patch('mmseg.datasets.CustomDataset.__getitem__',
@@ -299,3 +508,31 @@ def test_custom_dataset_custom_palette():
         palette=[[100, 100, 100], [200, 200, 200]],
         test_mode=True)
     assert tuple(dataset.PALETTE) == tuple([[100, 100, 100], [200, 200, 200]])
+
+
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_cityscapes_format_results(nproc, tmp_path):
+    CSLabels = pytest.importorskip('cityscapesscripts.helpers.labels')
+    dataset = CityscapesDataset(
+        pipeline=[],
+        img_dir=osp.join(osp.dirname(__file__), '../data/pseudo_dataset/imgs'),
+        test_mode=True)
+    dataset.img_infos = [
+        dict(filename=f'{idx:05d}_leftImg8bit.png') for idx in range(3)
+    ]
+    rng = np.random.RandomState(0)
+    results = [rng.randint(0, 19, size=(8, 16)) for _ in range(3)]
+    results[0][0, 0] = 255
+
+    result_files, tmp_dir = dataset.format_results(
+        results, imgfile_prefix=str(tmp_path), nproc=nproc)
+    assert tmp_dir is None
+    assert len(result_files) == 3
+    for result, result_file in zip(results, result_files):
+        assert result_file.startswith(str(tmp_path))
+        expected = result.copy()
+        for train_id, label in CSLabels.trainId2label.items():
+            expected[result == train_id] = label.id
+        assert np.array_equal(
+            mmcv.imread(result_file, flag='unchanged', backend='pillow'),
+            expected)
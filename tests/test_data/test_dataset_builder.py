@@ -2,11 +2,14 @@ import math
 import os.path as osp
 
 import pytest
+import torch
+from mmcv.parallel import DataContainer
 from torch.utils.data import (DistributedSampler, RandomSampler,
                               SequentialSampler)
 
 from mmseg.datasets import (DATASETS, ConcatDataset, build_dataloader,
                             build_dataset)
+from mmseg.datasets.builder import pad_collate
 
 
 @DATASETS.register_module()
@@ -190,3 +193,31 @@ def test_build_dataloader():
         math.ceil(len(dataset) / samples_per_gpu / 8))
     assert isinstance(dataloader.sampler, RandomSampler)
     assert dataloader.num_workers == 16
+
+
+def test_pad_collate():
+    batch = []
+    for h, w in [(4, 5), (6, 3)]:
+        img_meta = dict(img_shape=(h, w, 3), pad_shape=(h, w, 3))
+        batch.append(
+            dict(
+                img=[torch.ones(3, h, w), torch.ones(3, h, w)],
+                img_metas=[
+                    DataContainer(img_meta, cpu_only=True),
+                    DataContainer(img_meta, cpu_only=True)
+                ]))
+
+    data = pad_collate(batch, samples_per_gpu=2)
+    assert len(data['img']) == 2
+    for img in data['img']:
+        assert img.shape == (2, 3, 6, 5)
+        assert img[0, :, :4, :5].eq(1).all() and img[0, :, 4:].eq(0).all()
+        assert img[1, :, :6, :3].eq(1).all() and img[1, :, :, 3:].eq(0).all()
+    # the metas keep the shapes before the batch padding
+    img_metas = data['img_metas'][0].data[0]
+    assert img_metas[0]['pad_shape'] == (4, 5, 3)
+    assert img_metas[1]['pad_shape'] == (6, 3, 3)
+
+    # samples of the same shape are left as they are
+    data = pad_collate(batch[:1] * 2, samples_per_gpu=2)
+    assert data['img'][0].shape == (2, 3, 4, 5)
@@ -1,11 +1,14 @@
 import copy
+import os
 import os.path as osp
 import tempfile
+from unittest.mock import MagicMock, patch
 
 import mmcv
 import numpy as np
 
-from mmseg.datasets.pipelines import LoadAnnotations, LoadImageFromFile
+from mmseg.datasets.pipelines import (DecodeCache, LoadAnnotations,
+                                      LoadImageFromFile)
 
 
 class TestLoading(object):
@@ -176,6 +179,31 @@ class TestLoading(object):
         assert gt_array.dtype == np.uint8
         np.testing.assert_array_equal(gt_array, true_mask)
 
+        # test custom classes with reduce_zero_label
+        results = dict(
+            img_info=dict(filename=img_path),
+            ann_info=dict(seg_map=gt_path),
+            label_map={
+                0: 0,
+                1: 0,
+                2: 0,
+                3: 2,
+                4: 1
+            },
+            seg_fields=[])
+
+        load_anns = LoadAnnotations(reduce_zero_label=True)
+        results = load_anns(copy.deepcopy(results))
+
+        gt_array = results['gt_semantic_seg']
+
+        true_mask = np.full_like(gt_array, 255)
+        true_mask[6:8, 2:4] = 1
+        true_mask[6:8, 6:8] = 0
+
+        assert gt_array.dtype == np.uint8
+        np.testing.assert_array_equal(gt_array, true_mask)
+
         # test no custom classes
         results = dict(
             img_info=dict(filename=img_path),
@@ -196,3 +224,54 @@ class TestLoading(object):
         np.testing.assert_array_equal(gt_array, test_gt)
 
         tmp_dir.cleanup()
+
+    def test_decode_cache(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        cache_cfg = dict(max_bytes=2 * 288 * 512 * 3 + 1024, cache_dir=tmp_dir.name)
+
+        # the color and gray images take the whole budget
+        load_img = LoadImageFromFile(decode_cache=cache_cfg)
+        ref_load_img = LoadImageFromFile()
+        for filename in ['color.jpg', 'gray.jpg', 'color.jpg']:
+            results = dict(img_prefix=self.data_prefix, img_info=dict(filename=filename))
+            results = load_img(copy.deepcopy(results))
+            ref_results = ref_load_img(dict(img_prefix=self.data_prefix, img_info=dict(filename=filename)))
+            np.testing.assert_array_equal(results['img'], ref_results['img'])
+        assert len(list(mmcv.scandir(tmp_dir.name, '.npy'))) == 2
+
+        # the entries are read back from the cache
+        load_img._decode = None
+        results = load_img(dict(img_prefix=self.data_prefix, img_info=dict(filename='color.jpg')))
+        np.testing.assert_array_equal(results['img'], ref_results['img'])
+
+        # the decode flags are part of the key, the least recently used
+        # image is evicted
+        load_gray = LoadImageFromFile(color_type='unchanged', decode_cache=cache_cfg)
+        results = load_gray(dict(img_prefix=self.data_prefix, img_info=dict(filename='gray.jpg')))
+        assert results['img'].shape == (288, 512)
+        assert len(list(mmcv.scandir(tmp_dir.name, '.npy'))) == 2
+        results = load_img(dict(img_prefix=self.data_prefix, img_info=dict(filename='color.jpg')))
+        assert results['img'].shape == (288, 512, 3)
+
+        # the label maps are mapped after the cache
+        load_ann = LoadAnnotations(reduce_zero_label=True, decode_cache=cache_cfg)
+        ref_load_ann = LoadAnnotations(reduce_zero_label=True)
+        for _ in range(2):
+            results = dict(seg_prefix=self.data_prefix, ann_info=dict(seg_map='seg.png'), seg_fields=[])
+            np.testing.assert_array_equal(
+                load_ann(copy.deepcopy(results))['gt_semantic_seg'],
+                ref_load_ann(copy.deepcopy(results))['gt_semantic_seg'])
+
+        # only the writes going over the budget scan the cache directory
+        tmp_dir.cleanup()
+        tmp_dir = tempfile.TemporaryDirectory()
+        cache = DecodeCache(max_bytes=3 * 1024, cache_dir=tmp_dir.name)
+        with patch('os.scandir', MagicMock(side_effect=os.scandir)) as scandir:
+            for i in range(5):
+                cache.get(f'array_{i}', (), lambda filename: np.zeros(1000, dtype=np.uint8))
+        # the entries take 1128 bytes: the first write scans the cache, then
+        # the writes of the 3rd, 4th and 5th entries go over the budget
+        assert scandir.call_count == 4
+        assert len(list(mmcv.scandir(tmp_dir.name, '.npy'))) == 2
+
+        tmp_dir.cleanup()
@@ -170,6 +170,75 @@ def test_random_crop():
     assert results['gt_semantic_seg'].shape[:2] == (h - 20, w - 20)
 
 
+def test_random_crop_cat_max_ratio():
+    rng = np.random.RandomState(0)
+    transform = build_from_cfg(dict(type='RandomCrop', crop_size=(8, 8), cat_max_ratio=0.75), PIPELINES)
+    for dtype in [np.uint8, np.uint16, np.int64]:
+        seg = rng.randint(0, 4, size=(16, 16)).astype(dtype)
+        seg[:4] = 255
+        labels, cnt = np.unique(seg, return_counts=True)
+        assert np.array_equal(transform._count_labels(seg), cnt[labels != 255])
+    assert len(transform._count_labels(np.full((4, 4), 255, dtype=np.uint8))) == 0
+
+    # the crops dominated by a single class are rejected
+    seg = np.zeros((32, 32), dtype=np.uint8)
+    seg[:, 28:] = 1
+    img = np.zeros((32, 32, 3), dtype=np.uint8)
+    img[:, 28:] = 1
+    np.random.seed(0)
+    results = transform(dict(img=img, gt_semantic_seg=seg, seg_fields=['gt_semantic_seg']))
+    cnt = np.bincount(results['gt_semantic_seg'].ravel(), minlength=2)
+    assert cnt.max() / cnt.sum() < 0.75
+    assert np.array_equal(results['img'][..., 0], results['gt_semantic_seg'])
+
+
+def test_resize_crop():
+    img = mmcv.imread(
+        osp.join(osp.dirname(__file__), '../data/color.jpg'), 'color')
+    seg = np.array(
+        Image.open(osp.join(osp.dirname(__file__), '../data/seg.png')))
+    h, w = seg.shape
+
+    def two_step(results, crop_size, cat_max_ratio=1., **kwargs):
+        results = build_from_cfg(dict(type='Resize', **kwargs), PIPELINES)(results)
+        return build_from_cfg(
+            dict(type='RandomCrop', crop_size=crop_size, cat_max_ratio=cat_max_ratio), PIPELINES)(results)
+
+    for kwargs in [
+            dict(img_scale=(w, h), ratio_range=(0.5, 2.0)),
+            dict(img_scale=[(w, h // 2), (w * 2, h)], keep_ratio=False),
+    ]:
+        # crops larger than the resized image are clipped as by RandomCrop
+        for crop_size in [(h // 2, w // 3), (h * 4, w * 4)]:
+            for seed in range(3):
+                results = dict(img=img, gt_semantic_seg=seg, seg_fields=['gt_semantic_seg'])
+                np.random.seed(seed)
+                ref = two_step(copy.deepcopy(results), crop_size, **kwargs)
+                np.random.seed(seed)
+                transform = build_from_cfg(dict(type='ResizeCrop', crop_size=crop_size, **kwargs), PIPELINES)
+                fused = transform(copy.deepcopy(results))
+
+                for key in ['img_shape', 'pad_shape', 'scale', 'keep_ratio']:
+                    assert fused[key] == ref[key]
+                assert np.allclose(fused['scale_factor'], ref['scale_factor'])
+                assert np.array_equal(fused['gt_semantic_seg'], ref['gt_semantic_seg'])
+                # the bilinear weights of cv2 are rounded differently
+                assert np.abs(fused['img'].astype(np.int64) - ref['img']).max() <= 1
+
+    # cat_max_ratio needs the full resized label
+    results = dict(img=img, gt_semantic_seg=seg, seg_fields=['gt_semantic_seg'])
+    np.random.seed(0)
+    ref = two_step(
+        copy.deepcopy(results), (h // 2, w // 2), cat_max_ratio=0.75, img_scale=(w, h), ratio_range=(0.5, 2.0))
+    np.random.seed(0)
+    transform = build_from_cfg(
+        dict(type='ResizeCrop', crop_size=(h // 2, w // 2), img_scale=(w, h), ratio_range=(0.5, 2.0),
+             cat_max_ratio=0.75), PIPELINES)
+    fused = transform(copy.deepcopy(results))
+    assert np.array_equal(fused['img'], ref['img'])
+    assert np.array_equal(fused['gt_semantic_seg'], ref['gt_semantic_seg'])
+
+
 def test_pad():
     # test assertion if both size_divisor and size is None
     with pytest.raises(AssertionError):
@@ -116,8 +116,9 @@ def multi_gpu_test(model,
                    data_loader,
                    tmpdir=None,
                    gpu_collect=False,
-                   efficient_test=False):
-    results = single_gpu_test(model, data_loader)
+                   efficient_test=False,
+                   pre_eval=False):
+    results = single_gpu_test(model, data_loader, pre_eval=pre_eval)
     return results
 
 
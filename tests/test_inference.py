@@ -1,8 +1,9 @@
 import os.path as osp
 
 import mmcv
+import numpy as np
 
-from mmseg.apis import inference_segmentor, init_segmentor
+from mmseg.apis import inference_segmentor, init_inferencer, init_segmentor
 
 
 def test_test_time_augmentation_on_cpu():
@@ -27,3 +28,55 @@ def test_test_time_augmentation_on_cpu():
         osp.join(osp.dirname(__file__), 'data/color.jpg'), 'color')
     result = inference_segmentor(model, img)
     assert result[0].shape == (288, 512)
+
+
+def test_inferencer_on_cpu():
+    config_file = 'configs/pspnet/pspnet_r50-d8_512x1024_40k_cityscapes.py'
+    config = mmcv.Config.fromfile(config_file)
+
+    # Remove pretrain model download for testing
+    config.model.pretrained = None
+    # Replace SyncBN with BN to inference on CPU
+    norm_cfg = dict(type='BN', requires_grad=True)
+    config.model.backbone.norm_cfg = norm_cfg
+    config.model.decode_head.norm_cfg = norm_cfg
+    config.model.auxiliary_head.norm_cfg = norm_cfg
+    config.data.test.pipeline[1].img_scale = (512, 256)
+
+    inferencer = init_inferencer(config, device='cpu', batch_size=2, workers=2)
+    img_file = osp.join(osp.dirname(__file__), 'data/color.jpg')
+    img = mmcv.imread(img_file, 'color')
+    small_img = img[:100, :150]
+
+    expected = inference_segmentor(inferencer.model, img)[0]
+    assert inference_segmentor(inferencer.model, img_file)[0].shape == (288, 512)
+    assert not hasattr(inferencer.model, 'inferencer')
+
+    # the changes of the test pipeline are used by the next calls
+    input_shapes = []
+    handle = inferencer.model.backbone.register_forward_hook(
+        lambda module, inputs, output: input_shapes.append(inputs[0].shape[2:]))
+    inference_segmentor(inferencer.model, img)
+    inferencer.model.cfg.data.test.pipeline[1].img_scale = (256, 128)
+    inference_segmentor(inferencer.model, img)
+    handle.remove()
+    assert input_shapes[1][0] < input_shapes[0][0]
+    inferencer.model.cfg.data.test.pipeline[1].img_scale = (512, 256)
+
+    results = inferencer([img_file, img, img])
+    assert len(results) == 3
+    for result in results:
+        assert np.array_equal(result, expected)
+
+    # images of different sizes are padded in the micro-batches
+    results = list(inferencer.stream(iter([small_img, img, small_img])))
+    assert [result.shape for result in results] == [(100, 150), (288, 512), (100, 150)]
+
+    assert inferencer(img_file)[0].shape == (288, 512)
+
+    # a static video reuses the first keyframe
+    inferencer.model.test_cfg.video = dict(diff_threshold=0.1)
+    results = list(inferencer.stream_video([img, img_file, img]))
+    assert inferencer.model.video_stats == dict(num_frames=3, num_keyframes=1)
+    for result in results:
+        assert np.array_equal(result, expected)
@@ -1,7 +1,10 @@
 import numpy as np
 
-from mmseg.core.evaluation import (eval_metrics, mean_dice, mean_fscore,
-                                   mean_iou)
+from mmseg.core.evaluation import (apply_label_lut, build_label_lut,
+                                   confusion_matrix,
+                                   confusion_matrix_to_metrics, eval_metrics,
+                                   mean_dice, mean_fscore, mean_iou,
+                                   total_confusion_matrix)
 from mmseg.core.evaluation.metrics import f_score
 
 
@@ -215,6 +218,80 @@ def test_metrics():
     assert not np.any(np.isnan(iou))
 
 
+def test_confusion_matrix():
+    pred_size = (10, 30, 30)
+    num_classes = 19
+    ignore_index = 255
+    results = np.random.randint(0, num_classes, size=pred_size)
+    label = np.random.randint(0, num_classes, size=pred_size)
+    label[:, 2, 5:10] = ignore_index
+
+    conf_mat = confusion_matrix(results[0], label[0].astype(np.uint8),
+                                num_classes, ignore_index)
+    conf_mat_l = get_confusion_matrix(results[0], label[0], num_classes,
+                                      ignore_index)
+    assert conf_mat.shape == (num_classes, num_classes + 1)
+    assert np.array_equal(conf_mat.numpy()[:, :num_classes], conf_mat_l)
+    assert conf_mat[:, num_classes].sum() == 0
+
+    total_conf_mat = total_confusion_matrix(results, label, num_classes,
+                                            ignore_index)
+    total_conf_mat_l = sum(
+        get_confusion_matrix(r, l, num_classes, ignore_index)
+        for r, l in zip(results, label))
+    assert np.array_equal(total_conf_mat.numpy()[:, :num_classes], total_conf_mat_l)
+
+    ret_metrics = confusion_matrix_to_metrics(
+        total_conf_mat_l, metrics=['mIoU', 'mFscore'])
+    all_acc_l, acc_l, iou_l = legacy_mean_iou(results, label, num_classes,
+                                              ignore_index)
+    assert ret_metrics['aAcc'] == all_acc_l
+    assert np.allclose(ret_metrics['Acc'], acc_l)
+    assert np.allclose(ret_metrics['IoU'], iou_l)
+
+    # labels out of [0, num_classes) are not counted
+    label = np.full(pred_size[1:], -1)
+    label[0] = 0
+    conf_mat = confusion_matrix(results[0], label, num_classes, ignore_index)
+    assert conf_mat.sum() == pred_size[2]
+
+    # predictions out of [0, num_classes) are counted as misses
+    label = np.array([[0, 1], [1, 2]])
+    pred = np.array([[0, 255], [1, 2]])
+    conf_mat = confusion_matrix(pred, label, 3, ignore_index)
+    assert conf_mat[1, 3] == 1
+    ret_metrics = confusion_matrix_to_metrics(conf_mat)
+    assert ret_metrics['aAcc'] == 0.75
+    assert np.allclose(ret_metrics['IoU'], [1., 0.5, 1.])
+    assert np.allclose(ret_metrics['Acc'], [1., 0.5, 1.])
+
+
+def test_label_lut():
+    label = np.random.randint(0, 256, size=(30, 30)).astype(np.uint8)
+    label_map = {i: (i + 3) % 7 - 1 for i in range(0, 150, 2)}
+
+    # reference remapping, each pixel is remapped once
+    ref_label = label.copy()
+    for old_id, new_id in label_map.items():
+        ref_label[label == old_id] = new_id % 256
+    reduced_label = ref_label.copy()
+    reduced_label[ref_label == 0] = 255
+    reduced_label = reduced_label - 1
+    reduced_label[reduced_label == 254] = 255
+
+    lut = build_label_lut(label_map)
+    assert lut.shape == (256, ) and lut.dtype == np.uint8
+    assert np.array_equal(apply_label_lut(label, lut), ref_label)
+    lut = build_label_lut(label_map, reduce_zero_label=True)
+    assert np.array_equal(apply_label_lut(label, lut), reduced_label)
+    assert np.array_equal(build_label_lut(), np.arange(256))
+
+    # labels out of the table range are kept as is
+    label = np.array([-1, 0, 1, 300])
+    lut = build_label_lut(reduce_zero_label=True)
+    assert np.array_equal(apply_label_lut(label, lut), [-1, 255, 0, 300])
+
+
 def test_mean_iou():
     pred_size = (10, 30, 30)
     num_classes = 19
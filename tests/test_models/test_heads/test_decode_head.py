@@ -73,3 +73,40 @@ def test_decode_head():
     assert head.input_transform == 'resize_concat'
     transformed_inputs = head._transform_inputs(inputs)
     assert transformed_inputs.shape == (1, 48, 45, 45)
+
+
+@patch.multiple(BaseDecodeHead, __abstractmethods__=set())
+def test_decode_head_class_subset():
+    feat = torch.randn(2, 16, 5, 7)
+    for enable_out_norm in [False, True]:
+        head = BaseDecodeHead(32, 16, num_classes=19, dropout_ratio=0, enable_out_norm=enable_out_norm)
+        head.eval()
+        full_output = head.cls_seg(feat)
+
+        with pytest.raises(AssertionError):
+            head.set_class_subset([3, 3])
+        with pytest.raises(AssertionError):
+            head.set_class_subset([19])
+        with pytest.raises(AssertionError):
+            head.set_class_subset(list(range(19)), with_other=True)
+
+        head.set_class_subset([7, 3])
+        assert torch.allclose(head.cls_seg(feat), full_output[:, [7, 3]], atol=1e-6)
+
+        head.set_class_subset([7, 3], with_other=True)
+        output = head.cls_seg(feat)
+        others = [i for i in range(19) if i not in [3, 7]]
+        if enable_out_norm:
+            other = full_output[:, others].max(dim=1)[0]
+        else:
+            other = full_output[:, others].logsumexp(dim=1)
+        assert torch.allclose(output[:, :2], full_output[:, [7, 3]], atol=1e-6)
+        assert torch.allclose(output[:, 2], other, atol=1e-6)
+
+        # the training outputs are not restricted
+        head.train()
+        assert head.cls_seg(feat).shape[1] == 19
+
+        head.eval()
+        head.set_class_subset(None)
+        assert torch.allclose(head.cls_seg(feat), full_output)
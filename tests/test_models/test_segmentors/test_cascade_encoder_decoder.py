@@ -1,7 +1,9 @@
+import torch
 from mmcv import ConfigDict
 
 from mmseg.models import build_segmentor
-from .utils import _segmentor_forward_train_test
+from mmseg.ops import resize
+from .utils import _demo_mm_inputs, _segmentor_forward_train_test
 
 
 def test_cascade_encoder_decoder():
@@ -54,3 +56,130 @@ def test_cascade_encoder_decoder():
     cfg.test_cfg = ConfigDict(mode='whole')
     segmentor = build_segmentor(cfg)
     _segmentor_forward_train_test(segmentor)
+
+
+def test_cascade_encoder_decoder_early_exit():
+    cfg = ConfigDict(
+        type='CascadeEncoderDecoder',
+        num_stages=3,
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=[
+            dict(type='ExampleDecodeHead'),
+            dict(type='ExampleCascadeDecodeHead'),
+            dict(type='ExampleCascadeDecodeHead')
+        ])
+    cfg.test_cfg = ConfigDict(mode='whole')
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    imgs, img_metas = mm_inputs['imgs'], mm_inputs['img_metas']
+    with torch.no_grad():
+        x = segmentor.extract_feat(imgs)
+        stage_outs = [segmentor.decode_head[0].forward_test(x, img_metas, segmentor.test_cfg)]
+        for i in range(1, 3):
+            stage_outs.append(segmentor.decode_head[i].forward_test(x, stage_outs[-1], img_metas, segmentor.test_cfg))
+        stage_outs = [resize(out, size=imgs.shape[2:], mode='bilinear', align_corners=False) for out in stage_outs]
+        full_out = segmentor.encode_decode(imgs, img_metas)
+    assert torch.allclose(full_out, stage_outs[-1])
+
+    reports = []
+    handle = segmentor.register_early_exit_hook(lambda module, stage, skipped: reports.append((stage, skipped.tolist())))
+
+    # the margins are in [0, 1]
+    segmentor.test_cfg.early_exit = dict(threshold=2.)
+    with torch.no_grad():
+        out = segmentor.encode_decode(imgs, img_metas)
+    assert torch.allclose(out, full_out)
+    assert reports == [(1, [False, False]), (2, [False, False])]
+
+    reports.clear()
+    segmentor.test_cfg.early_exit = dict(threshold=0., region_size=2)
+    with torch.no_grad():
+        out = segmentor.encode_decode(imgs, img_metas)
+    assert torch.allclose(out, stage_outs[0])
+    assert reports == [(1, [True, True]), (2, [True, True])]
+
+    # the first image exits after the first stage, the second one after the
+    # second stage
+    reports.clear()
+    segmentor.test_cfg.early_exit = dict(threshold=0.5)
+    confidences = iter([torch.tensor([1., 0.]), torch.tensor([1.])])
+    segmentor._get_confidence = lambda seg_logit, cfg: next(confidences)
+    with torch.no_grad():
+        out = segmentor.encode_decode(imgs, img_metas)
+    assert torch.allclose(out[0], stage_outs[0][0])
+    assert torch.allclose(out[1], stage_outs[1][1])
+    assert reports == [(1, [True, False]), (2, [True, True])]
+    assert segmentor.early_exit_stats == dict(num_images=6, num_skipped=[0, 3, 4])
+
+    del segmentor._get_confidence
+    handle.remove()
+    segmentor.reset_early_exit_stats()
+    segmentor.test_cfg.early_exit = dict(threshold=0.)
+    with torch.no_grad():
+        segmentor.encode_decode(imgs, img_metas)
+    assert len(reports) == 2
+    assert segmentor.early_exit_stats == dict(num_images=2, num_skipped=[0, 2, 2])
+
+
+def test_cascade_encoder_decoder_early_exit_class_subset():
+    cfg = ConfigDict(
+        type='CascadeEncoderDecoder',
+        num_stages=2,
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=[
+            dict(type='ExampleDecodeHead'),
+            dict(type='ExampleCascadeDecodeHead')
+        ])
+    cfg.test_cfg = ConfigDict(mode='whole', early_exit=dict(threshold=0.5))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+    segmentor.set_class_subset([4, 1], with_other=True)
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    imgs, img_metas = mm_inputs['imgs'], mm_inputs['img_metas']
+    segmentor._get_confidence = lambda seg_logit, cfg: torch.tensor([1., 0.])
+    with torch.no_grad():
+        x = segmentor.extract_feat(imgs)
+        first_out = segmentor.decode_head[0].forward_test(x, img_metas, segmentor.test_cfg)
+        out = segmentor.encode_decode(imgs, img_metas)
+
+    # the exiting image is restricted to the class subset as well
+    assert out.shape == (2, 3, 8, 16)
+    others = [i for i in range(19) if i not in [4, 1]]
+    expected = torch.cat([first_out[:1, [4, 1]], first_out[:1, others].logsumexp(dim=1, keepdim=True)], dim=1)
+    expected = resize(expected, size=imgs.shape[2:], mode='bilinear', align_corners=False)
+    assert torch.allclose(out[:1], expected, atol=1e-6)
+
+
+def test_cascade_encoder_decoder_early_exit_slide():
+    cfg = ConfigDict(
+        type='CascadeEncoderDecoder',
+        num_stages=2,
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=[
+            dict(type='ExampleDecodeHead'),
+            dict(type='ExampleCascadeDecodeHead')
+        ])
+    cfg.test_cfg = ConfigDict(mode='slide', crop_size=(5, 5), stride=(3, 3), slide_batch_size=4)
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    # the 6 crops of the two images are decoded in batches of 4 x 2 and
+    # 2 x 2 images
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 11))
+    imgs, img_metas = mm_inputs['imgs'], mm_inputs['img_metas']
+    with torch.no_grad():
+        full_out = segmentor.inference(imgs, img_metas, rescale=False)
+
+        segmentor.test_cfg.early_exit = dict(threshold=2.)
+        out = segmentor.inference(imgs, img_metas, rescale=False)
+        assert torch.allclose(out, full_out)
+
+        segmentor.test_cfg.early_exit = dict(threshold=0.5)
+        segmentor._get_confidence = lambda seg_logit, cfg: torch.arange(len(seg_logit)) % 2.
+        out = segmentor.inference(imgs, img_metas, rescale=False)
+    assert out.shape == full_out.shape
+    # half of the crops of every forward pass exit after the first stage
+    assert segmentor.early_exit_stats == dict(num_images=2 * 12, num_skipped=[0, 6])
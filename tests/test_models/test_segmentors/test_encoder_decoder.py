@@ -1,7 +1,11 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
 from mmcv import ConfigDict
 
 from mmseg.models import build_segmentor
-from .utils import _segmentor_forward_train_test
+from mmseg.ops import resize
+from .utils import _demo_mm_inputs, _segmentor_forward_train_test
 
 
 def test_encoder_decoder():
@@ -44,3 +48,371 @@ def test_encoder_decoder():
     cfg.test_cfg = ConfigDict(mode='whole')
     segmentor = build_segmentor(cfg)
     _segmentor_forward_train_test(segmentor)
+
+
+def test_encoder_decoder_output_dtype():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    with torch.no_grad():
+        ref_pred = segmentor.simple_test(img, img_metas)
+        ref_prob = segmentor.simple_test(img, img_metas, output_logits=True)
+    assert ref_pred[0].dtype == np.int64
+    assert ref_prob[0].dtype == np.float32
+
+    for output_dtype in ['float16', 'uint8']:
+        segmentor.test_cfg.output_dtype = output_dtype
+        with torch.no_grad():
+            pred = segmentor.simple_test(img, img_metas)
+            prob = segmentor.simple_test(img, img_metas, output_logits=True)
+        assert pred[0].dtype == np.uint8
+        assert prob[0].dtype == getattr(np, output_dtype)
+        for i in range(len(ref_pred)):
+            assert np.array_equal(pred[i], ref_pred[i])
+            scale = 255 if output_dtype == 'uint8' else 1
+            assert np.allclose(
+                prob[i].astype(np.float32) / scale, ref_prob[i], atol=3e-3)
+
+
+def test_encoder_decoder_rescale_chunk_size():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    # fixed weights, so the logits have no near ties flipping the argmax
+    torch.manual_seed(0)
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(1, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    # the output rows are rescaled in bands of 4 rows, both for upscaling
+    # and downscaling
+    for flip, ori_shape, align_corners in [(False, (21, 37, 3), False), (True, (21, 37, 3), False),
+                                           (False, (5, 7, 3), False), (True, (21, 37, 3), True)]:
+        segmentor.align_corners = align_corners
+        for img_meta in img_metas:
+            img_meta['ori_shape'] = ori_shape
+            img_meta['flip'] = flip
+        with torch.no_grad():
+            segmentor.test_cfg.pop('rescale_chunk_size', None)
+            ref_prob = segmentor.inference(img, img_metas, rescale=True)
+            ref_pred = segmentor.simple_test(img, img_metas)
+
+            segmentor.test_cfg.rescale_chunk_size = 4
+            pred = segmentor.simple_test(img, img_metas)
+            pred_map, max_prob = segmentor.inference_argmax(
+                img, img_metas, with_max_prob=True)
+
+        assert pred[0].shape == ori_shape[:2]
+        assert np.array_equal(pred[0], ref_pred[0])
+        assert torch.equal(pred_map, ref_prob.argmax(dim=1))
+        assert torch.allclose(max_prob, ref_prob.max(dim=1)[0], atol=1e-6)
+
+
+def test_encoder_decoder_slide_batch_size():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='slide', crop_size=(5, 5), stride=(3, 3)))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    with torch.no_grad():
+        ref_seg_logit = segmentor.slide_inference(img, img_metas, rescale=True)
+        for slide_batch_size in [4, 100]:
+            segmentor.test_cfg.slide_batch_size = slide_batch_size
+            seg_logit = segmentor.slide_inference(
+                img, img_metas, rescale=True)
+            assert torch.allclose(seg_logit, ref_seg_logit, atol=1e-5)
+
+
+def test_encoder_decoder_slide_blending():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='slide', crop_size=(5, 5), stride=(3, 3)))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(1, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    with torch.no_grad():
+        ref_seg_logit = segmentor.slide_inference(img, img_metas, rescale=True)
+        # the windows of an image size are planned once
+        segmentor.slide_inference(img, img_metas, rescale=True)
+        assert len(segmentor._slide_plans) == 1
+
+        for slide_blending in ['gaussian', 'cosine']:
+            segmentor.test_cfg.slide_blending = slide_blending
+            seg_logit = segmentor.slide_inference(img, img_metas, rescale=True)
+            assert seg_logit.shape == ref_seg_logit.shape
+            assert torch.isfinite(seg_logit).all()
+
+            # a single window is not changed by the blending weights
+            segmentor.test_cfg.crop_size = (8, 16)
+            seg_logit = segmentor.slide_inference(img, img_metas, rescale=True)
+            whole_seg_logit = segmentor.whole_inference(
+                img, img_metas, rescale=True)
+            assert torch.allclose(seg_logit, whole_seg_logit, atol=1e-5)
+            segmentor.test_cfg.crop_size = (5, 5)
+        assert len(segmentor._slide_plans) == 5
+
+
+def test_encoder_decoder_batched_aug_test():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    # two scales with a flip pair each
+    imgs, img_metas = [], []
+    for shape in [(1, 3, 8, 16), (1, 3, 12, 24)]:
+        mm_inputs = _demo_mm_inputs(input_shape=shape)
+        for flip in [False, True]:
+            img_meta = dict(mm_inputs['img_metas'][0])
+            img_meta['ori_shape'] = (10, 20, 3)
+            img_meta['flip'] = flip
+            img = mm_inputs['imgs']
+            imgs.append(img.flip(dims=(3, )) if flip else img)
+            img_metas.append([img_meta])
+
+    with torch.no_grad():
+        ref_seg_logit = sum(
+            segmentor.inference(img, img_meta, rescale=True)
+            for img, img_meta in zip(imgs, img_metas)) / len(imgs)
+        for aug_batch_size in [None, 1]:
+            segmentor.test_cfg.aug_batch_size = aug_batch_size
+            seg_pred = segmentor.aug_test(imgs, img_metas)
+            seg_logit = segmentor.aug_test(imgs, img_metas, output_logits=True)
+            assert np.array_equal(seg_pred[0],
+                                  ref_seg_logit.argmax(dim=1)[0].numpy())
+            assert np.allclose(seg_logit[0], ref_seg_logit[0].numpy(),
+                               atol=1e-6)
+
+
+def test_encoder_decoder_padded_batch():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    # the second image is 6x10, padded to the shape of the first one
+    img[1, :, 6:] = 0
+    img[1, :, :, 10:] = 0
+    img_metas[0]['ori_shape'] = (16, 32, 3)
+    img_metas[1].update(
+        img_shape=(6, 10, 3), pad_shape=(6, 10, 3), ori_shape=(12, 20, 3))
+
+    with torch.no_grad():
+        seg_pred = segmentor.simple_test(img, img_metas)
+        seg_logit = segmentor.simple_test(img, img_metas, output_logits=True)
+        ref_seg_pred = segmentor.simple_test(img[:1], img_metas[:1])
+    assert seg_pred[0].shape == (16, 32)
+    assert seg_pred[1].shape == (12, 20)
+    assert seg_logit[1].shape == (19, 12, 20)
+    assert np.array_equal(seg_pred[0], ref_seg_pred[0])
+
+
+def test_encoder_decoder_padded_batch_aug_test():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    # a flip pair of two images, the second one is 6x10, padded to the shape
+    # of the first one
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    img = mm_inputs['imgs']
+    img[1, :, 6:] = 0
+    img[1, :, :, 10:] = 0
+    imgs, img_metas = [], []
+    for flip in [False, True]:
+        cur_img_metas = [dict(img_meta, flip=flip) for img_meta in mm_inputs['img_metas']]
+        cur_img_metas[0]['ori_shape'] = (16, 32, 3)
+        cur_img_metas[1].update(img_shape=(6, 10, 3), pad_shape=(6, 10, 3), ori_shape=(12, 20, 3))
+        cur_img = img.clone()
+        if flip:
+            cur_img[0] = cur_img[0].flip(dims=(2, ))
+            cur_img[1, :, :6, :10] = cur_img[1, :, :6, :10].flip(dims=(2, ))
+        imgs.append(cur_img)
+        img_metas.append(cur_img_metas)
+
+    with torch.no_grad():
+        seg_pred = segmentor.aug_test(imgs, img_metas)
+        seg_logit = segmentor.aug_test(imgs, img_metas, output_logits=True)
+        ref_seg_logit = segmentor.aug_test([img[:1] for img in imgs], [img_meta[:1] for img_meta in img_metas],
+                                           output_logits=True)
+    assert len(seg_pred) == 2
+    assert seg_pred[0].shape == (16, 32)
+    assert seg_pred[1].shape == (12, 20)
+    assert seg_logit[1].shape == (19, 12, 20)
+    assert np.allclose(seg_logit[0], ref_seg_logit[0], atol=1e-6)
+    assert np.array_equal(seg_pred[0], seg_logit[0].argmax(axis=0))
+
+
+def test_encoder_decoder_video_test():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole', video=dict(keyframe_interval=3, update_scale=None)))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    # the keyframe features are reused as they are
+    mm_inputs = _demo_mm_inputs(input_shape=(4, 3, 8, 16))
+    frames = [img[None] for img in mm_inputs['imgs']]
+    img_metas = [[img_meta] for img_meta in mm_inputs['img_metas']]
+    with torch.no_grad():
+        expected = [segmentor.simple_test(frame, img_meta)[0] for frame, img_meta in zip(frames, img_metas)]
+
+        # the keyframes are the frames 0 and 3
+        results = [segmentor.simple_test(frames[i], img_metas[i], video=True)[0] for i in range(4)]
+        assert segmentor.video_stats == dict(num_frames=4, num_keyframes=2)
+        for i, keyframe in enumerate([0, 0, 0, 3]):
+            assert np.array_equal(results[i], expected[keyframe])
+
+        # the frames differ by about 1/3 in average
+        segmentor.reset_video()
+        segmentor.test_cfg.video = dict(diff_threshold=0.5, update_scale=None)
+        results = [segmentor.simple_test(frames[i], img_metas[i], video=True)[0] for i in range(4)]
+        assert segmentor.video_stats == dict(num_frames=4, num_keyframes=1)
+        assert all(np.array_equal(result, expected[0]) for result in results)
+
+        segmentor.reset_video()
+        segmentor.test_cfg.video = dict(diff_threshold=0.1, update_scale=None)
+        results = [segmentor.simple_test(frames[i], img_metas[i], video=True)[0] for i in range(4)]
+        assert segmentor.video_stats == dict(num_frames=4, num_keyframes=4)
+        for result, ref in zip(results, expected):
+            assert np.array_equal(result, ref)
+
+        # a frame of another shape is a keyframe
+        segmentor.reset_video()
+        segmentor.test_cfg.video = dict(keyframe_interval=10, update_scale=None)
+        segmentor.simple_test(frames[0], img_metas[0], video=True)
+        small_meta = [dict(img_metas[1][0], img_shape=(6, 10, 3), ori_shape=(6, 10, 3), pad_shape=(6, 10, 3))]
+        assert segmentor.simple_test(frames[1][..., :6, :10], small_meta, video=True)[0].shape == (6, 10)
+        assert segmentor.video_stats == dict(num_frames=2, num_keyframes=2)
+
+
+
+def test_encoder_decoder_video_test_update():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole', video=dict(keyframe_interval=3, update_scale=0.5)))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(2, 3, 8, 16))
+    frames = [img[None] for img in mm_inputs['imgs']]
+    img_meta = mm_inputs['img_metas'][:1]
+    with torch.no_grad():
+        key_seg_logit = segmentor.simple_test(frames[0], img_meta, output_logits=True)[0]
+
+        # a static scene keeps the output of the keyframe
+        results = [segmentor.simple_test(frames[0], img_meta, output_logits=True, video=True)[0] for _ in range(2)]
+        assert all(np.allclose(result, key_seg_logit, atol=1e-6) for result in results)
+
+        # the decode head sees the changes of the frame
+        result = segmentor.simple_test(frames[1], img_meta, output_logits=True, video=True)[0]
+        assert segmentor.video_stats == dict(num_frames=3, num_keyframes=1)
+        x = segmentor.extract_feat(frames[0])[0]
+        small_frames = [resize(frame, size=(4, 8), mode='bilinear', align_corners=False) for frame in frames]
+        diff = segmentor.extract_feat(small_frames[1])[0] - segmentor.extract_feat(small_frames[0])[0]
+        x = x + resize(diff, size=x.shape[2:], mode='bilinear', align_corners=False)
+        seg_logit = segmentor._decode_feat([x], img_meta, frames[1].shape[2:])
+        expected = F.softmax(seg_logit, dim=1)[0].numpy()
+    assert np.abs(result - key_seg_logit).max() > 1e-5
+    assert np.allclose(result, expected, atol=1e-6)
+
+
+def test_encoder_decoder_class_subset():
+    cfg = ConfigDict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        train_cfg=None,
+        test_cfg=dict(mode='whole'))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+
+    mm_inputs = _demo_mm_inputs(input_shape=(1, 3, 8, 16))
+    img = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    class_ids = [5, 2, 11]
+    others = [i for i in range(19) if i not in class_ids]
+    with torch.no_grad():
+        full_prob = segmentor.inference(img, img_metas, rescale=True)
+
+        segmentor.set_class_subset(class_ids)
+        pred = segmentor.simple_test(img, img_metas)[0]
+        expected = torch.tensor(class_ids)[full_prob[:, class_ids].argmax(dim=1)][0]
+        assert np.array_equal(pred, expected.numpy())
+
+        # the other bucket gathers the probabilities of the other classes
+        segmentor.set_class_subset(class_ids, with_other=True, other_label=200)
+        prob = segmentor.simple_test(img, img_metas, output_logits=True)[0]
+        assert prob.shape == (4, 8, 16)
+        assert np.allclose(prob[:3], full_prob[0, class_ids].numpy(), atol=1e-6)
+        assert np.allclose(prob[3], full_prob[0, others].sum(dim=0).numpy(), atol=1e-6)
+        pred = segmentor.simple_test(img, img_metas)[0]
+        assert np.array_equal(pred, np.array(class_ids + [200])[prob.argmax(axis=0)])
+
+        segmentor.test_cfg.output_dtype = 'uint8'
+        pred = segmentor.simple_test(img, img_metas)[0]
+        assert pred.dtype == np.uint8
+        assert set(np.unique(pred)) <= set(class_ids + [200])
+
+        segmentor.test_cfg = ConfigDict(mode='slide', crop_size=(5, 5), stride=(3, 3))
+        prob = segmentor.simple_test(img, img_metas, output_logits=True)[0]
+        assert prob.shape == (4, 8, 16)
+
+        segmentor.set_class_subset(None)
+        assert segmentor.simple_test(img, img_metas, output_logits=True)[0].shape == (19, 8, 16)
+
+    # set from the test config
+    cfg.test_cfg = ConfigDict(mode='whole', class_subset=dict(class_ids=class_ids))
+    segmentor = build_segmentor(cfg)
+    segmentor.eval()
+    with torch.no_grad():
+        assert segmentor.simple_test(img, img_metas, output_logits=True)[0].shape == (3, 8, 16)
@@ -0,0 +1,71 @@
+import os.path as osp
+import tempfile
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import Dataset
+
+from mmseg.apis import multi_gpu_test, single_gpu_test
+from mmseg.core import confusion_matrix
+from mmseg.datasets import build_dataloader
+from mmseg.utils import launch_cpu_workers
+
+NUM_SAMPLES = 5
+
+
+class ToyDataset(Dataset):
+
+    CLASSES = ('a', 'b', 'c')
+
+    def __getitem__(self, idx):
+        return dict(img=torch.tensor([idx]))
+
+    def __len__(self):
+        return NUM_SAMPLES
+
+    @staticmethod
+    def get_gt_seg_map(idx):
+        return np.random.RandomState(idx).randint(0, 3, size=(4, 4)).astype(np.uint8)
+
+    def pre_eval(self, preds, indices):
+        return [
+            confusion_matrix(pred, self.get_gt_seg_map(idx), len(self.CLASSES), 255)
+            for pred, idx in zip(preds, indices)
+        ]
+
+
+class ToyModel(nn.Module):
+
+    def forward(self, img, return_loss=False, **kwargs):
+        # a prediction right on the even samples only
+        return [
+            ToyDataset.get_gt_seg_map(idx) if idx % 2 == 0 else np.zeros((4, 4), dtype=np.int64)
+            for idx in img.flatten().tolist()
+        ]
+
+
+def _worker(out_dir):
+    dataset = ToyDataset()
+    data_loader = build_dataloader(dataset, samples_per_gpu=2, workers_per_gpu=0, dist=True, shuffle=False)
+    results = multi_gpu_test(ToyModel(), data_loader, pre_eval=True)
+    rank = torch.distributed.get_rank()
+    torch.save(dict(results=results, num_samples=len(data_loader.sampler)), osp.join(out_dir, f'{rank}.pth'))
+
+
+def test_multi_gpu_test_pre_eval():
+    dataset = ToyDataset()
+    data_loader = build_dataloader(dataset, samples_per_gpu=2, workers_per_gpu=0, dist=False, shuffle=False)
+    ref_conf_mat = single_gpu_test(ToyModel(), data_loader, pre_eval=True)[0]
+    assert ref_conf_mat.sum() == NUM_SAMPLES * 16
+
+    # the dataset size is not divisible by the world size, so the distributed
+    # sampler pads the second rank with the first sample
+    with tempfile.TemporaryDirectory() as out_dir:
+        launch_cpu_workers(_worker, 2, args=(out_dir, ), num_threads=1)
+        outputs = [torch.load(osp.join(out_dir, f'{rank}.pth')) for rank in range(2)]
+
+    for output in outputs:
+        assert output['num_samples'] == 3
+        assert len(output['results']) == 1
+        assert torch.equal(output['results'][0], ref_conf_mat)
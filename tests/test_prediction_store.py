@@ -0,0 +1,67 @@
+import os.path as osp
+import pickle
+
+import numpy as np
+import pytest
+
+from mmseg.core import PredictionStore
+
+
+def _make_preds(num, seed=0):
+    rng = np.random.RandomState(seed)
+    return [
+        rng.randint(0, 19, size=(rng.randint(1, 20), rng.randint(1, 20)))
+        for _ in range(num)
+    ]
+
+
+def test_prediction_store():
+    preds = _make_preds(5)
+    store = PredictionStore()
+    for pred in preds:
+        store.append(pred)
+
+    assert len(store) == 5
+    assert len(store.data_files) == 1
+    for pred, stored in zip(preds, store):
+        assert stored.dtype == np.uint8
+        assert np.array_equal(pred, stored)
+
+    # items are readable while the store is still written
+    store.append(preds[0])
+    assert np.array_equal(store[5], preds[0])
+
+    # the views are writable but the data file is not changed
+    store[0][...] = 0
+    store.close()
+    reloaded = pickle.loads(pickle.dumps(store))
+    assert np.array_equal(reloaded[0], preds[0])
+    with pytest.raises(AssertionError):
+        reloaded.append(preds[0])
+
+    with pytest.raises(AssertionError):
+        store.append(np.zeros((2, 2, 2)))
+
+    data_file = store.data_files[0]
+    store.cleanup()
+    assert not osp.exists(data_file)
+
+
+def test_prediction_store_merge():
+    preds = _make_preds(7)
+    world_size = 3
+    stores = [PredictionStore() for _ in range(world_size)]
+    # the sampler pads the dataset to a multiple of the world size
+    padded = preds + preds[:2]
+    for idx, pred in enumerate(padded):
+        stores[idx % world_size].append(pred)
+
+    stores = [pickle.loads(pickle.dumps(store)) for store in stores]
+    merged = PredictionStore.merge(stores, len(preds))
+    assert len(merged) == len(preds)
+    for pred, stored in zip(preds, merged):
+        assert np.array_equal(pred, stored)
+
+    merged.cleanup()
+    for store in stores:
+        assert not osp.exists(store.data_files[0])
@@ -0,0 +1,86 @@
+import asyncio
+import os.path as osp
+import threading
+
+import mmcv
+import numpy as np
+import pytest
+
+from mmseg.apis import SegmentationServer, inference_segmentor, init_segmentor
+from mmseg.parallel import MMDataCPU
+from .test_models.test_segmentors.utils import (  # noqa: F401
+    ExampleBackbone, ExampleDecodeHead)
+
+
+def _init_model():
+    config = mmcv.Config.fromfile('configs/pspnet/pspnet_r50-d8_512x1024_40k_cityscapes.py')
+    # a tiny segmentor, only the test pipeline of the config is used
+    config.model = dict(
+        type='EncoderDecoder',
+        backbone=dict(type='ExampleBackbone'),
+        decode_head=dict(type='ExampleDecodeHead'),
+        test_cfg=dict(mode='whole'))
+    config.data.test.pipeline[1].img_scale = (256, 128)
+
+    return init_segmentor(config, device='cpu')
+
+
+def test_segmentation_server():
+    model = _init_model()
+    img = mmcv.imread(osp.join(osp.dirname(__file__), 'data/color.jpg'), 'color')
+    expected = inference_segmentor(model, img)[0]
+
+    server = SegmentationServer(MMDataCPU(model), max_batch_size=4, max_latency=0, workers=2)
+    with pytest.raises(RuntimeError):
+        server.submit(img)
+
+    # the worker is held in its first forward pass until all the other
+    # requests are queued, so the batches do not depend on the scheduling
+    entered, release = threading.Event(), threading.Event()
+    forward = server.inferencer.forward
+
+    def blocking_forward(samples):
+        entered.set()
+        release.wait()
+        return forward(samples)
+
+    server.inferencer.forward = blocking_forward
+
+    with server:
+        futures = [server.submit(img)]
+        assert entered.wait(timeout=60)
+        futures += [server.submit(img) for _ in range(8)]
+        assert server.metrics['queue_depth'] == 8
+        release.set()
+        for future in futures:
+            assert np.array_equal(future.result(timeout=60), expected)
+
+        metrics = server.metrics
+        assert metrics['num_requests'] == 9
+        # the queued requests are coalesced in full batches
+        assert metrics['num_batches'] == 3
+        assert metrics['max_batch_size'] == 4
+        assert metrics['mean_batch_size'] == 3
+        assert metrics['queue_depth'] == 0
+        assert 0 < metrics['latency_p50'] <= metrics['latency_p95'] <= metrics['latency_max']
+
+        async def clients():
+            return await asyncio.gather(*[server.infer_async(img) for _ in range(3)])
+
+        for result in asyncio.run(clients()):
+            assert np.array_equal(result, expected)
+
+        # a failing request does not fail the other requests of its batch
+        futures = [server.submit(img), server.submit('missing.jpg'), server.submit(img)]
+        with pytest.raises(Exception):
+            futures[1].result(timeout=60)
+        assert np.array_equal(futures[0].result(timeout=60), expected)
+        assert np.array_equal(futures[2].result(timeout=60), expected)
+        assert server.metrics['num_errors'] == 1
+
+        # the queued requests are served on stop
+        future = server.submit(img)
+
+    assert np.array_equal(future.result(timeout=0), expected)
+    with pytest.raises(RuntimeError):
+        server.submit(img)
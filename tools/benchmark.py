@@ -29,12 +29,12 @@ def main():
     cfg.model.pretrained = None
     cfg.data.test.test_mode = True
 
-    # build the dataloader
-    # TODO: support multiple images per gpu (only minor changes are needed)
+    # build the dataloader, images of different sizes are padded into a batch
+    samples_per_gpu = cfg.data.test.pop('samples_per_gpu', 1)
     dataset = build_dataset(cfg.data.test)
     data_loader = build_dataloader(
         dataset,
-        samples_per_gpu=1,
+        samples_per_gpu=samples_per_gpu,
         workers_per_gpu=cfg.data.workers_per_gpu,
         dist=False,
         shuffle=False)
@@ -56,7 +56,7 @@ def main():
     pure_inf_time = 0
     total_iters = 200
 
-    # benchmark with 200 image and take the average
+    # benchmark with 200 batches and take the average
     for i, data in enumerate(data_loader):
 
         torch.cuda.synchronize()
@@ -71,12 +71,12 @@ def main():
         if i >= num_warmup:
             pure_inf_time += elapsed
             if (i + 1) % args.log_interval == 0:
-                fps = (i + 1 - num_warmup) / pure_inf_time
-                print(f'Done image [{i + 1:<3}/ {total_iters}], '
+                fps = (i + 1 - num_warmup) * samples_per_gpu / pure_inf_time
+                print(f'Done batch [{i + 1:<3}/ {total_iters}], '
                       f'fps: {fps:.2f} img / s')
 
         if (i + 1) == total_iters:
-            fps = (i + 1 - num_warmup) / pure_inf_time
+            fps = (i + 1 - num_warmup) * samples_per_gpu / pure_inf_time
             print(f'Overall fps: {fps:.2f} img / s')
             break
 
@@ -0,0 +1,46 @@
+import argparse
+import os.path as osp
+
+from mmseg.datasets import pack_directory
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack a dataset into a few large shard files')
+    parser.add_argument('data_root', help='dataset root, e.g. data/DRIVE')
+    parser.add_argument(
+        '-o', '--out-dir', help='output path, <data_root>.pack by default')
+    parser.add_argument(
+        '--suffixes',
+        nargs='+',
+        help='only pack the files with these suffixes, e.g. .png .txt')
+    parser.add_argument(
+        '--shard-size',
+        default=1024,
+        type=int,
+        help='size in MB from which a new shard is started')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+    data_root = args.data_root.rstrip('/')
+    if args.out_dir is None:
+        out_dir = data_root + '.pack'
+    else:
+        out_dir = args.out_dir
+
+    print('Packing files...')
+    suffixes = tuple(args.suffixes) if args.suffixes is not None else None
+    num_files = pack_directory(
+        data_root, out_dir, suffixes, shard_size=args.shard_size * 1024**2)
+
+    print(f'Packed {num_files} files into {osp.abspath(out_dir)}')
+    print('Set the data_root of the dataset to the packed directory and add '
+          f"file_client_args=dict(backend='packed', pack_dir='{out_dir}') to "
+          'the dataset, LoadImageFromFile and LoadAnnotations.')
+
+
+if __name__ == '__main__':
+    main()
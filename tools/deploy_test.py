@@ -12,6 +12,7 @@ from mmcv.runner import get_dist_info
 from mmcv.utils import DictAction
 
 from mmseg.apis import single_gpu_test
+from mmseg.core import PredictionStore
 from mmseg.datasets import build_dataloader, build_dataset
 from mmseg.models.segmentors.base import BaseSegmentor
 
@@ -239,7 +240,8 @@ def main():
     if rank == 0:
         if args.out:
             print(f'\nwriting results to {args.out}')
-            mmcv.dump(outputs, args.out)
+            # a PredictionStore only pickles the paths of its data files
+            mmcv.dump(list(outputs) if isinstance(outputs, PredictionStore) else outputs, args.out)
         kwargs = {} if args.eval_options is None else args.eval_options
         if args.format_only:
             dataset.format_results(outputs, **kwargs)
@@ -3,15 +3,19 @@ import os
 
 import mmcv
 import torch
+import torch.distributed as dist
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import (get_dist_info, init_dist, load_checkpoint,
                          wrap_fp16_model)
 from mmcv.utils import DictAction
 
 from mmseg.apis import multi_gpu_test, single_gpu_test
+from mmseg.core import PredictionStore
 from mmseg.datasets import build_dataloader, build_dataset
 from mmseg.models import build_segmentor
+from mmseg.parallel import MMDataCPU
 from mmseg.core.utils import propagate_root_dir
+from mmseg.utils import launch_cpu_workers
 
 
 def parse_args():
@@ -50,6 +54,12 @@ def parse_args():
                         help='job launcher')
     parser.add_argument('--opacity', type=float, default=0.5,
                         help='Opacity of painted segmentation map. In (0, 1] range.')
+    parser.add_argument('--cpu-workers', type=int, default=0,
+                        help='number of CPU worker processes, each one tests its own model copy on a '
+                             'shard of the dataset, pinned to its own set of cores')
+    parser.add_argument('--cpu-threads', type=int,
+                        help='number of intra-op threads of every CPU worker, by default the number of '
+                             'cores of the worker')
     parser.add_argument('--local_rank', type=int, default=0)
     args = parser.parse_args()
 
@@ -71,6 +81,9 @@ def check_args(args):
     if args.out is not None and not args.out.endswith(('.pkl', '.pickle')):
         raise ValueError('The output file must be a pkl file.')
 
+    if args.cpu_workers > 0 and args.launcher != 'none':
+        raise ValueError('--cpu-workers starts its own workers and cannot be used with --launcher')
+
 
 def update_config(cfg, args):
     # set cudnn_benchmark
@@ -93,6 +106,13 @@ def main():
     args = parse_args()
     check_args(args)
 
+    if args.cpu_workers > 0:
+        launch_cpu_workers(run_test, args.cpu_workers, args=(args, ), num_threads=args.cpu_threads)
+    else:
+        run_test(args)
+
+
+def run_test(args):
     cfg = mmcv.Config.fromfile(args.config)
     if args.options is not None:
         cfg.merge_from_dict(args.options)
@@ -100,18 +120,25 @@ def main():
     cfg = propagate_root_dir(cfg, args.data_dir)
 
     # init distributed env first, since logger depends on the dist info.
-    if args.launcher == 'none':
+    if dist.is_initialized():
+        # CPU worker started with --cpu-workers
+        distributed = True
+    elif args.launcher == 'none':
         distributed = False
-    else:
+    elif torch.cuda.is_available():
         distributed = True
         init_dist(args.launcher, **cfg.dist_params)
+    else:
+        # CPU-only nodes: the metrics are merged with all_reduce over gloo
+        distributed = True
+        dist.init_process_group(backend='gloo')
 
-    # build the dataloader
-    # TODO: support multiple images per gpu (only minor changes are needed)
+    # build the dataloader, images of different sizes are padded into a batch
+    samples_per_gpu = cfg.data.test.pop('samples_per_gpu', 1)
     dataset = build_dataset(cfg.data.test)
     data_loader = build_dataloader(
         dataset,
-        samples_per_gpu=1,
+        samples_per_gpu=samples_per_gpu,
         workers_per_gpu=cfg.data.workers_per_gpu,
         dist=distributed,
         shuffle=False
@@ -139,6 +166,10 @@ def main():
     if args.eval_options is not None:
         efficient_test = args.eval_options.get('efficient_test', False)
 
+    # evaluate on the fly and drop the predictions if they are not needed
+    pre_eval = bool(args.eval) and not args.out and not efficient_test and \
+        'cityscapes' not in args.eval and dataset.CLASSES is not None
+
     if not distributed:
         model = MMDataParallel(model, device_ids=[0])
         outputs = single_gpu_test(
@@ -147,27 +178,34 @@ def main():
             args.show,
             args.show_dir,
             efficient_test,
-            args.opacity
+            args.opacity,
+            pre_eval=pre_eval
         )
     else:
-        model = MMDistributedDataParallel(
-            model.cuda(),
-            device_ids=[torch.cuda.current_device()],
-            broadcast_buffers=False
-        )
+        if torch.cuda.is_available() and args.cpu_workers == 0:
+            model = MMDistributedDataParallel(
+                model.cuda(),
+                device_ids=[torch.cuda.current_device()],
+                broadcast_buffers=False
+            )
+        else:
+            assert not args.gpu_collect, '--gpu-collect is not supported on CPU-only nodes'
+            model = MMDataCPU(model)
         outputs = multi_gpu_test(
             model,
             data_loader,
             args.tmpdir,
             args.gpu_collect,
-            efficient_test
+            efficient_test,
+            pre_eval=pre_eval
         )
 
     rank, _ = get_dist_info()
     if rank == 0:
         if args.out:
             print(f'\nwriting results to {args.out}')
-            mmcv.dump(outputs, args.out)
+            # a PredictionStore only pickles the paths of its data files
+            mmcv.dump(list(outputs) if isinstance(outputs, PredictionStore) else outputs, args.out)
         kwargs = {} if args.eval_options is None else args.eval_options
         if args.format_only:
             dataset.format_results(outputs, **kwargs)